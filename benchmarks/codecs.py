@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Storage Codec Benchmark
+
+Saves and loads a synthetic data file with every storage codec and prints
+the file size and the median save and load time of each.
+
+    python -m benchmarks.codecs --records 10000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from pkg.json_db import JsonFileDB
+
+CODECS = ["pretty", "minified", "keydict", "gzip", "lzma", "keydict+gzip", "keydict+lzma", "segment"]
+
+
+def make_records(count: int):
+    """Return a document with count flights and a tenth as many clients and airlines."""
+    clients = {str(i): {
+        "ID": str(i), "Type": "Client", "Name": f"Client {i}", "Address Line 1": f"{i} Main Street",
+        "City": "London", "State": "", "Country": "UK", "Phone Number": f"+44 20 {i:08d}", "_version": 1
+    } for i in range(max(count // 10, 1))}
+    airlines = {str(i): {
+        "ID": str(i), "Type": "Airline", "Company Name": f"Airline {i}", "Country": "UK",
+        "IATA Code": f"A{i % 100:02d}", "_version": 1
+    } for i in range(max(count // 10, 1))}
+    flights = {f"F{i}": {
+        "Flight ID": f"F{i}", "Client ID": str(i % len(clients)), "Airline ID": str(i % len(airlines)),
+        "Date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "Departure": "London", "Arrival": "Paris",
+        "Status": "Confirmed", "_version": 1
+    } for i in range(count)}
+    return {"Client": clients, "Airline": airlines, "Flight": flights}
+
+
+def bench_codec(codec: str, data, directory: str, repeat: int):
+    path = os.path.join(directory, f"records-{codec.replace('+', '-')}.json")
+    # Without the warm cache, which every load after a save would write
+    db = JsonFileDB(path, codec=codec, warm_cache=False)
+    db.data = data
+    save_times, load_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.save()
+        save_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        db.load()
+        load_times.append(time.perf_counter() - start)
+    return os.path.getsize(path), statistics.median(save_times), statistics.median(load_times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the size and speed of the storage codecs.")
+    parser.add_argument("--records", type=int, default=10000, help="number of flight records")
+    parser.add_argument("--repeat", type=int, default=5, help="saves and loads per codec")
+    args = parser.parse_args(argv)
+
+    data = make_records(args.records)
+    print(f"{'codec':<14}{'size':>12}{'ratio':>8}{'save ms':>10}{'load ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = None
+        for codec in CODECS:
+            size, save, load = bench_codec(codec, data, directory, args.repeat)
+            baseline = baseline or size
+            print(f"{codec:<14}{size:>12,}{size / baseline:>8.2f}{save * 1000:>10.1f}{load * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
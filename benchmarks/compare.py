@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Benchmark Baselines and Regression Check
+
+Keeps results of benchmarks.suite as named baselines and compares new runs
+against them:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.compare save results.json --name main
+    python -m benchmarks.suite --output results-1.json; python -m benchmarks.suite --output results-2.json
+    python -m benchmarks.compare check results-*.json --baseline main --threshold get_all_flights_per_s=0.3
+    python -m benchmarks.compare list
+
+Several results files are pooled into one sample set per metric, which
+spreads repetitions over separate processes. Each metric is compared by the
+median of its samples. A metric has regressed when its median is worse than
+the baseline median by more than the metric's threshold (a fraction of the
+baseline) and the interquartile ranges of the two runs do not overlap, so a
+single noisy sample does not fail the check.
+``check`` prints one line per metric and exits with status 1 if any metric
+regressed. Baselines keep the environment of their run; a warning is printed
+when it differs from the environment of the new run.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import statistics
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_THRESHOLD = 0.25
+# Metrics that barely vary between runs get tighter thresholds
+THRESHOLDS = {
+    "file_bytes": 0.05,
+    "startup_peak_bytes": 0.1,
+}
+# Environment fields that make timings incomparable when they differ
+ENVIRONMENT_FIELDS = ["python", "implementation", "machine", "cpus"]
+BASELINE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+class BaselineError(Exception):
+    pass
+
+
+class BaselineStore:
+    """Directory of named baselines, one JSON results file each."""
+
+    def __init__(self, directory: str = DEFAULT_STORE):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        if not BASELINE_NAME.match(name):
+            raise BaselineError(f"invalid baseline name {name!r}")
+        return os.path.join(self.directory, name + ".json")
+
+    def save(self, name: str, results: Dict[str, Any]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(name)
+        baseline = {**results, "baseline": {
+            "name": name,
+            "saved": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        }}
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(baseline, file, indent=2)
+            file.write("\n")
+        os.replace(temp_path, path)
+        return path
+
+    def load(self, name: str) -> Dict[str, Any]:
+        try:
+            return load_results(self.path(name))
+        except FileNotFoundError:
+            raise BaselineError(f"no baseline named {name!r} in {self.directory}")
+
+    def names(self) -> List[str]:
+        try:
+            return sorted(name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+
+@dataclass
+class Comparison:
+    """Outcome for one metric of one backend at one size."""
+    backend: str
+    records: int
+    metric: str
+    unit: str
+    status: str  # regressed, improved, unchanged, missing or new
+    baseline: Optional[float] = None
+    current: Optional[float] = None
+    change: Optional[float] = None
+    threshold: Optional[float] = None
+
+
+def summarize(samples: List[float]) -> Tuple[float, float, float]:
+    """Return the first quartile, median and third quartile of samples."""
+    if len(samples) < 2:
+        return samples[0], samples[0], samples[0]
+    q1, median, q3 = statistics.quantiles(samples, n=4, method="inclusive")
+    return q1, median, q3
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            thresholds: Optional[Dict[str, float]] = None,
+            default_threshold: float = DEFAULT_THRESHOLD) -> List[Comparison]:
+    thresholds = {**THRESHOLDS, **(thresholds or {})}
+    before = _metrics(baseline)
+    after = _metrics(current)
+    comparisons = []
+    for key in sorted(before.keys() | after.keys()):
+        backend, records, name = key
+        old, new = before.get(key), after.get(key)
+        if old is None or new is None:
+            metric = old or new
+            comparisons.append(Comparison(backend, records, name, metric["unit"], "new" if old is None else "missing"))
+            continue
+        threshold = thresholds.get(name, default_threshold)
+        old_q1, old_median, old_q3 = summarize(old["samples"])
+        new_q1, new_median, new_q3 = summarize(new["samples"])
+        change = (new_median - old_median) / old_median if old_median else 0.0
+        # Positive when the new run is worse, whichever direction is better
+        worse = change if old.get("better", "lower") == "lower" else -change
+        if old.get("better", "lower") == "lower":
+            separated_worse, separated_better = new_q1 > old_q3, new_q3 < old_q1
+        else:
+            separated_worse, separated_better = new_q3 < old_q1, new_q1 > old_q3
+        if worse > threshold and separated_worse:
+            status = "regressed"
+        elif -worse > threshold and separated_better:
+            status = "improved"
+        else:
+            status = "unchanged"
+        comparisons.append(Comparison(backend, records, name, old["unit"], status, old_median, new_median,
+                                      change, threshold))
+    return comparisons
+
+
+def environment_differences(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    before = baseline.get("environment", {})
+    after = current.get("environment", {})
+    return [f"{field}: {before.get(field)} -> {after.get(field)}"
+            for field in ENVIRONMENT_FIELDS if before.get(field) != after.get(field)]
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as file:
+        results = json.load(file)
+    if not isinstance(results, dict) or "results" not in results:
+        raise BaselineError(f"{path} is not a benchmark results file")
+    return results
+
+
+def merge_results(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pool the samples of several results files, e.g. of runs in separate processes."""
+    merged = json.loads(json.dumps(runs[0]))
+    by_key = {(run["backend"], run["records"]): run for run in merged["results"]}
+    for results in runs[1:]:
+        for run in results["results"]:
+            key = (run["backend"], run["records"])
+            if key not in by_key:
+                by_key[key] = {**run, "metrics": {}}
+                merged["results"].append(by_key[key])
+            metrics = by_key[key]["metrics"]
+            for name, metric in run["metrics"].items():
+                metrics.setdefault(name, {**metric, "samples": []})["samples"].extend(metric["samples"])
+    return merged
+
+
+def _metrics(results: Dict[str, Any]) -> Dict[Tuple[str, int, str], Dict[str, Any]]:
+    return {(run["backend"], run["records"], name): metric
+            for run in results["results"] for name, metric in run["metrics"].items() if metric["samples"]}
+
+
+def _parse_thresholds(values: List[str]) -> Dict[str, float]:
+    thresholds = {}
+    for value in values:
+        name, _, fraction = value.partition("=")
+        try:
+            thresholds[name] = float(fraction)
+        except ValueError:
+            raise BaselineError(f"threshold {value!r} is not METRIC=FRACTION")
+    return thresholds
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Store benchmark baselines and check new runs for regressions.")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="directory holding the baselines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    save_parser = commands.add_parser("save", help="store a results file as a baseline")
+    save_parser.add_argument("results", nargs="+", help="JSON outputs of benchmarks.suite, pooled")
+    save_parser.add_argument("--name", required=True, help="baseline name, e.g. main or v2.1")
+
+    check_parser = commands.add_parser("check", help="compare a results file with a baseline")
+    check_parser.add_argument("results", nargs="+", help="JSON outputs of benchmarks.suite, pooled")
+    check_parser.add_argument("--baseline", required=True, help="name of the baseline to compare with")
+    check_parser.add_argument("--threshold", action="append", default=[], metavar="METRIC=FRACTION",
+                              help="allowed slowdown of a metric, e.g. create_ms=0.5 for 50%%")
+    check_parser.add_argument("--default-threshold", type=float, default=DEFAULT_THRESHOLD,
+                              help="allowed slowdown of metrics without their own threshold")
+
+    commands.add_parser("list", help="list the stored baselines")
+    args = parser.parse_args(argv)
+
+    store = BaselineStore(args.store)
+    try:
+        if args.command == "save":
+            print(f"Saved baseline to {store.save(args.name, merge_results([load_results(path) for path in args.results]))}")
+            return 0
+        if args.command == "list":
+            for name in store.names():
+                baseline = store.load(name)
+                environment = baseline.get("environment", {})
+                print(f"{name:<20}{baseline.get('baseline', {}).get('saved', ''):<28}"
+                      f"{environment.get('commit') or '':<42}python {environment.get('python')}")
+            return 0
+        baseline = store.load(args.baseline)
+        current = merge_results([load_results(path) for path in args.results])
+        comparisons = compare(baseline, current, _parse_thresholds(args.threshold), args.default_threshold)
+    except (BaselineError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    for difference in environment_differences(baseline, current):
+        print(f"warning: environment differs from the baseline, {difference}", file=sys.stderr)
+    print(f"{'backend':<14}{'records':>9}  {'metric':<26}{'baseline':>14}{'current':>14}{'change':>9}  status")
+    for row in comparisons:
+        values = (f"{row.baseline:>14.4g}{row.current:>14.4g}{row.change:>+9.1%}"
+                  if row.change is not None else f"{'':>37}")
+        print(f"{row.backend:<14}{row.records:>9}  {row.metric:<26}{values}  {row.status}")
+    regressions = [row for row in comparisons if row.status == "regressed"]
+    print(f"{len(regressions)} of {len(comparisons)} metrics regressed")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
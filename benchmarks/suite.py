@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Storage Benchmark Suite
+
+Measures the hot paths of every storage backend at several data sizes and
+writes the results as JSON:
+
+- startup: opening the controllers with and without the warm cache and the
+  index file, and the peak memory allocated while doing so; the time a cold
+  start spends writing those files for the next start is reported apart;
+- create, update and delete latency of single flights (each is one save);
+- search latency for common, rare and missing terms;
+- get_all throughput in records per second;
+- the size of the data file.
+
+Each metric keeps every sample so results can be compared with their noise.
+Data comes from the seeded generator in
+src.dataset, so runs on different machines measure the same records.
+
+    python -m benchmarks.suite --records 1000 100000 1000000 --output results.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from pkg import metrics as storage_metrics
+from pkg.json_object import VERSION
+from src.app import open_controllers
+from src.dataset import DatasetGenerator
+
+RESULTS_FORMAT = 1
+BACKENDS = ["pretty", "keydict+gzip", "segment"]
+SIZES = [1000, 100000, 1000000]
+# Search terms matching many flights, one flight and none
+SEARCH_TERMS = ["london", "F1", "no-such-term"]
+# Storage timers of the files a cold start writes for the next start
+DERIVED_WRITES = ["json_db.warm_cache_write", "json_db.index_write"]
+
+
+class MetricSet:
+    """Samples of the metrics of one backend at one size, with units and direction."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, value: float, unit: str, better: str = "lower"):
+        metric = self.metrics.setdefault(name, {"unit": unit, "better": better, "samples": []})
+        metric["samples"].append(value)
+
+    def time(self, name: str, action: Callable[[], Any], unit: str = "ms") -> Any:
+        start = time.perf_counter()
+        result = action()
+        elapsed = time.perf_counter() - start
+        self.add(name, elapsed * 1000 if unit == "ms" else elapsed, unit)
+        return result
+
+
+def build_document(records: int, seed: int) -> Dict[str, Any]:
+    """Return a data file document with records flights, a tenth as many clients and fewer airlines."""
+    generator = DatasetGenerator(seed)
+    clients, airlines = max(records // 10, 1), max(records // 1000, 5)
+
+    def space(items, key):
+        return {getattr(item, key): {**item.to_json(), VERSION: 1} for item in items}
+
+    return {
+        "Client": space(generator.clients(clients), "client_id"),
+        "Airline": space(generator.airlines(airlines), "airline_id"),
+        "Flight": space(generator.flights(records, clients, airlines), "flight_id")
+    }
+
+
+def bench_backend(backend: str, records: int, document: Dict[str, Any], directory: str,
+                  repeat: int) -> Dict[str, Any]:
+    path = os.path.join(directory, f"records-{backend.replace('+', '-')}-{records}.json")
+    metrics = MetricSet()
+    controllers = open_controllers(path, codec=backend, indexes=False)
+    controllers.json_db.data = dict(document)
+    controllers.json_db.save()
+    metrics.add("file_bytes", os.path.getsize(path), "bytes")
+
+    for _ in range(repeat):
+        for derived in [controllers.json_db.warm_cache_path, controllers.json_db.index_path]:
+            if derived and os.path.exists(derived):
+                os.remove(derived)
+        elapsed, writes = time_derived_writes(lambda: open_controllers(path, codec=backend))
+        metrics.add("cold_startup_s", elapsed - writes, "s")
+        metrics.add("cold_startup_writes_s", writes, "s")
+    for _ in range(repeat):
+        controllers = metrics.time("startup_s", lambda: open_controllers(path, codec=backend), unit="s")
+    tracemalloc.start()
+    open_controllers(path, codec=backend)
+    metrics.add("startup_peak_bytes", tracemalloc.get_traced_memory()[1], "bytes")
+    tracemalloc.stop()
+
+    flights = controllers.flight_controller
+    sample = next(iter(document["Flight"].values()))
+    for i in range(repeat):
+        flight = {**sample, "Flight ID": f"BENCH{i}"}
+        changed = {**flight, "Status": "Delayed"}
+        results = [metrics.time("create_ms", lambda: flights.create_flight(flight)),
+                   metrics.time("update_ms", lambda: flights.update_flight(flight["Flight ID"], changed)),
+                   metrics.time("delete_ms", lambda: flights.delete_flight(flight["Flight ID"]))]
+        if not all(results):
+            raise RuntimeError(f"writing flight {flight['Flight ID']} failed: {results}")
+
+    for _ in range(repeat):
+        for term in SEARCH_TERMS:
+            metrics.time(f"search_{_slug(term)}_ms", lambda: flights.search_flights(term))
+        start = time.perf_counter()
+        count = len(flights.get_all_flights())
+        metrics.add("get_all_flights_per_s", count / (time.perf_counter() - start), "records/s", better="higher")
+    return {"backend": backend, "records": records, "metrics": metrics.metrics}
+
+
+def time_derived_writes(action: Callable[[], Any]) -> Tuple[float, float]:
+    """Run action, returning the seconds it took and those spent writing the DERIVED_WRITES files."""
+    registry, storage_metrics.REGISTRY = storage_metrics.REGISTRY, storage_metrics.MetricsRegistry(enabled=True)
+    try:
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        histograms = storage_metrics.REGISTRY.histograms
+        return elapsed, sum(histograms[name].total for name in DERIVED_WRITES if name in histograms)
+    finally:
+        storage_metrics.REGISTRY = registry
+
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and code a run was made on."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "commit": commit or None
+    }
+
+
+def run(backends: List[str], sizes: List[int], repeat: int, seed: int,
+        log: Callable[[str], None] = lambda message: None) -> Dict[str, Any]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for records in sizes:
+            document = build_document(records, seed)
+            for backend in backends:
+                log(f"{backend} with {records} flights...")
+                results.append(bench_backend(backend, records, document, directory, repeat))
+    return {
+        "format": RESULTS_FORMAT,
+        "environment": environment(),
+        "settings": {"repeat": repeat, "seed": seed},
+        "results": results
+    }
+
+
+def _slug(term: str) -> str:
+    return "".join(char if char.isalnum() else "_" for char in term.lower())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the storage backends and print the results as JSON.")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, help="storage codecs to measure")
+    parser.add_argument("--records", nargs="+", type=int, default=SIZES, help="numbers of flights to measure at")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per metric")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the generated data")
+    parser.add_argument("--output", help="file to write the JSON results to instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run(args.backends, args.records, args.repeat, args.seed,
+                  log=lambda message: print(message, file=sys.stderr, flush=True))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
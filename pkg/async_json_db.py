@@ -0,0 +1,87 @@
+import asyncio
+import concurrent.futures
+import functools
+from typing import Any, Callable, List, Optional, Tuple
+
+from pkg.json_db import JsonFileDB, Snapshot
+
+
+class AsyncJsonFileDB:
+    """Asyncio front end for a JsonFileDB.
+
+    Reads run on the default thread pool: they take the file lock to reload
+    a file changed by another process, which waits while a batch is being
+    saved, and that must not block the event loop. Writes are queued and
+    applied by a single writer thread in batches: every write queued while a
+    batch is being saved joins the next one, so many concurrent writers share
+    one save of the file (group commit).
+    """
+
+    def __init__(self, json_db: JsonFileDB):
+        self.json_db = json_db
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-db-writer")
+        self._pending: List[Tuple[Callable[[], Any], asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def get(self, path: List[str]) -> Any:
+        return await self.read(self.json_db.get, path)
+
+    async def snapshot(self) -> Snapshot:
+        # Taking a snapshot waits for a save in progress, so keep it off the loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.json_db.snapshot)
+
+    async def set(self, path: List[str], value: Any, expected_version: Optional[int] = None):
+        await self.write(lambda: self.json_db.set(path, value, expected_version=expected_version))
+
+    async def delete(self, path: List[str], expected_version: Optional[int] = None):
+        await self.write(lambda: self.json_db.delete(path, expected_version=expected_version))
+
+    async def read(self, operation: Callable[..., Any], *args) -> Any:
+        """Return operation(*args), a read of the JsonFileDB, run on the default thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(operation, *args))
+
+    async def write(self, operation: Callable[..., Any], *args) -> Any:
+        """Return operation(*args), a write of the JsonFileDB, once the batch it joins is saved."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((functools.partial(operation, *args), future))
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush())
+        return await future
+
+    async def flush(self):
+        """Wait until every write queued so far has been saved."""
+        while self._flusher is not None:
+            await asyncio.shield(self._flusher)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    results = await loop.run_in_executor(self._executor, self._apply, [op for op, _ in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._flusher = None
+
+    def _apply(self, operations: List[Callable[[], Any]]) -> List[Any]:
+        # Runs on the writer thread; the batch saves once when it closes
+        results = []
+        with self.json_db.batch():
+            for operation in operations:
+                try:
+                    results.append(operation())
+                except Exception as e:
+                    results.append(e)
+        return results
@@ -0,0 +1,162 @@
+import dataclasses
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from pkg import segment
+from pkg.change_feed import CURSOR_FILE, DELETE, ChangeEvent, Cursor
+from pkg.codec import decode
+from pkg.json_db import JOURNAL_RETAIN, META, JsonFileDB
+
+FULL = "full"
+INCREMENTAL = "incremental"
+
+_FULL_NAME = re.compile(r"^full-(\d+)\.json$")
+_INCREMENTAL_NAME = re.compile(r"^incr-(\d+)-(\d+)\.jsonl$")
+
+
+@dataclasses.dataclass
+class Backup:
+    kind: str
+    first_sequence: int
+    last_sequence: int
+    path: str
+
+
+class BackupStore:
+    """Hot backups of a JsonFileDB into a directory.
+
+    A full backup writes a copy-on-write snapshot in the database's codec,
+    so writers only wait for the snapshot to be taken, not for the file to
+    be written. An incremental backup copies the journal events since the
+    previous backup. Any sequence covered by a full backup and the
+    increments or journal after it can be restored.
+    """
+
+    def __init__(self, json_db: JsonFileDB, directory: str):
+        self.json_db = json_db
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.cursor = Cursor(json_db.change_feed, os.path.join(directory, CURSOR_FILE))
+
+    def full(self) -> Backup:
+        """Write every record as of the current sequence."""
+        snapshot = self.json_db.snapshot()
+        path = os.path.join(self.directory, f"full-{snapshot.sequence:020d}.json")
+        document = {META: {"sequence": snapshot.sequence}, **snapshot.data}
+        _write_atomic(path, lambda file: file.write(self.json_db.codec.encode(document)))
+        self.cursor.commit(snapshot.sequence)
+        return Backup(FULL, 0, snapshot.sequence, path)
+
+    def incremental(self) -> Optional[Backup]:
+        """Write the events since the last backup; returns None if there were none.
+
+        Falls back to a full backup when there is no full backup yet or the
+        journal no longer holds every event since the last one.
+        """
+        if not any(backup.kind == FULL for backup in self.list()):
+            return self.full()
+        events = self.cursor.poll()
+        if not events:
+            return None
+        if events[0].sequence != self.cursor.sequence + 1:
+            return self.full()
+        first, last = events[0].sequence, events[-1].sequence
+        path = os.path.join(self.directory, f"incr-{first:020d}-{last:020d}.jsonl")
+        _write_atomic(path, lambda file: file.writelines((json.dumps(event.to_json()) + "\n").encode() for event in events))
+        self.cursor.commit(last)
+        return Backup(INCREMENTAL, first, last, path)
+
+    def compact_journal(self, retain: int = JOURNAL_RETAIN) -> int:
+        """Drop journal events already backed up and not needed by other consumers; returns how many."""
+        return self.json_db.compact_journal(retain, [self.cursor.sequence])
+
+    def list(self) -> List[Backup]:
+        """Return the backups in the directory ordered by sequence."""
+        backups = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            match = _FULL_NAME.match(name)
+            if match:
+                backups.append(Backup(FULL, 0, int(match.group(1)), path))
+            match = _INCREMENTAL_NAME.match(name)
+            if match:
+                backups.append(Backup(INCREMENTAL, int(match.group(1)), int(match.group(2)), path))
+        return sorted(backups, key=lambda backup: (backup.last_sequence, backup.kind != FULL))
+
+    def restore(self, sequence: Optional[int] = None) -> int:
+        """Replace the database with its state at sequence (default: latest).
+
+        Starts from the newest full backup at or before sequence and replays
+        increments, then the live journal. Backups reaching past the restored
+        sequence are moved to a "superseded" subdirectory and a new full
+        backup is taken. Returns the restored sequence.
+        """
+        backups = self.list()
+        fulls = [backup for backup in backups
+                 if backup.kind == FULL and (sequence is None or backup.last_sequence <= sequence)]
+        if not fulls:
+            raise BackupError(f"No full backup at or before sequence {sequence}")
+        base = fulls[-1]
+        with open(base.path, 'rb') as file:
+            # Spaces of segment backups are read-only mappings; events are
+            # replayed into plain dicts
+            data = {key: dict(value) if isinstance(value, segment.LazySpace) else value
+                    for key, value in decode(file.read()).items()}
+        restored = data.pop(META)["sequence"]
+
+        def replay(events):
+            nonlocal restored
+            for event in events:
+                if event.sequence <= restored or (sequence is not None and event.sequence > sequence):
+                    continue
+                if event.sequence != restored + 1:
+                    return False
+                _apply_event(data, event)
+                restored = event.sequence
+            return True
+
+        for backup in backups:
+            if backup.kind == INCREMENTAL and backup.last_sequence > restored:
+                with open(backup.path, 'r') as file:
+                    if not replay(ChangeEvent.from_json(json.loads(line)) for line in file):
+                        break
+        replay(self.json_db.change_feed.read(restored))
+        if sequence is not None and restored != sequence:
+            raise BackupError(f"Backups and journal only reach sequence {restored}, not {sequence}")
+
+        self.json_db.replace(data, restored)
+        # Later backups belong to the history the restore abandoned
+        superseded = os.path.join(self.directory, "superseded")
+        for backup in backups:
+            if backup.last_sequence > restored:
+                os.makedirs(superseded, exist_ok=True)
+                os.replace(backup.path, os.path.join(superseded, os.path.basename(backup.path)))
+        # Start the new history with a full backup of the restored state
+        self.full()
+        return restored
+
+
+def _apply_event(data: Dict[str, Any], event: ChangeEvent):
+    path = [event.entity] + event.record_id.split("/")
+    node = data
+    for p in path[:-1]:
+        node = node.setdefault(p, {})
+    if event.op == DELETE:
+        node.pop(path[-1], None)
+    else:
+        node[path[-1]] = event.after
+
+
+def _write_atomic(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class BackupError(Exception):
+    pass
@@ -0,0 +1,274 @@
+import dataclasses
+import json
+import os
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pkg.json_object import JSONObject
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+# Bytes read from the end of the journal to find the last event
+TAIL_BYTES = 64 * 1024
+# Key of the header line a compacted journal starts with
+COMPACTED = "compacted"
+# Cursor of the last backed-up sequence, in a backup directory (see pkg.backup)
+CURSOR_FILE = "journal.cursor"
+_HEADER_PREFIX = b'{"' + COMPACTED.encode() + b'"'
+
+
+@dataclasses.dataclass
+class ChangeEvent(JSONObject):
+    sequence: int
+    entity: str
+    record_id: str
+    op: str
+    before: Optional[Dict[str, Any]]
+    after: Optional[Dict[str, Any]]
+    timestamp: float
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "seq": self.sequence,
+            "entity": self.entity,
+            "id": self.record_id,
+            "op": self.op,
+            "before": self.before,
+            "after": self.after,
+            "ts": self.timestamp
+        }
+
+    @classmethod
+    def from_json(cls, json: Dict[str, Any]) -> 'ChangeEvent':
+        return cls(
+            sequence=json["seq"],
+            entity=json["entity"],
+            record_id=json["id"],
+            op=json["op"],
+            before=json.get("before"),
+            after=json.get("after"),
+            timestamp=json.get("ts", 0.0)
+        )
+
+
+class ChangeFeed:
+    """Journal of mutations with in-process subscribers.
+
+    Events are appended as JSON lines to the journal file after the data file
+    has been saved, so the journal is shared by every process writing the
+    data file and sequence numbers are global. Subscribers of this process
+    are called for every event in sequence order, including events written
+    by other processes once catch_up() has seen them.
+
+    Offsets into the journal count every byte ever appended. compact()
+    drops the oldest events and starts the file with a header line giving
+    the offset its first event had, so offsets held by consumers stay valid;
+    an offset into the dropped part reads from the first event kept.
+    """
+
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._lock = threading.RLock()
+        self._offset = self.size()
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> Callable[[], None]:
+        """Call callback for each future event; returns a function that unsubscribes."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, events: List[ChangeEvent]):
+        """Append events to the journal and notify subscribers.
+
+        Must be called with the data file's write lock held.
+        """
+        if not events:
+            return
+        with self._lock:
+            self.catch_up()
+            lines = "".join(json.dumps(event.to_json()) + "\n" for event in events)
+            with open(self.journal_path, 'a+b') as file:
+                start, base = _read_header(file)
+                file.write(lines.encode())
+                file.flush()
+                self._offset = base + os.fstat(file.fileno()).st_size - start
+            self.dispatch(events)
+
+    def catch_up(self):
+        """Notify subscribers of events other processes appended since the last call."""
+        with self._lock:
+            if not self._subscribers:
+                self._offset = self.size()
+                return
+            events, self._offset = self.read_from(self._offset)
+            self.dispatch(events)
+
+    def read(self, since: int = 0) -> Iterator[ChangeEvent]:
+        """Yield journal events with a sequence number above since."""
+        events, _ = self.read_from(0)
+        for event in events:
+            if event.sequence > since:
+                yield event
+
+    def read_from(self, offset: int) -> Tuple[List[ChangeEvent], int]:
+        """Read complete events after a byte offset; returns them and the new offset."""
+        try:
+            with open(self.journal_path, 'rb') as file:
+                start, base = _read_header(file)
+                offset = max(offset, base)
+                file.seek(start + offset - base)
+                data = file.read()
+        except FileNotFoundError:
+            return [], 0
+        # A line without its newline is still being written
+        end = data.rfind(b"\n") + 1
+        events = [ChangeEvent.from_json(json.loads(line)) for line in data[:end].splitlines() if line]
+        return events, offset + end
+
+    def truncate(self, sequence: int):
+        """Drop the events after sequence from the journal.
+
+        Must be called with the data file's write lock held.
+        """
+        with self._lock:
+            try:
+                with open(self.journal_path, 'rb') as file:
+                    start, base = _read_header(file)
+                    position = start
+                    for line in file:
+                        if not line.endswith(b"\n") or json.loads(line)["seq"] > sequence:
+                            break
+                        position += len(line)
+            except FileNotFoundError:
+                return
+            os.truncate(self.journal_path, position)
+            self._offset = min(self._offset, base + position - start)
+
+    def compact(self, sequence: int) -> int:
+        """Drop the events up to sequence from the start of the journal; returns how many were dropped.
+
+        Must be called with the data file's write lock held.
+        """
+        with self._lock:
+            dropped = 0
+            try:
+                with open(self.journal_path, 'rb') as file:
+                    start, base = _read_header(file)
+                    position = start
+                    for line in file:
+                        if not line.endswith(b"\n") or json.loads(line)["seq"] > sequence:
+                            break
+                        position += len(line)
+                        dropped += 1
+                    if not dropped:
+                        return 0
+                    file.seek(position)
+                    kept = file.read()
+            except FileNotFoundError:
+                return 0
+            header = {COMPACTED: {"sequence": sequence, "offset": base + position - start}}
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(json.dumps(header).encode() + b"\n")
+                file.write(kept)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.journal_path)
+            return dropped
+
+    def last_sequence(self) -> int:
+        """Return the sequence number of the last complete event in the journal."""
+        try:
+            with open(self.journal_path, 'rb') as file:
+                start, _ = _read_header(file)
+                position = max(start, os.fstat(file.fileno()).st_size - TAIL_BYTES)
+                file.seek(position)
+                data = file.read()
+                if position > start:
+                    # Skip the first, probably partial, line of the block
+                    first = data.find(b"\n") + 1
+                    if first == 0:
+                        file.seek(start)
+                        data = file.read()
+                    else:
+                        data = data[first:]
+        except FileNotFoundError:
+            return 0
+        lines = data[:data.rfind(b"\n") + 1].splitlines()
+        return json.loads(lines[-1])["seq"] if lines else 0
+
+    def dispatch(self, events: List[ChangeEvent]):
+        """Call subscribers for events without writing them to the journal."""
+        for event in events:
+            for callback in list(self._subscribers):
+                callback(event)
+
+    def size(self) -> int:
+        """Return the offset of the end of the journal, counting compacted bytes."""
+        try:
+            with open(self.journal_path, 'rb') as file:
+                start, base = _read_header(file)
+                return base + os.fstat(file.fileno()).st_size - start
+        except OSError:
+            return 0
+
+
+def _read_header(file: BinaryIO) -> Tuple[int, int]:
+    # Position of the first event in the file, and its offset in the
+    # journal; leaves the file at that position
+    file.seek(0)
+    compacted = file.read(len(_HEADER_PREFIX)) == _HEADER_PREFIX
+    file.seek(0)
+    if not compacted:
+        return 0, 0
+    line = file.readline()
+    return len(line), json.loads(line)[COMPACTED]["offset"]
+
+
+class Cursor:
+    """Durable position of one consumer in a change feed.
+
+    The position is kept in a small file so a consumer can stop and resume
+    from the last sequence it committed.
+    """
+
+    def __init__(self, feed: ChangeFeed, path: str):
+        self.feed = feed
+        self.path = path
+        self.sequence = 0
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                position = json.load(file)
+            self.sequence = position.get("sequence", 0)
+            self.offset = position.get("offset", 0)
+        self._polled = (self.sequence, self.offset)
+
+    def poll(self) -> List[ChangeEvent]:
+        """Return events after the cursor; call commit() once they are processed."""
+        if self.feed.size() < self.offset:
+            # The journal was rewritten; rescan it and rely on sequence numbers
+            self.offset = 0
+        events, offset = self.feed.read_from(self.offset)
+        events = [event for event in events if event.sequence > self.sequence]
+        self._polled = (events[-1].sequence if events else self.sequence, offset)
+        return events
+
+    def commit(self, sequence: int):
+        """Persist that every event up to sequence has been processed."""
+        polled_sequence, polled_offset = self._polled
+        if sequence >= polled_sequence:
+            self.offset = polled_offset
+        self.sequence = sequence
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"sequence": self.sequence, "offset": self.offset}, file)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,217 @@
+import io
+import json
+import os
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from pkg import segment
+from pkg.json_stream import StreamReader
+from pkg.record_cache import RecordCache
+
+# Top-level key listing the spaces stored with the key-dictionary encoding
+KEYDICT = "_keydict"
+
+GZIP_MAGIC = b"\x1f\x8b"
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+PRETTY = "pretty"
+MINIFIED = "minified"
+KEYDICT_ENCODING = "keydict"
+SEGMENT = "segment"
+ENCODINGS = [PRETTY, MINIFIED, KEYDICT_ENCODING, SEGMENT]
+COMPRESSIONS = ["gzip", "lzma"]
+
+# Files from this size on are loaded with the streaming parser
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+GZIP_LEVEL = 6
+LZMA_PRESET = 1
+
+
+class Codec:
+    """Encoding of a JsonFileDB document to bytes and back.
+
+    A codec name is an encoding optionally followed by a compression, e.g.
+    "pretty" (the default indented JSON), "minified", "keydict", "gzip"
+    (minified JSON, gzipped) or "keydict+lzma". "segment" is the binary
+    format of pkg.segment, whose records are decoded lazily from a memory
+    map; it cannot be compressed. Decoding does not depend on the codec:
+    compression and segments are recognised by their magic bytes and the
+    key-dictionary encoding by its marker key, so any codec reads files
+    written by any other.
+    """
+
+    def __init__(self, name: str = PRETTY):
+        parts = name.split("+")
+        if parts[0] in COMPRESSIONS:
+            parts.insert(0, MINIFIED)
+        if parts[0] not in ENCODINGS or len(parts) > 2 or (len(parts) == 2 and parts[1] not in COMPRESSIONS):
+            raise CodecError(f"Unknown codec {name!r}")
+        if parts[0] == SEGMENT and len(parts) == 2:
+            raise CodecError("Segment files are memory-mapped and cannot be compressed")
+        self.name = name
+        self.encoding = parts[0]
+        self.compression = parts[1] if len(parts) == 2 else None
+
+    def encode(self, document: Dict[str, Any]) -> bytes:
+        if self.encoding == SEGMENT:
+            return segment.encode(document)
+        document = {key: dict(value) if isinstance(value, (segment.LazySpace, segment.OverlaySpace)) else value
+                    for key, value in document.items()}
+        if self.encoding == PRETTY:
+            text = json.dumps(document, indent=4)
+        elif self.encoding == MINIFIED:
+            text = json.dumps(document, separators=(",", ":"))
+        else:
+            text = json.dumps(_keydict_encode(document), separators=(",", ":"))
+        raw = text.encode()
+        # The compression modules are imported only for compressed files
+        if self.compression == "gzip":
+            import gzip
+            return gzip.compress(raw, compresslevel=GZIP_LEVEL)
+        if self.compression == "lzma":
+            import lzma
+            return lzma.compress(raw, preset=LZMA_PRESET)
+        return raw
+
+    def decode(self, raw: bytes) -> Dict[str, Any]:
+        return decode(raw)
+
+
+def decode(raw: bytes) -> Dict[str, Any]:
+    """Decode a document written with any codec."""
+    if raw.startswith(segment.MAGIC):
+        return segment.decode(raw)
+    if raw.startswith(GZIP_MAGIC):
+        import gzip
+        raw = gzip.decompress(raw)
+    elif raw.startswith(LZMA_MAGIC):
+        import lzma
+        raw = lzma.decompress(raw)
+    document = json.loads(raw)
+    if KEYDICT in document:
+        document = _keydict_decode(document)
+    return document
+
+
+def detect(path: str) -> Optional[str]:
+    """Return the name of the codec the file at path was written with, or None if there is no file.
+
+    Only the first bytes are read, decompressed if need be: pretty JSON
+    starts with a newline after the brace and key-dictionary documents with
+    their marker key.
+    """
+    try:
+        with open(path, 'rb') as file:
+            head = file.read(len(segment.MAGIC))
+            if head == segment.MAGIC:
+                return SEGMENT
+            file.seek(0)
+            compression, stream = _decompressed(file, head)
+            text = stream.read(len(KEYDICT) + 3)
+    except FileNotFoundError:
+        return None
+    if text.startswith(b'{"' + KEYDICT.encode() + b'"'):
+        encoding = KEYDICT_ENCODING
+    elif text.startswith(b'{"'):
+        encoding = MINIFIED
+    else:
+        encoding = PRETTY
+    return f"{encoding}+{compression}" if compression else encoding
+
+
+def read_file(path: str, cache: Optional[RecordCache] = None,
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Read a document from a file written with any codec.
+
+    Segment files are memory-mapped rather than read, so only their index is
+    loaded until records are accessed; cache then holds recently used ones.
+    Other files from STREAM_THRESHOLD bytes on are parsed record by record
+    (see pkg.json_stream). progress is called with the bytes read so far and
+    the file size.
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        magic = file.read(len(segment.MAGIC))
+        if magic == segment.MAGIC:
+            return segment.read(file, cache)
+        file.seek(0)
+        if size < STREAM_THRESHOLD:
+            document = decode(file.read())
+        else:
+            _, stream = _decompressed(file, magic)
+            on_chunk = (lambda: progress(file.tell(), size)) if progress is not None else None
+            reader = StreamReader(io.TextIOWrapper(stream, encoding="utf-8"), on_chunk)
+            keydict = False
+
+            def depth(key):
+                # Key-dictionary spaces nest their records one level deeper
+                nonlocal keydict
+                if key == KEYDICT:
+                    keydict = True
+                    return 0
+                return 2 if keydict else 1
+
+            document = reader.document(depth)
+            if KEYDICT in document:
+                document = _keydict_decode(document)
+        if progress is not None:
+            progress(size, size)
+        return document
+
+
+def _decompressed(file: BinaryIO, head: bytes) -> Tuple[Optional[str], BinaryIO]:
+    """Return the compression of file, whose first bytes are head, and a stream of its decompressed bytes."""
+    if head.startswith(GZIP_MAGIC):
+        import gzip
+        return "gzip", gzip.GzipFile(fileobj=file)
+    if head.startswith(LZMA_MAGIC):
+        import lzma
+        return "lzma", lzma.LZMAFile(file)
+    return None, file
+
+
+def _keydict_encode(document: Dict[str, Any]) -> Dict[str, Any]:
+    # A space of dict records is stored as its field names once plus one
+    # list of values per record; records with other fields stay dicts
+    encoded = {}
+    spaces = []
+    for space, records in document.items():
+        # Underscored keys such as _meta are headers, not spaces
+        keys = None if space.startswith("_") else _common_keys(records)
+        if keys is None:
+            encoded[space] = records
+            continue
+        key_set = set(keys)
+        rows = {}
+        for record_id, record in records.items():
+            if isinstance(record, dict) and record.keys() == key_set:
+                rows[record_id] = [record[key] for key in keys]
+            else:
+                rows[record_id] = record
+        encoded[space] = {"keys": keys, "rows": rows}
+        spaces.append(space)
+    return {KEYDICT: spaces, **encoded}
+
+
+def _keydict_decode(document: Dict[str, Any]) -> Dict[str, Any]:
+    spaces = document.pop(KEYDICT)
+    for space in spaces:
+        keys = document[space]["keys"]
+        document[space] = {
+            record_id: dict(zip(keys, row)) if isinstance(row, list) else row
+            for record_id, row in document[space]["rows"].items()
+        }
+    return document
+
+
+def _common_keys(records: Any) -> Optional[List[str]]:
+    if not isinstance(records, dict):
+        return None
+    for record in records.values():
+        if isinstance(record, dict):
+            return list(record)
+    return None
+
+
+class CodecError(Exception):
+    pass
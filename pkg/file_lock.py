@@ -0,0 +1,62 @@
+import contextlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - fcntl is unavailable on Windows
+    fcntl = None
+
+
+class FileLock:
+    """Re-entrant reader/writer lock shared between threads and processes.
+
+    Threads of the same process are serialised with an RLock, processes are
+    serialised with fcntl.flock on a sidecar lock file. The lock file is kept
+    separate from the data file because saves replace the data file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._file = None
+        self._depth = 0
+        self._mode = None
+
+    @contextlib.contextmanager
+    def shared(self):
+        with self._acquire(fcntl.LOCK_SH if fcntl else None):
+            yield
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        with self._acquire(fcntl.LOCK_EX if fcntl else None):
+            yield
+
+    @contextlib.contextmanager
+    def local(self):
+        """Serialise with other threads of this process only."""
+        with self._thread_lock:
+            yield
+
+    @contextlib.contextmanager
+    def _acquire(self, mode):
+        with self._thread_lock:
+            previous_mode = self._mode
+            if self._depth == 0:
+                self._file = open(self.path, 'a+')
+            # Never downgrade a lock that an outer block already holds
+            if mode is not None and previous_mode != fcntl.LOCK_EX and mode != previous_mode:
+                fcntl.flock(self._file.fileno(), mode)
+                self._mode = mode
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._mode = None
+                    self._file.close()
+                    self._file = None
+                elif self._mode != previous_mode and previous_mode is not None:
+                    fcntl.flock(self._file.fileno(), previous_mode)
+                    self._mode = previous_mode
@@ -0,0 +1,229 @@
+import marshal
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pkg.change_feed import ChangeEvent
+from pkg.json_object import VERSION
+
+# Field name under which a space's n-gram index is registered
+NGRAM = "*ngram"
+NGRAM_SIZE = 3
+
+INDEX_FILE_FORMAT = 1
+_HEADER_MAGIC = b"JDBIDX1\n"
+# Sets are stored joined into one string, which marshal loads many times
+# faster than a set; they are split again the first time they are used
+_PACK_SEPARATOR = "\x1e"
+
+
+class FieldIndex:
+    """Secondary index from the values of one field of a space to record ids.
+
+    The index is kept up to date from change events, so it never needs to be
+    rebuilt after a single write.
+    """
+
+    def __init__(self, space: str, field: str):
+        self.space = space
+        self.field = field
+        self.postings: Dict[Any, Set[str]] = {}
+
+    def build(self, records: Dict[str, Dict[str, Any]]):
+        self.postings = {}
+        for record_id, record in records.items():
+            self._add(record_id, record)
+
+    def apply(self, event: ChangeEvent):
+        if event.entity != self.space:
+            return
+        self._remove(event.record_id, event.before)
+        self._add(event.record_id, event.after)
+
+    def lookup(self, value: Any) -> Set[str]:
+        return _unpacked(self.postings, value) or set()
+
+    def _add(self, record_id: str, record: Any):
+        if isinstance(record, dict) and self.field in record:
+            ids = _unpacked(self.postings, record[self.field])
+            if ids is None:
+                ids = self.postings[record[self.field]] = set()
+            ids.add(record_id)
+
+    def _remove(self, record_id: str, record: Any):
+        if isinstance(record, dict) and self.field in record:
+            ids = _unpacked(self.postings, record[self.field])
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del self.postings[record[self.field]]
+
+
+class NgramIndex:
+    """Substring index over every field value of the records of a space.
+
+    Values are indexed once however many records share them: each distinct
+    lower-cased value maps to the ids of its records, and each n-gram to the
+    values containing it. A search intersects the n-grams of the term and
+    checks the few remaining values, which matches JSONObject.contains_term.
+    """
+
+    field = NGRAM
+
+    def __init__(self, space: str, size: int = NGRAM_SIZE):
+        self.space = space
+        self.size = size
+        self.values: Dict[str, Set[str]] = {}
+        self.grams: Dict[str, Set[str]] = {}
+
+    def build(self, records: Dict[str, Dict[str, Any]]):
+        self.values = {}
+        self.grams = {}
+        for record_id, record in records.items():
+            self._add(record_id, record)
+
+    def apply(self, event: ChangeEvent):
+        if event.entity != self.space:
+            return
+        self._remove(event.record_id, event.before)
+        self._add(event.record_id, event.after)
+
+    def lookup(self, term: str) -> Set[str]:
+        """Return the ids of the records with a field value containing term."""
+        term = term.lower()
+        if len(term) < self.size:
+            values = [value for value in self.values if term in value]
+        else:
+            candidates = None
+            for values in sorted((_unpacked(self.grams, gram) or set() for gram in self._grams(term)), key=len):
+                candidates = set(values) if candidates is None else candidates & values
+                if not candidates:
+                    return set()
+            values = [value for value in candidates if term in value]
+        ids = set()
+        for value in values:
+            ids |= _unpacked(self.values, value)
+        return ids
+
+    def _add(self, record_id: str, record: Any):
+        for value in leaf_texts(record):
+            ids = _unpacked(self.values, value)
+            if ids is None:
+                ids = self.values[value] = set()
+                for gram in self._grams(value):
+                    values = _unpacked(self.grams, gram)
+                    if values is None:
+                        values = self.grams[gram] = set()
+                    values.add(value)
+            ids.add(record_id)
+
+    def _remove(self, record_id: str, record: Any):
+        for value in leaf_texts(record):
+            ids = _unpacked(self.values, value)
+            if ids is None:
+                continue
+            ids.discard(record_id)
+            if not ids:
+                del self.values[value]
+                for gram in self._grams(value):
+                    values = _unpacked(self.grams, gram)
+                    if values is not None:
+                        values.discard(value)
+                        if not values:
+                            del self.grams[gram]
+
+    def _grams(self, value: str) -> Set[str]:
+        return {value[i:i + self.size] for i in range(len(value) - self.size + 1)}
+
+
+def leaf_texts(record: Any) -> Set[str]:
+    """Return the lower-cased text of every field value, as JSONObject.contains_term sees it."""
+    texts: Set[str] = set()
+    if not isinstance(record, dict):
+        return texts
+    stack: List[Any] = [value for key, value in record.items() if key != VERSION]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            texts.add(value.lower())
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, (int, float, bool)):
+            texts.add(str(value).lower())
+    return texts
+
+
+def _pack(postings: Dict[Any, Any]) -> Dict[Any, Any]:
+    packed = {}
+    for key, ids in postings.items():
+        if isinstance(ids, str):
+            packed[key] = ids
+            continue
+        joined = _PACK_SEPARATOR.join(ids)
+        # Members containing the separator itself are kept as a tuple
+        packed[key] = joined if joined.count(_PACK_SEPARATOR) == len(ids) - 1 else tuple(ids)
+    return packed
+
+
+def _unpacked(postings: Dict[Any, Any], key: Any) -> Optional[Set[str]]:
+    # The set under key, split from its packed form on first use
+    ids = postings.get(key)
+    if ids is None or isinstance(ids, set):
+        return ids
+    ids = postings[key] = set(ids.split(_PACK_SEPARATOR) if isinstance(ids, str) else ids)
+    return ids
+
+
+def write_index_file(path: str, indexes: List[Any], header: Dict[str, Any]):
+    """Persist indexes with a header recording what they were built from."""
+    payload = marshal.dumps([
+        (type(index).__name__, index.space, index.field,
+         _pack(index.postings) if isinstance(index, FieldIndex)
+         else (index.size, _pack(index.values), _pack(index.grams)))
+        for index in indexes
+    ])
+    header = {**header, "format": INDEX_FILE_FORMAT, "checksum": zlib.crc32(payload), "length": len(payload)}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(_HEADER_MAGIC)
+        file.write(marshal.dumps(header))
+        file.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read_index_header(path: str) -> Optional[Dict[str, Any]]:
+    """Return the header of an index file without reading or checking its indexes."""
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(_HEADER_MAGIC)) != _HEADER_MAGIC:
+                return None
+            return marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def read_index_file(path: str) -> Optional[Tuple[Dict[str, Any], List[Any]]]:
+    """Return the header and indexes of an index file, or None if it is missing or damaged."""
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(_HEADER_MAGIC)) != _HEADER_MAGIC:
+                return None
+            header = marshal.load(file)
+            payload = file.read()
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (header.get("format") != INDEX_FILE_FORMAT or len(payload) != header.get("length")
+            or zlib.crc32(payload) != header.get("checksum")):
+        return None
+    indexes = []
+    for kind, space, field, state in marshal.loads(payload):
+        if kind == FieldIndex.__name__:
+            index = FieldIndex(space, field)
+            index.postings = state
+        else:
+            index = NgramIndex(space, state[0])
+            index.values, index.grams = state[1], state[2]
+        indexes.append(index)
+    return header, indexes
@@ -1,53 +1,500 @@
-import json
+import contextlib
+import os
 import os.path
-from typing import Any, List
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pkg import metrics, segment, warm_cache
+from pkg.change_feed import CREATE, DELETE, UPDATE, ChangeEvent, ChangeFeed
+from pkg.codec import PRETTY, SEGMENT, Codec, detect, read_file
+from pkg.file_lock import FileLock
+from pkg.index import (
+    NGRAM, FieldIndex, NgramIndex, leaf_texts, read_index_file, read_index_header, write_index_file
+)
+from pkg.json_object import VERSION
+from pkg.record_cache import DEFAULT_CACHE_BYTES, RecordCache
+
+META = "_meta"
+# Latest journal events compact_journal keeps whatever their consumers, so
+# replicas and cursors that fall briefly behind can still catch up
+JOURNAL_RETAIN = 10000
 
 
 class JsonFileDB:
-    def __init__(self, file_path):
+    # Whether this instance may write the warm cache; replicas only read it
+    writes_warm_cache = True
+
+    def __init__(self, file_path, codec: Optional[str] = None, cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 progress: Optional[Callable[[int, int], None]] = None, warm_cache: bool = True):
         self.file_path = file_path
-        self.data = self.load()
+        # Format used for saving: codec if given, else that of the existing
+        # file, so saving never changes it unasked; files in any format are read
+        self.codec = Codec(codec or detect(file_path) or PRETTY)
+        # Decoded records of memory-mapped segment files (see pkg.segment)
+        self.cache = RecordCache(cache_bytes) if cache_bytes else None
+        # Parsed copy of the file, loaded instead of parsing it again while
+        # the file is unchanged (see pkg.warm_cache); segment files need none
+        self.warm_cache_path = file_path + ".warm" if warm_cache else None
+        self.lock = FileLock(file_path + ".lock")
+        # Generation of the file as last loaded or saved by this process, and
+        # the generation at which each space was last written
+        self.generation = 0
+        self.space_generations: Dict[str, int] = {}
+        # Sequence number of the last mutation, shared by all processes
+        self.sequence = 0
+        self.change_feed = ChangeFeed(file_path + ".journal")
+        self._events: List[ChangeEvent] = []
+        self._signature = None
+        self._touched = set()
+        # Spaces whose dict is shared with at least one snapshot
+        self._frozen = set()
+        self._batch_depth = 0
+        # Indexes by (space, field); n-gram indexes use the field NGRAM
+        self.indexes: Dict[Tuple[str, str], Any] = {}
+        # Journal size when the indexes last matched the data
+        self._index_offset = 0
+        self.data = self.load(progress)
 
-    def load(self):
+    def load(self, progress: Optional[Callable[[int, int], None]] = None):
+        """Read the whole file; progress is called with the bytes read and the file size."""
         try:
-            if os.path.exists(self.file_path):
-                with open(self.file_path, 'r') as file:
-                    return json.load(file)
-            else:
-                return {}
+            with metrics.timer("json_db.load"), self.lock.shared():
+                signature = self._stat()
+                if signature is None:
+                    data, meta = {}, {}
+                else:
+                    data, meta = self._read(progress, write_warm_cache=True)
+                self._index_offset = self.change_feed.size()
         except Exception as e:
             print(f"Error loading database: {e}")
             return {}
+        self._apply_meta(meta, signature)
+        return data
 
     def save(self):
-        with open(self.file_path, 'w') as file:
-            json.dump(self.data, file, indent=4)
+        with metrics.timer("json_db.save"), self.lock.exclusive():
+            self.generation += 1
+            touched = set(self._touched)
+            for space in touched:
+                self.space_generations[space] = self.generation
+            self._touched.clear()
+            meta = {"generation": self.generation, "sequence": self.sequence, "spaces": self.space_generations}
+
+            document = {META: meta, **self.data}
+            with metrics.timer("json_db.encode"):
+                raw = self.codec.encode(document)
+            with metrics.timer("json_db.write"):
+                tmp_path = self.file_path + ".tmp"
+                with open(tmp_path, 'wb') as file:
+                    file.write(raw)
+                os.replace(tmp_path, self.file_path)
+            metrics.add("json_db.bytes_written", len(raw))
+            self._signature = self._stat()
+            if self.codec.encoding == SEGMENT:
+                # Serve records from the new map so written ones leave the heap.
+                # Spaces the save did not touch were copied byte for byte, so
+                # their decoded records in the cache stay valid
+                previous = self.data
+                self.data, _ = self._read()
+                self._frozen.clear()
+                for space, records in self.data.items():
+                    if space not in touched and isinstance(records, segment.LazySpace) \
+                            and isinstance(previous.get(space), segment.LazySpace):
+                        records.share_cache(previous[space])
+            if self.warm_cache_path is not None:
+                # Rewriting the cache would cost every write a full marshal;
+                # the next cold load or write_warm_cache() writes it again
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.warm_cache_path)
+
+            # Journal after the save: a crash in between leaves a gap in the
+            # sequence that consumers can detect, never events without data
+            events, self._events = self._events, []
+            self.change_feed.publish(events)
+            self._index_offset = self.change_feed.size()
+
+    def write_warm_cache(self):
+        """Write the warm cache for the next start, e.g. on a clean shutdown.
+
+        Does nothing for replicas, segment files or while writes are pending,
+        nor if the cache already matches the file.
+        """
+        if self.warm_cache_path is None or not self.writes_warm_cache:
+            return
+        with self.lock.shared():
+            self.refresh()
+            if self._touched or self._stat() is None or any(
+                    isinstance(value, segment.LazySpace) for value in self.data.values()):
+                return
+            meta = {"generation": self.generation, "sequence": self.sequence, "spaces": self.space_generations}
+            with metrics.timer("json_db.warm_cache_write"):
+                warm_cache.write(self.warm_cache_path, self.file_path, {META: meta, **self.data})
+
+    def changed(self) -> bool:
+        """Return whether the file on disk differs from the last load or save."""
+        return self._stat() != self._signature
+
+    def refresh(self) -> bool:
+        """Merge writes made by other processes since the last load or save.
+
+        Only spaces whose generation moved on are replaced, so a reload costs
+        nothing unless the file actually changed on disk.
+        """
+        if not self.changed():
+            return False
+        with metrics.timer("json_db.refresh"), self.lock.shared():
+            signature = self._stat()
+            if signature == self._signature:
+                return False
+            if signature is None:
+                data, meta = {}, {}
+            else:
+                data, meta = self._read()
+
+            spaces = meta.get("spaces", {})
+            for space in list(self.data):
+                if space not in data:
+                    del self.data[space]
+            for space, value in data.items():
+                if space not in spaces or spaces[space] != self.space_generations.get(space):
+                    self.data[space] = value
+                    self._frozen.discard(space)
+            since = self.sequence
+            self._apply_meta(meta, signature)
+            self._update_indexes(since)
+            self.change_feed.catch_up()
+        return True
+
+    def snapshot(self) -> 'Snapshot':
+        """Return a consistent point-in-time view of the database.
+
+        Readers of the snapshot need no lock. Spaces are shared with the live
+        data until the next write to them, which copies the space first.
+        """
+        self.refresh()
+        with self.lock.local():
+            self._frozen.update(self.data)
+            return Snapshot(dict(self.data), self.generation, self.sequence)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Hold the write lock and save once for all writes made in the block."""
+        with self.lock.exclusive():
+            self.refresh()
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._touched:
+                    self.save()
 
     def get(self, path: List[str]) -> Any:
-        node = self.data
-        for p in path:
-            if p not in node:
+        self.refresh()
+        return _lookup(self.data, path)
+
+    def replace(self, data: Dict[str, Any], sequence: int):
+        """Replace the whole database with data as of sequence, e.g. to restore a backup.
+
+        Journal events after sequence are dropped so new writes continue the
+        restored history; every space gets a new generation, so other
+        instances reload all of it.
+        """
+        with self.lock.exclusive():
+            self.refresh()
+            self.data = data
+            self.sequence = sequence
+            self._events = []
+            self._frozen.clear()
+            self._touched = set(data)
+            self.space_generations = {}
+            for space, _ in self.indexes:
+                self._rebuild_indexes(space)
+            self.save()
+            self.change_feed.truncate(sequence)
+            self._index_offset = self.change_feed.size()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.index_path)
+
+    def compact_journal(self, retain: int = JOURNAL_RETAIN, keep_after: Iterable[int] = ()) -> int:
+        """Drop the journal events no consumer needs any more; returns how many were dropped.
+
+        Events after the sequence the index file was saved at, after each
+        sequence in keep_after (e.g. the cursor of a BackupStore) and the
+        last retain events are kept.
+        """
+        with self.lock.exclusive():
+            self.refresh()
+            safe = min([self.sequence - retain, *keep_after])
+            header = read_index_header(self.index_path)
+            if header is not None:
+                safe = min(safe, header["sequence"])
+            if safe <= 0:
+                return 0
+            return self.change_feed.compact(safe)
+
+    @property
+    def index_path(self) -> str:
+        return self.file_path + ".indexes"
+
+    def add_index(self, space: str, field: str) -> FieldIndex:
+        """Maintain an index of the records of space by the value of field (NGRAM for text search)."""
+        with self.lock.local():
+            index = self.indexes.get((space, field))
+            if index is None:
+                index = NgramIndex(space) if field == NGRAM else FieldIndex(space, field)
+                index.build(self.data.get(space, {}))
+                self.indexes[(space, field)] = index
+            return index
+
+    def open_indexes(self, specs: List[Tuple[str, str]]) -> bool:
+        """Add the (space, field) indexes in specs, reusing the index file if it is current.
+
+        The file is used when its checksum is intact, it holds the same
+        indexes, it was built from this data file or an earlier save of it,
+        and the journal still has every event written since; those events
+        are applied to it. Otherwise the indexes are built from the data and
+        the file is rewritten. Returns whether the file was used.
+        """
+        stored = read_index_file(self.index_path)
+        with self.lock.shared():
+            self.refresh()
+            if stored is not None:
+                header, indexes = stored
+                if set(header["specs"]) == set(specs) and header["sequence"] <= self.sequence \
+                        and self._indexed_file_matches(header.get("data_file")):
+                    self.indexes = {(index.space, index.field): index for index in indexes}
+                    if self._replay_journal(header["sequence"], header["journal_offset"]):
+                        if header["sequence"] != self.sequence:
+                            self.persist_indexes()
+                        return True
+            self.indexes = {}
+            for space, field in specs:
+                self.add_index(space, field)
+            self.persist_indexes()
+            return False
+
+    def persist_indexes(self):
+        """Write the indexes next to the data file for the next start to reuse."""
+        with self.lock.shared():
+            self.refresh()
+            header = {"sequence": self.sequence, "journal_offset": self._index_offset, "specs": list(self.indexes),
+                      "data_file": self._data_file_identity()}
+            with metrics.timer("json_db.index_write"):
+                write_index_file(self.index_path, list(self.indexes.values()), header)
+
+    def search(self, space: str, term: str) -> List[Any]:
+        """Return the records of space with a field value containing term, ignoring case."""
+        self.refresh()
+        records = self.data.get(space, {})
+        index = self.indexes.get((space, NGRAM))
+        if index is None:
+            metrics.add("json_db.records_scanned", len(records))
+            term = term.lower()
+            return [record for record in list(records.values()) if any(term in text for text in leaf_texts(record))]
+        found = []
+        for record_id in list(index.lookup(term)):
+            record = records.get(record_id)
+            if record is not None:
+                found.append(record)
+        return found
+
+    def find(self, space: str, field: str, value: Any) -> List[Any]:
+        """Return the records of space whose field equals value."""
+        self.refresh()
+        records = self.data.get(space, {})
+        index = self.indexes.get((space, field))
+        if index is None:
+            metrics.add("json_db.records_scanned", len(records))
+            return [record for record in list(records.values()) if record.get(field) == value]
+        found = []
+        for record_id in list(index.lookup(value)):
+            record = records.get(record_id)
+            if record is not None and record.get(field) == value:
+                found.append(record)
+        return found
+
+    def set(self, path: List[str], value: Any, expected_version: Optional[int] = None):
+        """Write value at path.
+
+        Dict values are stamped with a version one above the one they replace.
+        When expected_version is given the write only happens if the stored
+        version still matches it; missing and unversioned values count as 0.
+        """
+        with self.lock.exclusive():
+            self.refresh()
+            node = self._parent(path, create=True)
+            before = node.get(path[-1])
+            version = self._check_version(path, before, expected_version)
+            if isinstance(value, dict):
+                value = {**value, VERSION: version + 1}
+            node[path[-1]] = value
+            self._touched.add(path[0])
+            self._record(path, CREATE if before is None else UPDATE, before, value)
+            if not self._batch_depth:
+                self.save()
+
+    def delete(self, path: List[str], expected_version: Optional[int] = None):
+        with self.lock.exclusive():
+            self.refresh()
+            node = self._parent(path, create=False)
+            if path[-1] not in node:
                 raise KeyNotFound(f"Path {path} not found in database")
-            node = node[p]
-        return node
+            before = node[path[-1]]
+            self._check_version(path, before, expected_version)
+            del node[path[-1]]
+            self._touched.add(path[0])
+            self._record(path, DELETE, before, None)
+            if not self._batch_depth:
+                self.save()
 
-    def set(self, path: List[str], value: Any):
+    def _parent(self, path: List[str], create: bool) -> Dict[str, Any]:
+        # Copy-on-write: a space still shared with a snapshot, or still read
+        # from a mapped segment file, is copied before its first write, and
+        # nested nodes below a space are always copied. Copies of mapped
+        # spaces only hold the records written since the file was mapped.
         node = self.data
-        for p in path[:-1]:
+        for depth, p in enumerate(path[:-1]):
             if p not in node:
+                if not create:
+                    raise KeyNotFound(f"Path {path} not found in database")
                 node[p] = {}
+            elif depth > 0 or p in self._frozen or isinstance(node[p], segment.LazySpace):
+                node[p] = segment.writable_copy(node[p])
+                self._frozen.discard(p)
             node = node[p]
-        node[path[-1]] = value
-        self.save()
+        return node
 
-    def delete(self, path: List[str]):
-        node = self.data
-        for p in path[:-1]:
-            if p not in node:
-                raise KeyNotFound(f"Path {path} not found in database")
-            node = node[p]
-        del node[path[-1]]
-        self.save()
+    def _record(self, path: List[str], op: str, before: Any, after: Any):
+        self.sequence += 1
+        event = ChangeEvent(
+            sequence=self.sequence,
+            entity=path[0],
+            record_id="/".join(path[1:]),
+            op=op,
+            before=before,
+            after=after,
+            timestamp=time.time()
+        )
+        self._events.append(event)
+        self._apply_to_indexes(event)
+
+    def _apply_to_indexes(self, event: ChangeEvent):
+        for (space, _), index in self.indexes.items():
+            if space == event.entity:
+                index.apply(event)
+
+    def _update_indexes(self, since: int):
+        # Apply the events other processes journalled after since; must be
+        # called with the file lock held, so the journal matches the data.
+        # A file rewritten without new events (or restored to an earlier
+        # sequence) cannot be caught up and is indexed from scratch.
+        if self.indexes and (self.sequence <= since or not self._replay_journal(since, self._index_offset)):
+            for space in {space for space, _ in self.indexes}:
+                self._rebuild_indexes(space)
+        self._index_offset = self.change_feed.size()
+
+    def _replay_journal(self, since: int, offset: int) -> bool:
+        if self.change_feed.size() < offset:
+            return False
+        events, _ = self.change_feed.read_from(offset)
+        expected = since + 1
+        for event in events:
+            if event.sequence < expected:
+                continue
+            if event.sequence != expected or event.sequence > self.sequence:
+                break
+            self._apply_to_indexes(event)
+            expected += 1
+        return expected == self.sequence + 1
+
+    def _data_file_identity(self) -> Optional[Dict[str, Any]]:
+        # What the index file was built from, as the warm cache records it
+        signature = self._stat()
+        if signature is None:
+            return None
+        _, size, mtime_ns = signature
+        return {"generation": self.generation, "size": size, "mtime_ns": mtime_ns,
+                "checksum": warm_cache.checksum(self.file_path)}
+
+    def _indexed_file_matches(self, indexed: Optional[Dict[str, Any]]) -> bool:
+        # A later generation is a save of the indexed file, caught up from the
+        # journal; a file of the same or an earlier generation must be the
+        # indexed file itself, so one swapped in from elsewhere is indexed anew
+        if indexed is None:
+            return False
+        if self.generation > indexed["generation"]:
+            return True
+        signature = self._stat()
+        return signature is not None and signature[1:] == (indexed["size"], indexed["mtime_ns"]) \
+            and warm_cache.checksum(self.file_path) == indexed["checksum"]
+
+    def _rebuild_indexes(self, space: str):
+        for (index_space, _), index in self.indexes.items():
+            if index_space == space:
+                index.build(self.data.get(space, {}))
+
+    @staticmethod
+    def _check_version(path: List[str], current: Any, expected_version: Optional[int]) -> int:
+        version = current.get(VERSION, 0) if isinstance(current, dict) else 0
+        if expected_version is not None and expected_version != version:
+            raise VersionConflict(f"Path {path} is at version {version}, expected {expected_version}")
+        return version
+
+    def _read(self, progress: Optional[Callable[[int, int], None]] = None,
+              write_warm_cache: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        with metrics.timer("json_db.warm_cache_read"):
+            data = warm_cache.read(self.warm_cache_path, self.file_path) if self.warm_cache_path else None
+        if data is not None:
+            if progress is not None:
+                size = os.path.getsize(self.file_path)
+                progress(size, size)
+        else:
+            # Reading and decoding the file; segment files are only mapped here
+            with metrics.timer("json_db.read"):
+                data = read_file(self.file_path, self.cache, progress)
+            metrics.add("json_db.bytes_read", os.path.getsize(self.file_path))
+            if write_warm_cache and self.writes_warm_cache and self.warm_cache_path and not any(isinstance(value, segment.LazySpace) for value in data.values()):
+                with metrics.timer("json_db.warm_cache_write"):
+                    warm_cache.write(self.warm_cache_path, self.file_path, data)
+        meta = data.pop(META, {})
+        return data, meta
+
+    def _apply_meta(self, meta: Dict[str, Any], signature: Optional[Tuple[int, int, int]]):
+        self.generation = meta.get("generation", 0)
+        self.sequence = meta.get("sequence", 0)
+        self.space_generations = dict(meta.get("spaces", {}))
+        self._signature = signature
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class Snapshot:
+    """Read-only view of a JsonFileDB at a given generation and sequence."""
+
+    def __init__(self, data: Dict[str, Any], generation: int, sequence: int):
+        self.data = data
+        self.generation = generation
+        self.sequence = sequence
+
+    def get(self, path: List[str]) -> Any:
+        return _lookup(self.data, path)
+
+
+def _lookup(node: Any, path: List[str]) -> Any:
+    for p in path:
+        if p not in node:
+            raise KeyNotFound(f"Path {path} not found in database")
+        node = node[p]
+    return node
 
 class KeyNotFound(Exception):
     pass
+
+class VersionConflict(Exception):
+    pass
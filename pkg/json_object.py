@@ -1,6 +1,9 @@
 import abc
 from typing import Dict, Any, Union, List
 
+# Key under which stores keep the version number of a record
+VERSION = "_version"
+
 
 class JSONObject(abc.ABC):
     @abc.abstractmethod
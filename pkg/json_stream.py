@@ -0,0 +1,151 @@
+import json
+import re
+from typing import Any, Callable, Dict, Optional, TextIO
+
+# Characters of text read from the file at a time
+CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# An object member up to its value, with a key that needs no unescaping
+_MEMBER = re.compile(r'[ \t\n\r]*"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+_SEPARATOR = re.compile(r"[ \t\n\r]*([,}])")
+# What may follow a value; a value not followed by one of these may be cut
+# off by the end of the buffer, e.g. "1." of "1.5"
+_VALUE_END = re.compile(r"[ \t\n\r]*[,}\]:]")
+_decoder = json.JSONDecoder()
+_scan = _decoder.scan_once
+
+
+class StreamReader:
+    """Incremental parser for a JSON document of nested objects.
+
+    Objects down to a given depth are parsed key by key; values below it,
+    typically single records, are decoded whole with the C decoder. Only
+    one chunk of text plus the value being decoded is held at a time, so
+    the peak memory of a load is the decoded data rather than the data plus
+    the whole file text.
+    """
+
+    def __init__(self, file: TextIO, on_chunk: Optional[Callable[[], None]] = None, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.on_chunk = on_chunk
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def document(self, depth: Callable[[str], int]) -> Dict[str, Any]:
+        """Parse the top-level object; depth(key) is how deep to stream each member."""
+        document = {}
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return document
+        while True:
+            key = self.value()
+            self._expect(":")
+            document[key] = self.object(depth(key))
+            if not self._separator():
+                return document
+
+    def object(self, depth: int) -> Any:
+        if depth <= 0 or self._peek() != "{":
+            return self.value()
+        result = {}
+        self.pos += 1
+        if self._peek() == "}":
+            self.pos += 1
+            return result
+        if depth == 1:
+            return self._members(result)
+        while True:
+            key = self.value()
+            self._expect(":")
+            result[key] = self.object(depth - 1)
+            if not self._separator():
+                return result
+
+    def _members(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        # Hot loop of a load: one record per iteration. Records with the same
+        # fields as the previous one share its key strings, as they would
+        # with json.load, which memoizes keys across the whole document.
+        shared_keys = ()
+        while True:
+            match = _MEMBER.match(self.buffer, self.pos)
+            if match is None:
+                # Escaped key or key cut off by the end of the buffer
+                key = self.value()
+                self._expect(":")
+                result[key] = self.value()
+                if not self._separator():
+                    return result
+                continue
+            try:
+                value, end = _scan(self.buffer, match.end())
+            except (StopIteration, json.JSONDecodeError):
+                if not self._fill():
+                    self.pos = match.end()
+                    self.value()
+                continue
+            separator = _SEPARATOR.match(self.buffer, end)
+            if separator is None:
+                if not self._fill():
+                    self.pos = end
+                    self._separator()
+                continue
+            if isinstance(value, dict):
+                keys = tuple(value)
+                if keys == shared_keys:
+                    value = dict(zip(shared_keys, value.values()))
+                else:
+                    shared_keys = keys
+            result[match.group(1)] = value
+            self.pos = separator.end()
+            if separator.group(1) == "}":
+                return result
+
+    def value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                if self.eof or _VALUE_END.match(self.buffer, end):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _separator(self) -> bool:
+        char = self._peek()
+        self.pos += 1
+        if char == "}":
+            return False
+        if char != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", self.buffer, self.pos - 1)
+        return True
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self.buffer, self.pos)
+        self.pos += 1
+
+    def _peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise json.JSONDecodeError("Unexpected end of document", self.buffer, self.pos)
+
+    def _fill(self) -> bool:
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        if self.on_chunk is not None:
+            self.on_chunk()
+        return True
@@ -0,0 +1,238 @@
+import bisect
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Tuple
+
+# Environment variable that turns metrics on when set to a non-empty value
+METRICS_ENV = "FRMS_METRICS"
+# Upper bounds of the latency buckets in seconds, doubling from 10 µs to
+# about 84 s; percentiles are interpolated within a bucket
+BUCKETS = tuple(0.00001 * 2 ** i for i in range(24))
+PERCENTILES = [50, 95, 99]
+# Latest observations kept in order, for breaking down the last operation
+RECENT_OBSERVATIONS = 256
+_PROMETHEUS_PREFIX = "frms"
+
+
+class Histogram:
+    """Latency distribution over fixed buckets, with count, sum and max."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, fraction: float) -> float:
+        """Return an estimate of the value below which fraction of the observations lie."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+                return lower + (upper - lower) * max(rank - seen, 0) / count
+            seen += count
+        return self.max
+
+
+class MetricsRegistry:
+    """Latency histograms and counters by name, e.g. ``json_db.save``.
+
+    While disabled, timer() returns a shared no-op context manager and add()
+    and observe() return at once, and instrument() does not wrap anything.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        # (name, end, seconds) of the latest observations, end by perf_counter
+        self.recent: 'collections.deque[Tuple[str, float, float]]' = collections.deque(maxlen=RECENT_OBSERVATIONS)
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            self.recent.append((name, time.perf_counter(), seconds))
+
+    def add(self, name: str, amount: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timer(self, name: str) -> ContextManager:
+        """Return a context manager observing the time spent in it as name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def instrument(self, obj: Any, prefix: str, methods: Optional[Iterable[str]] = None) -> Any:
+        """Time the public methods of obj, or the named ones, as ``prefix.method``; returns obj.
+
+        Only the instance is changed. Nothing is wrapped while disabled, so
+        uninstrumented objects cost nothing. Methods already timed under the
+        same name are left alone, so instrumenting an object again does not
+        count its calls twice.
+        """
+        if not self.enabled:
+            return obj
+        if methods is None:
+            methods = [name for name in dir(type(obj)) if not name.startswith("_")
+                       and callable(getattr(type(obj), name))]
+        for name in methods:
+            method = getattr(obj, name)
+            if not _timed_as(method, f"{prefix}.{name}"):
+                setattr(obj, name, self._timed(f"{prefix}.{name}", method))
+        return obj
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.recent.clear()
+
+    def recent_observations(self) -> List[Tuple[str, float, float]]:
+        """Return the latest observations, oldest first, as (name, end, seconds)."""
+        with self._lock:
+            return list(self.recent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the call counts, latency percentiles in ms and counters recorded so far."""
+        with self._lock:
+            latency = {}
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                latency[name] = {
+                    "count": histogram.count,
+                    "total_ms": round(histogram.total * 1000, 3),
+                    **{f"p{p}_ms": round(histogram.quantile(p / 100) * 1000, 3) for p in PERCENTILES},
+                    "max_ms": round(histogram.max * 1000, 3)
+                }
+            return {"latency": latency, "counters": dict(sorted(self.counters.items()))}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        histogram_name = f"{_PROMETHEUS_PREFIX}_operation_duration_seconds"
+        lines = [f"# HELP {histogram_name} Time spent in instrumented operations.",
+                 f"# TYPE {histogram_name} histogram"]
+        with self._lock:
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                label = f'operation="{_escape(name)}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{histogram_name}_bucket{{{label},le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{histogram_name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                lines.append(f"{histogram_name}_sum{{{label}}} {histogram.total:.9g}")
+                lines.append(f"{histogram_name}_count{{{label}}} {histogram.count}")
+            for name in sorted(self.counters):
+                counter_name = f"{_PROMETHEUS_PREFIX}_{_metric_name(name)}_total"
+                lines.append(f"# TYPE {counter_name} counter")
+                lines.append(f"{counter_name} {self.counters[name]:.15g}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Write the metrics to path, in Prometheus format if it ends in .prom and as JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json() + "\n"
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+    def _timed(self, name: str, method: Callable) -> Callable:
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start)
+
+        timed.metric_name = name
+        return timed
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+# Registry of the process, on when METRICS_ENV is set
+REGISTRY = MetricsRegistry(enabled=bool(os.environ.get(METRICS_ENV)))
+
+
+def enable():
+    REGISTRY.enabled = True
+
+
+def disable():
+    REGISTRY.enabled = False
+
+
+def timer(name: str) -> ContextManager:
+    return REGISTRY.timer(name)
+
+
+def add(name: str, amount: float = 1):
+    REGISTRY.add(name, amount)
+
+
+def instrument(obj: Any, prefix: str, methods: Optional[Iterable[str]] = None) -> Any:
+    return REGISTRY.instrument(obj, prefix, methods)
+
+
+def _timed_as(method: Callable, name: str) -> bool:
+    # Look through other wrappers, e.g. a workload recorder's, for our own
+    while method is not None:
+        if getattr(method, "metric_name", None) == name:
+            return True
+        method = getattr(method, "__wrapped__", None)
+    return False
+
+
+def _metric_name(name: str) -> str:
+    return "".join(char if char.isalnum() else "_" for char in name)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,153 @@
+import contextlib
+import io
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # The profiling modules take longer to import than the whole CLI takes
+    # to start; only a run that profiles pays for them
+    import cProfile
+    import pstats
+
+# Environment variable that profiles the whole run of an entry point when set
+# to a non-empty value
+PROFILE_ENV = "FRMS_PROFILE"
+# Stack frames kept per allocation, and lines in each section of a report
+TRACEMALLOC_FRAMES = 5
+REPORT_LINES = 30
+
+
+class Profiler:
+    """cProfile and tracemalloc over a time window, reported to files in a directory.
+
+    cProfile sees only the thread that starts it; other threads join the
+    window with thread(). stop() writes two files named after the label and
+    the start time: a .pstats file for ``python -m pstats`` or snakeviz, and
+    a .txt report with the top functions by cumulative and own time and the
+    top allocation sites.
+    """
+
+    def __init__(self, directory: str, label: str = "profile"):
+        self.directory = directory
+        self.label = label
+        self._profile: Optional['cProfile.Profile'] = None
+        self._thread_profiles: List['cProfile.Profile'] = []
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        self._start = 0.0
+        self._start_time = 0.0
+        # Paths written when used as a context manager
+        self.report_paths: Optional[Tuple[str, str]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+
+        if self.running:
+            return
+        self._thread_profiles = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    @contextlib.contextmanager
+    def thread(self):
+        """Profile the calling thread for the duration of the block while the window is open."""
+        if not self.running:
+            yield
+            return
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._thread_profiles.append(profile)
+
+    def stop(self) -> Tuple[str, str]:
+        """Close the window and write the reports; returns the paths of the .pstats and .txt files."""
+        import pstats
+        import tracemalloc
+
+        profile, self._profile = self._profile, None
+        if profile is None:
+            raise RuntimeError("the profiler is not running")
+        profile.disable()
+        elapsed = time.perf_counter() - self._start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        stats = pstats.Stats(profile)
+        with self._lock:
+            for thread_profile in self._thread_profiles:
+                stats.add(thread_profile)
+            threads = len(self._thread_profiles)
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._start_time)) + \
+            f"{int(self._start_time * 1000) % 1000:03d}"
+        base = os.path.join(self.directory, f"profile-{stamp}-{_file_name(self.label)}")
+        stats_path, report_path = base + ".pstats", base + ".txt"
+        stats.dump_stats(stats_path)
+        with open(report_path, 'w') as file:
+            file.write(f"{self.label}: {elapsed:.3f} s profiled, {threads} other thread block(s), "
+                       f"peak traced memory {peak / (1024 * 1024):.1f} MiB\n")
+            file.write(f"Load the full profile with: python -m pstats {stats_path}\n\n")
+            for sort in ["cumulative", "tottime"]:
+                file.write(f"Top {REPORT_LINES} functions by {sort} time\n")
+                file.write(_stats_text(stats, sort))
+            file.write(f"Top {REPORT_LINES} allocation sites still held at the end of the window\n")
+            for statistic in snapshot.statistics("lineno")[:REPORT_LINES]:
+                file.write(f"{statistic}\n")
+        return stats_path, report_path
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.report_paths = self.stop()
+        return False
+
+
+def profile_call(directory: str, label: str, func: Callable, *args, **kwargs) -> Tuple[Any, Tuple[str, str]]:
+    """Run func under a Profiler; returns its result and the paths of the reports."""
+    profiler = Profiler(directory, label)
+    profiler.start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        paths = profiler.stop()
+    return result, paths
+
+
+def _stats_text(stats: 'pstats.Stats', sort: str) -> str:
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(REPORT_LINES)
+    return out.getvalue()
+
+
+def _file_name(label: str) -> str:
+    return "".join(char if char.isalnum() or char in "-_" else "-" for char in label)
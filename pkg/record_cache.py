@@ -0,0 +1,68 @@
+import collections
+import threading
+from typing import Any, Dict, Hashable, Tuple
+
+# Default memory budget for decoded records, in bytes of encoded record
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class RecordCache:
+    """LRU cache of decoded records within a memory budget.
+
+    Entries are weighted by the size of the encoded record, which is cheap
+    to know and tracks the size of the decoded object closely enough for a
+    budget. Least recently used records are evicted first and decoded again
+    from the file when next needed.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'collections.OrderedDict[Hashable, Tuple[Any, int]]' = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached record, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, record: Any, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (record, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,103 @@
+import time
+from typing import Any, Dict, List
+
+from pkg.change_feed import DELETE, ChangeEvent
+from pkg.json_db import JsonFileDB
+
+
+class ReplicaDB(JsonFileDB):
+    """Read-only JsonFileDB that follows the journal written by the primaries.
+
+    The data file is read once; after that the replica only reads journal
+    lines appended since its last look and applies them to its own copy and
+    indexes. A gap in the sequence or a rewritten journal makes it reload the
+    data file. Writes raise ReadOnlyError.
+    """
+
+    writes_warm_cache = False
+
+    def __init__(self, file_path, **kwargs):
+        self._journal_offset = 0
+        self.last_event_time = 0.0
+        super().__init__(file_path, **kwargs)
+        self._catch_up_journal(0)
+
+    def changed(self) -> bool:
+        return self.change_feed.size() != self._journal_offset
+
+    def refresh(self) -> bool:
+        if not self.changed():
+            return False
+        with self.lock.local():
+            if self.change_feed.size() < self._journal_offset:
+                self._resync()
+            else:
+                self._catch_up_journal(self._journal_offset)
+        return True
+
+    def lag(self) -> Dict[str, Any]:
+        """Report how far the replica is behind the journal."""
+        pending, _ = self.change_feed.read_from(self._journal_offset)
+        pending = [event for event in pending if event.sequence > self.sequence]
+        return {
+            "sequence": self.sequence,
+            "events_behind": len(pending),
+            "seconds_behind": round(time.time() - pending[0].timestamp, 3) if pending else 0.0,
+            "last_event_time": self.last_event_time
+        }
+
+    def set(self, path: List[str], value: Any, expected_version=None):
+        raise ReadOnlyError("Replica is read-only")
+
+    def delete(self, path: List[str], expected_version=None):
+        raise ReadOnlyError("Replica is read-only")
+
+    def save(self):
+        raise ReadOnlyError("Replica is read-only")
+
+    def _catch_up_journal(self, offset: int):
+        events, offset = self.change_feed.read_from(offset)
+        applied = []
+        for event in events:
+            if event.sequence <= self.sequence:
+                continue
+            if event.sequence != self.sequence + 1:
+                # Missed events (e.g. a crash before journalling): start over
+                self._resync()
+                return
+            self._apply_event(event)
+            applied.append(event)
+        self._journal_offset = offset
+        self.change_feed.dispatch(applied)
+
+    def _apply_event(self, event: ChangeEvent):
+        path = [event.entity] + event.record_id.split("/")
+        node = self._parent(path, create=True)
+        if event.op == DELETE:
+            node.pop(path[-1], None)
+        else:
+            node[path[-1]] = event.after
+        self.sequence = event.sequence
+        self.last_event_time = event.timestamp
+        self._apply_to_indexes(event)
+
+    def _resync(self):
+        self.data = self.load()
+        self._frozen.clear()
+        for space in {space for space, _ in self.indexes}:
+            self._rebuild_indexes(space)
+        events, offset = self.change_feed.read_from(0)
+        expected = self.sequence + 1
+        for event in events:
+            if event.sequence < expected:
+                continue
+            if event.sequence != expected:
+                # The journal does not cover the data file; wait for new writes
+                break
+            self._apply_event(event)
+            expected += 1
+        self._journal_offset = offset
+
+
+class ReadOnlyError(Exception):
+    pass
@@ -0,0 +1,183 @@
+import itertools
+import json
+import mmap
+import struct
+from collections.abc import Mapping, MutableMapping
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set
+
+from pkg.record_cache import RecordCache
+
+MAGIC = b"JDBSEG1\n"
+# Footer position and end marker in the last bytes of the file
+TRAILER = struct.Struct("<Q8s")
+TRAILER_MAGIC = b"JDBSEGX\n"
+
+# Distinguishes the cache entries of LazySpace instances holding different records
+_tokens = itertools.count()
+
+
+class LazySpace(Mapping):
+    """Read-only mapping of record ids to records decoded on access.
+
+    Only the record ids and offsets are held in memory; each lookup decodes
+    the record from the underlying buffer, usually a memory map of the file.
+    With a RecordCache, recently used records are kept decoded. Entries are
+    keyed by a token that only LazySpaces holding the same encoded records
+    share (see share_cache), so they never need invalidating.
+    """
+
+    def __init__(self, buffer, ids: List[str], offsets: List[int], cache: Optional[RecordCache] = None):
+        self._buffer = buffer
+        self._positions = {record_id: i for i, record_id in enumerate(ids)}
+        self._offsets = offsets
+        self._cache = cache
+        self._token = next(_tokens)
+
+    def __getitem__(self, record_id: str) -> Any:
+        if self._cache is None:
+            return json.loads(self.raw(record_id))
+        record = self._cache.get((self._token, record_id))
+        if record is None:
+            raw = self.raw(record_id)
+            record = json.loads(raw)
+            self._cache.put((self._token, record_id), record, len(raw))
+        return record
+
+    def __contains__(self, record_id: object) -> bool:
+        return record_id in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def raw(self, record_id: str) -> bytes:
+        """Return the encoded record without decoding it."""
+        i = self._positions[record_id]
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]]
+
+    def share_cache(self, other: 'LazySpace'):
+        """Reuse the cache entries of other, which must hold the same encoded records, e.g. of an earlier map."""
+        self._token = other._token
+
+
+class OverlaySpace(MutableMapping):
+    """Writable view of a LazySpace that keeps only changed records in memory.
+
+    Written records are held in a dict and deleted ids in a set; every other
+    record is still decoded from the mapped file on access.
+    """
+
+    def __init__(self, base: LazySpace, changes: Optional[Dict[str, Any]] = None,
+                 deleted: Optional[Set[str]] = None):
+        self.base = base
+        self.changes = changes if changes is not None else {}
+        self.deleted = deleted if deleted is not None else set()
+
+    def __getitem__(self, record_id: str) -> Any:
+        if record_id in self.changes:
+            return self.changes[record_id]
+        if record_id in self.deleted:
+            raise KeyError(record_id)
+        return self.base[record_id]
+
+    def __setitem__(self, record_id: str, record: Any):
+        self.changes[record_id] = record
+        self.deleted.discard(record_id)
+
+    def __delitem__(self, record_id: str):
+        if record_id not in self:
+            raise KeyError(record_id)
+        self.changes.pop(record_id, None)
+        if record_id in self.base:
+            self.deleted.add(record_id)
+
+    def __contains__(self, record_id: object) -> bool:
+        return record_id in self.changes or (record_id in self.base and record_id not in self.deleted)
+
+    def __iter__(self) -> Iterator[str]:
+        for record_id in self.base:
+            if record_id not in self.changes and record_id not in self.deleted:
+                yield record_id
+        yield from self.changes
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def raw(self, record_id: str) -> Optional[bytes]:
+        """Return the encoded record if it is unchanged since the file was mapped."""
+        if record_id in self.changes:
+            return None
+        return self.base.raw(record_id)
+
+    def copy(self) -> 'OverlaySpace':
+        return OverlaySpace(self.base, dict(self.changes), set(self.deleted))
+
+
+def writable_copy(space: Any) -> Any:
+    """Return a copy of space that can be written without touching space."""
+    if isinstance(space, LazySpace):
+        return OverlaySpace(space)
+    if isinstance(space, OverlaySpace):
+        return space.copy()
+    return dict(space)
+
+
+def encode(document: Dict[str, Any]) -> bytes:
+    """Encode a document as a segment: records back to back, then an index.
+
+    Spaces are mappings of record ids to records; anything else, such as the
+    _meta header, is stored in the footer. Unchanged records of a mapped
+    space are copied without being decoded.
+    """
+    chunks = [MAGIC]
+    position = len(MAGIC)
+    headers = {}
+    spaces = {}
+    for space, records in document.items():
+        if space.startswith("_") or not isinstance(records, Mapping):
+            headers[space] = records
+            continue
+        ids = list(records)
+        offsets = [position]
+        mapped = isinstance(records, (LazySpace, OverlaySpace))
+        for record_id in ids:
+            raw = records.raw(record_id) if mapped else None
+            if raw is None:
+                raw = json.dumps(records[record_id], separators=(",", ":")).encode()
+            chunks.append(raw)
+            position += len(raw)
+            offsets.append(position)
+        spaces[space] = {"ids": ids, "offsets": offsets}
+    chunks.append(json.dumps({"headers": headers, "spaces": spaces}, separators=(",", ":")).encode())
+    chunks.append(TRAILER.pack(position, TRAILER_MAGIC))
+    return b"".join(chunks)
+
+
+def decode(buffer, cache: Optional[RecordCache] = None) -> Dict[str, Any]:
+    """Return the document in buffer with its spaces as LazySpace mappings."""
+    end = len(buffer) - TRAILER.size
+    if buffer[:len(MAGIC)] != MAGIC or end < len(MAGIC):
+        raise SegmentError("Not a segment file")
+    footer_offset, magic = TRAILER.unpack_from(buffer, end)
+    if magic != TRAILER_MAGIC:
+        raise SegmentError("Segment file is truncated")
+    footer = json.loads(buffer[footer_offset:end])
+    document = dict(footer["headers"])
+    for space, index in footer["spaces"].items():
+        document[space] = LazySpace(buffer, index["ids"], index["offsets"], cache)
+    return document
+
+
+def read(file: BinaryIO, cache: Optional[RecordCache] = None) -> Dict[str, Any]:
+    """Memory-map an open segment file and decode its index.
+
+    The map stays valid after the file is closed or replaced, and the pages
+    are shared with every other process mapping the same file.
+    """
+    return decode(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), cache)
+
+
+class SegmentError(Exception):
+    pass
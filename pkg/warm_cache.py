@@ -0,0 +1,77 @@
+import marshal
+import mmap
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+from pkg import segment
+
+CACHE_FORMAT = 1
+_MAGIC = b"JDBWARM1\n"
+
+
+def checksum(path: str) -> int:
+    """Return the CRC32 of a file's contents."""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return zlib.crc32(b"")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return zlib.crc32(buffer)
+
+
+def write(cache_path: str, source_path: str, document: Dict[str, Any],
+          source_checksum: Optional[int] = None) -> bool:
+    """Save the parsed document of source_path for read() to return while the file is unchanged.
+
+    source_checksum is the CRC32 of the file, if the caller already has it.
+    Returns False without writing if the cache already matches the file, as
+    when another process that loaded the same file wrote it first.
+    """
+    stat = os.stat(source_path)
+    if source_checksum is None:
+        source_checksum = checksum(source_path)
+    header = {"format": CACHE_FORMAT, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "checksum": source_checksum}
+    try:
+        with open(cache_path, 'rb') as file:
+            if _read_header(file) == header:
+                return False
+    except OSError:
+        pass
+    document = {key: dict(value) if isinstance(value, (segment.LazySpace, segment.OverlaySpace)) else value
+                for key, value in document.items()}
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(_MAGIC)
+        marshal.dump(header, file)
+        marshal.dump(document, file)
+    os.replace(tmp_path, cache_path)
+    return True
+
+
+def read(cache_path: str, source_path: str) -> Optional[Dict[str, Any]]:
+    """Return the cached document of source_path, or None if it is missing or stale.
+
+    The cache is used only if the size, modification time and checksum of
+    the source file all match the ones it was written for.
+    """
+    try:
+        with open(cache_path, 'rb') as file:
+            header = _read_header(file)
+            if header is None:
+                return None
+            stat = os.stat(source_path)
+            if (header.get("format") != CACHE_FORMAT or header.get("size") != stat.st_size
+                    or header.get("mtime_ns") != stat.st_mtime_ns or header.get("checksum") != checksum(source_path)):
+                return None
+            return marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _read_header(file) -> Optional[Dict[str, Any]]:
+    if file.read(len(_MAGIC)) != _MAGIC:
+        return None
+    try:
+        return marshal.load(file)
+    except (EOFError, ValueError, TypeError):
+        return None
@@ -1,7 +1,10 @@
-from typing import Callable, Optional, Dict, Any, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
+from pkg.json_object import VERSION
 from src.airline.model import Airline, AirlineInvalidError, AirlineUpdateRequest
-from src.airline.repository import AirlineRepository, AirlineRepositoryError
+from src.airline.repository import (
+    AsyncAirlineRepository, AirlineRepository, AirlineRepositoryError, AirlineVersionConflictError
+)
 
 
 class AirlineController:
@@ -12,78 +15,219 @@ class AirlineController:
         self.airline_repository = airline_repository
         self.view_update_callback = view_update_callback
 
-    def create_airline(self, airline_data: Dict[str, Any]) -> bool:
-        """Create a new airline record."""
+    def create_airline(self, airline_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Create a new airline record.
+
+        With expected_version=0 the record is only created if no airline has its
+        ID yet; otherwise AirlineVersionConflictError is raised.
+        """
         # Validate data
-        try:
-            airline = Airline.from_json(airline_data)
-        except AirlineInvalidError as e:
+        airline = _parse_airline(airline_data)
+        if airline is None:
             return False
 
         # Create the record
         try:
-            self.airline_repository.create_airline(airline)
+            self.airline_repository.create_airline(airline, expected_version)
+        except AirlineVersionConflictError:
+            raise
         except AirlineRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
-    def update_airline(self, airline_id: str, updated_data: Dict[str, Any]) -> bool:
-        """Update an existing airline record."""
+    def update_airline(self, airline_id: str, updated_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Update an existing airline record.
+
+        Raises AirlineVersionConflictError if expected_version is given and the
+        record has been changed since.
+        """
         # Validate data
-        try:
-            airline_update_request = AirlineUpdateRequest.from_json(updated_data)
-            airline_update_request.id = airline_id
-        except AirlineInvalidError as e:
+        airline_update_request = _parse_update(airline_id, updated_data)
+        if airline_update_request is None:
             return False
 
         # Update the record
         try:
-            self.airline_repository.update_airline(airline_update_request)
+            self.airline_repository.update_airline(airline_update_request, expected_version)
+        except AirlineVersionConflictError:
+            raise
         except AirlineRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
-    def delete_airline(self, airline_id: str) -> bool:
-        """Delete an airline record."""
+    def delete_airline(self, airline_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete an airline record.
+
+        Raises AirlineVersionConflictError if expected_version is given and the
+        record has been changed since.
+        """
         # Delete the record
         try:
-            self.airline_repository.delete_airline(airline_id)
+            self.airline_repository.delete_airline(airline_id, expected_version)
+        except AirlineVersionConflictError:
+            raise
         except AirlineRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
     def search_airlines(self, search_term: str) -> List[Dict[str, Any]]:
         """Search for airline records."""
         try:
-            return [airline.to_json() for airline in self.airline_repository.get_airlines() if airline.contains_term(search_term)]
+            return _matching(self.airline_repository.search_airlines(search_term), search_term)
+        except AirlineRepositoryError as e:
+            return []
+
+    def find_airlines(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get the airline records whose field equals value."""
+        try:
+            return [_to_dict(airline) for airline in self.airline_repository.find_airlines(field, value)]
         except AirlineRepositoryError as e:
             return []
 
     def get_all_airlines(self) -> List[Dict[str, Any]]:
         """Get all airline records."""
         try:
-            return [airline.to_json() for airline in self.airline_repository.get_airlines()]
+            return [_to_dict(airline) for airline in self.airline_repository.get_airlines()]
         except AirlineRepositoryError as e:
             return []
 
+    def iter_airlines(self, search_term: Optional[str] = None, field: Optional[str] = None,
+                      value: Any = None) -> Iterator[Dict[str, Any]]:
+        """Yield the airline records matching search_term, or whose field equals value, one at a time.
+
+        Without either, yields all airline records. Each record is converted as it
+        is reached, so a listing is never held in full.
+        """
+        try:
+            airlines = self.airline_repository.iter_airlines(search_term, field, value)
+        except AirlineRepositoryError as e:
+            return iter(())
+        if search_term is not None:
+            # Index candidates may only share n-grams with the term; check each
+            airlines = (airline for airline in airlines if airline.contains_term(search_term))
+        return (_to_dict(airline) for airline in airlines)
+
     def get_airline_by_id(self, airline_id: str) -> Optional[Dict[str, Any]]:
         """Get an airline record by ID."""
         try:
-            return self.airline_repository.get_airline(airline_id).to_json()
+            return _to_dict(self.airline_repository.get_airline(airline_id))
         except AirlineRepositoryError as e:
             return None
+
+
+class AsyncAirlineController:
+    """Controller for airline operations on an asyncio event loop.
+
+    Validates and converts records with the same helpers as AirlineController.
+    """
+
+    def __init__(self, airline_repository: AsyncAirlineRepository, view_update_callback: Optional[Callable] = None):
+        """Initialize with model and optional view update callback."""
+        self.airline_repository = airline_repository
+        self.view_update_callback = view_update_callback
+
+    async def create_airline(self, airline_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Create a new airline record; see AirlineController.create_airline."""
+        airline = _parse_airline(airline_data)
+        if airline is None:
+            return False
+        try:
+            await self.airline_repository.create_airline(airline, expected_version)
+        except AirlineVersionConflictError:
+            raise
+        except AirlineRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def update_airline(self, airline_id: str, updated_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Update an existing airline record; see AirlineController.update_airline."""
+        airline_update_request = _parse_update(airline_id, updated_data)
+        if airline_update_request is None:
+            return False
+        try:
+            await self.airline_repository.update_airline(airline_update_request, expected_version)
+        except AirlineVersionConflictError:
+            raise
+        except AirlineRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def delete_airline(self, airline_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete an airline record; see AirlineController.delete_airline."""
+        try:
+            await self.airline_repository.delete_airline(airline_id, expected_version)
+        except AirlineVersionConflictError:
+            raise
+        except AirlineRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def search_airlines(self, search_term: str) -> List[Dict[str, Any]]:
+        """Search for airline records."""
+        try:
+            return _matching(await self.airline_repository.search_airlines(search_term), search_term)
+        except AirlineRepositoryError as e:
+            return []
+
+    async def find_airlines(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get the airline records whose field equals value."""
+        try:
+            return [_to_dict(airline) for airline in await self.airline_repository.find_airlines(field, value)]
+        except AirlineRepositoryError as e:
+            return []
+
+    async def get_all_airlines(self) -> List[Dict[str, Any]]:
+        """Get all airline records."""
+        try:
+            return [_to_dict(airline) for airline in await self.airline_repository.get_airlines()]
+        except AirlineRepositoryError as e:
+            return []
+
+    async def get_airline_by_id(self, airline_id: str) -> Optional[Dict[str, Any]]:
+        """Get an airline record by ID."""
+        try:
+            return _to_dict(await self.airline_repository.get_airline(airline_id))
+        except AirlineRepositoryError as e:
+            return None
+
+
+def _parse_airline(airline_data: Dict[str, Any]) -> Optional[Airline]:
+    """Return the airline in airline_data, or None if it is invalid."""
+    try:
+        return Airline.from_json(airline_data)
+    except AirlineInvalidError:
+        return None
+
+
+def _parse_update(airline_id: str, updated_data: Dict[str, Any]) -> Optional[AirlineUpdateRequest]:
+    """Return the update of airline_id in updated_data, or None if it is invalid."""
+    try:
+        airline_update_request = AirlineUpdateRequest.from_json(updated_data)
+    except AirlineInvalidError:
+        return None
+    airline_update_request.id = airline_id
+    return airline_update_request
+
+
+def _matching(airlines: Iterable[Airline], search_term: str) -> List[Dict[str, Any]]:
+    # Index candidates may only share n-grams with the term; check each
+    return [_to_dict(airline) for airline in airlines if airline.contains_term(search_term)]
+
+
+def _update_view(view_update_callback: Optional[Callable]):
+    # Update the view if callback provided
+    if view_update_callback:
+        view_update_callback()
+
+
+def _to_dict(airline: Airline) -> Dict[str, Any]:
+    return {**airline.to_json(), VERSION: airline.version}
@@ -1,7 +1,7 @@
 import dataclasses
 from typing import Dict, Any, Optional
 
-from pkg.json_object import JSONObject
+from pkg.json_object import JSONObject, VERSION
 
 ID = "ID"
 TYPE = "Type"
@@ -17,6 +17,7 @@ class Airline(JSONObject):
     company_name: str
     country: str
     iata_code: str
+    version: int = 0
 
     def to_json(self) -> Dict[str, Any]:
         return {
@@ -38,7 +39,8 @@ class Airline(JSONObject):
             airline_type=json.get(TYPE, ""),
             company_name=json.get(COMPANY_NAME, ""),
             country=json.get(COUNTRY, ""),
-            iata_code=json.get(IATA_CODE, "")
+            iata_code=json.get(IATA_CODE, ""),
+            version=json.get(VERSION, 0)
         )
 
 @dataclasses.dataclass
@@ -1,5 +1,5 @@
 import abc
-from typing import List
+from typing import Any, Iterator, List, Optional
 
 from src.airline.model import Airline, AirlineUpdateRequest
 
@@ -14,16 +14,59 @@ class AirlineRepository(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def create_airline(self, airline: Airline):
+    def create_airline(self, airline: Airline, expected_version: Optional[int] = None):
         pass
 
     @abc.abstractmethod
-    def update_airline(self, airline_update_request: AirlineUpdateRequest):
+    def update_airline(self, airline_update_request: AirlineUpdateRequest, expected_version: Optional[int] = None):
         pass
 
     @abc.abstractmethod
-    def delete_airline(self, airline_id: str):
+    def delete_airline(self, airline_id: str, expected_version: Optional[int] = None):
         pass
 
+    def find_airlines(self, field: str, value: Any) -> List[Airline]:
+        return [airline for airline in self.get_airlines() if airline.to_json().get(field) == value]
+
+    def search_airlines(self, term: str) -> List[Airline]:
+        return [airline for airline in self.get_airlines() if airline.contains_term(term)]
+
+    def iter_airlines(self, term: Optional[str] = None, field: Optional[str] = None, value: Any = None) -> Iterator[Airline]:
+        if term is not None:
+            return iter(self.search_airlines(term))
+        if field is not None:
+            return iter(self.find_airlines(field, value))
+        return iter(self.get_airlines())
+
+class AsyncAirlineRepository(abc.ABC):
+    @abc.abstractmethod
+    async def get_airlines(self) -> List[Airline]:
+        pass
+
+    @abc.abstractmethod
+    async def get_airline(self, airline_id: str) -> Airline:
+        pass
+
+    @abc.abstractmethod
+    async def create_airline(self, airline: Airline, expected_version: Optional[int] = None):
+        pass
+
+    @abc.abstractmethod
+    async def update_airline(self, airline_update_request: AirlineUpdateRequest, expected_version: Optional[int] = None):
+        pass
+
+    @abc.abstractmethod
+    async def delete_airline(self, airline_id: str, expected_version: Optional[int] = None):
+        pass
+
+    async def find_airlines(self, field: str, value: Any) -> List[Airline]:
+        return [airline for airline in await self.get_airlines() if airline.to_json().get(field) == value]
+
+    async def search_airlines(self, term: str) -> List[Airline]:
+        return [airline for airline in await self.get_airlines() if airline.contains_term(term)]
+
 class AirlineRepositoryError(Exception):
     pass
+
+class AirlineVersionConflictError(AirlineRepositoryError):
+    pass
@@ -1,8 +1,15 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
 
-from pkg.json_db import JsonFileDB, KeyNotFound
+from pkg import metrics
+from pkg.json_db import JsonFileDB, KeyNotFound, VersionConflict
+from pkg.json_object import VERSION
 from src.airline.model import AirlineUpdateRequest, Airline
-from src.airline.repository import AirlineRepository, AirlineRepositoryError
+from src.airline.repository import (
+    AirlineRepository, AirlineRepositoryError, AirlineVersionConflictError, AsyncAirlineRepository
+)
+
+if TYPE_CHECKING:
+    from pkg.async_json_db import AsyncJsonFileDB
 
 SPACE = "Airline"
 
@@ -12,10 +19,12 @@ class AirlineRepositoryJson(AirlineRepository):
 
     def get_airlines(self) -> List[Airline]:
         try:
-            airlines_dict = self.json_db.get([SPACE])
+            # Iterate a snapshot so concurrent writes cannot change the dict under us
+            airlines_dict = self.json_db.snapshot().get([SPACE])
         except KeyNotFound:
             return []
         airlines = [airline for airline in airlines_dict.values()]
+        metrics.add("airline_repository.records_scanned", len(airlines))
         return [Airline.from_json(airline) for airline in airlines]
 
     def get_airline(self, airline_id: str):
@@ -25,25 +34,100 @@ class AirlineRepositoryJson(AirlineRepository):
             raise AirlineRepositoryError(f"Airline with id {airline_id} not found")
         return Airline.from_json(airline)
 
-    def create_airline(self, airline: Airline):
-        self.json_db.set([SPACE, airline.airline_id], airline.to_json())
+    def find_airlines(self, field: str, value: Any) -> List[Airline]:
+        return [Airline.from_json(airline) for airline in self.json_db.find(SPACE, field, value)]
+
+    def search_airlines(self, term: str) -> List[Airline]:
+        # Candidates from the n-gram index when there is one; the controller
+        # still checks each with contains_term
+        return [Airline.from_json(airline) for airline in self.json_db.search(SPACE, term)]
+
+    def iter_airlines(self, term: Optional[str] = None, field: Optional[str] = None, value: Any = None) -> Iterator[Airline]:
+        # Only references to the stored records are gathered up front; each is
+        # converted as the caller gets to it
+        if term is not None:
+            airlines = self.json_db.search(SPACE, term)
+        elif field is not None:
+            airlines = self.json_db.find(SPACE, field, value)
+        else:
+            try:
+                airlines_dict = self.json_db.snapshot().get([SPACE])
+            except KeyNotFound:
+                return iter(())
+            metrics.add("airline_repository.records_scanned", len(airlines_dict))
+            airlines = airlines_dict.values()
+        return (Airline.from_json(airline) for airline in airlines)
 
-    def update_airline(self, airline_update_request: AirlineUpdateRequest):
+    def create_airline(self, airline: Airline, expected_version: Optional[int] = None):
         try:
-            airline = self.json_db.get([SPACE, airline_update_request.airline_id])
-        except KeyNotFound:
-            raise AirlineRepositoryError(f"Airline with id {airline_update_request.airline_id} not found")
+            self.json_db.set([SPACE, airline.airline_id], airline.to_json(), expected_version=expected_version)
+        except VersionConflict as e:
+            raise AirlineVersionConflictError(str(e))
 
-        updated_airline = airline_update_request.to_json()
-        for key, value in updated_airline.items():
-            if value is not None:
-                airline[key] = value
+    def update_airline(self, airline_update_request: AirlineUpdateRequest, expected_version: Optional[int] = None):
+        # Compare-and-set: without an expected version, retry against the
+        # latest stored version until no concurrent write slips in between
+        while True:
+            try:
+                airline = dict(self.json_db.get([SPACE, airline_update_request.airline_id]))
+            except KeyNotFound:
+                raise AirlineRepositoryError(f"Airline with id {airline_update_request.airline_id} not found")
 
-        self.json_db.set([SPACE, airline_update_request.airline_id], airline)
+            _merge_update(airline, airline_update_request)
 
+            version = airline.get(VERSION, 0) if expected_version is None else expected_version
+            try:
+                self.json_db.set([SPACE, airline_update_request.airline_id], airline, expected_version=version)
+                return
+            except VersionConflict as e:
+                if expected_version is not None:
+                    raise AirlineVersionConflictError(str(e))
 
-    def delete_airline(self, airline_id: str):
+    def delete_airline(self, airline_id: str, expected_version: Optional[int] = None):
         try:
-            self.json_db.delete([SPACE, airline_id])
+            self.json_db.delete([SPACE, airline_id], expected_version=expected_version)
         except KeyNotFound:
             raise AirlineRepositoryError(f"Airline with id {airline_id} not found")
+        except VersionConflict as e:
+            raise AirlineVersionConflictError(str(e))
+
+
+class AsyncAirlineRepositoryJson(AsyncAirlineRepository):
+    """Non-blocking counterpart of AirlineRepositoryJson.
+
+    Runs the same operations of a AirlineRepositoryJson over the JsonFileDB of
+    the AsyncJsonFileDB: reads on the default thread pool, writes in the next
+    batch of the writer thread, resolving once it is saved.
+    """
+
+    def __init__(self, json_db: 'AsyncJsonFileDB'):
+        self.json_db = json_db
+        self.repository = AirlineRepositoryJson(json_db.json_db)
+
+    async def get_airlines(self) -> List[Airline]:
+        return await self.json_db.read(self.repository.get_airlines)
+
+    async def get_airline(self, airline_id: str) -> Airline:
+        return await self.json_db.read(self.repository.get_airline, airline_id)
+
+    async def find_airlines(self, field: str, value: Any) -> List[Airline]:
+        return await self.json_db.read(self.repository.find_airlines, field, value)
+
+    async def search_airlines(self, term: str) -> List[Airline]:
+        return await self.json_db.read(self.repository.search_airlines, term)
+
+    async def create_airline(self, airline: Airline, expected_version: Optional[int] = None):
+        await self.json_db.write(self.repository.create_airline, airline, expected_version)
+
+    async def update_airline(self, airline_update_request: AirlineUpdateRequest, expected_version: Optional[int] = None):
+        # Runs on the writer thread inside the batch, which holds the write lock
+        await self.json_db.write(self.repository.update_airline, airline_update_request, expected_version)
+
+    async def delete_airline(self, airline_id: str, expected_version: Optional[int] = None):
+        await self.json_db.write(self.repository.delete_airline, airline_id, expected_version)
+
+
+def _merge_update(airline: Dict[str, Any], airline_update_request: AirlineUpdateRequest):
+    for key, value in airline_update_request.to_json().items():
+        if value is not None:
+            airline[key] = value
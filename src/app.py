@@ -0,0 +1,139 @@
+"""
+Flight Record Management System
+Application Wiring
+
+Builds the storage, repository and controller layers without importing any
+user interface code, so headless entry points can share them with the GUI.
+"""
+
+import dataclasses
+import os
+from typing import TYPE_CHECKING, Optional, Type
+
+from pkg import metrics
+from pkg.index import NGRAM
+from pkg.json_db import JsonFileDB
+from pkg.record_cache import DEFAULT_CACHE_BYTES
+from pkg.replica import ReplicaDB
+from src.airline.controller import AirlineController, AsyncAirlineController
+from src.airline.repository import AirlineVersionConflictError
+from src.airline.repository_json import AirlineRepositoryJson, AsyncAirlineRepositoryJson
+from src.client.controller import ClientController, AsyncClientController
+from src.client.repository import ClientVersionConflictError
+from src.client.repository_json import ClientRepositoryJson, AsyncClientRepositoryJson
+from src.flight.controller import FlightController, AsyncFlightController
+from src.flight.model import AIRLINE_ID, CLIENT_ID, DATE
+from src.flight.repository import FlightVersionConflictError
+from src.flight.repository_json import FlightRepositoryJson, AsyncFlightRepositoryJson
+
+if TYPE_CHECKING:
+    # asyncio takes longer to import than the rest of the app; only the
+    # async entry points pay for it
+    from pkg.async_json_db import AsyncJsonFileDB
+
+# Flight fields indexed for lookups and reporting queries
+FIELD_INDEXES = [("Flight", CLIENT_ID), ("Flight", AIRLINE_ID), ("Flight", DATE)]
+# Indexes kept in a file next to the data file and reused on startup: the
+# lookups above plus substring search over every space
+PERSISTENT_INDEXES = FIELD_INDEXES + [("Client", NGRAM), ("Airline", NGRAM), ("Flight", NGRAM)]
+
+
+@dataclasses.dataclass
+class Resource:
+    controller: str
+    entity: str
+    plural: str
+    id_field: str
+    conflict_error: Type[Exception]
+    space: str
+
+
+# Errors of a write taken to mean a record of the wrong shape, e.g. a
+# number where the model expects a string, or text that is not JSON
+BAD_INPUT_ERRORS = (AttributeError, KeyError, TypeError, ValueError)
+
+# Record types by the name headless entry points use for them
+RESOURCES = {
+    "clients": Resource("client_controller", "client", "clients", "ID", ClientVersionConflictError, "Client"),
+    "airlines": Resource("airline_controller", "airline", "airlines", "ID", AirlineVersionConflictError, "Airline"),
+    "flights": Resource("flight_controller", "flight", "flights", "Flight ID", FlightVersionConflictError, "Flight"),
+}
+
+
+def default_data_file() -> str:
+    """Return the path of the data file used by the GUI."""
+    return os.path.join(os.path.dirname(__file__), "data", "records.json")
+
+
+@dataclasses.dataclass
+class Controllers:
+    json_db: JsonFileDB
+    client_controller: ClientController
+    airline_controller: AirlineController
+    flight_controller: FlightController
+
+
+def open_controllers(data_file: str, replica: bool = False, codec: Optional[str] = None,
+                     cache_bytes: int = DEFAULT_CACHE_BYTES, indexes: bool = True) -> Controllers:
+    """Open the data file and set up repositories and controllers over it.
+
+    With replica, the data is served read-only from a ReplicaDB that follows
+    the journal. Unless indexes is false the PERSISTENT_INDEXES are opened.
+    codec is the format saves are written in (see pkg.codec), by default that
+    of the existing file; files in any format are read. cache_bytes is
+    the memory budget for decoded records of segment files. While metrics
+    are enabled the repositories and controllers are timed (see
+    instrument_controllers).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(data_file)), exist_ok=True)
+    if replica:
+        json_db = ReplicaDB(data_file, cache_bytes=cache_bytes)
+    else:
+        json_db = JsonFileDB(data_file, codec=codec, cache_bytes=cache_bytes)
+    if indexes:
+        json_db.open_indexes(PERSISTENT_INDEXES)
+    return instrument_controllers(Controllers(
+        json_db=json_db,
+        client_controller=ClientController(client_repository=ClientRepositoryJson(json_db)),
+        airline_controller=AirlineController(airline_repository=AirlineRepositoryJson(json_db)),
+        flight_controller=FlightController(flight_repository=FlightRepositoryJson(json_db))
+    ))
+
+
+def instrument_controllers(controllers: Controllers) -> Controllers:
+    """Time every public controller and repository method while metrics are enabled (see pkg.metrics).
+
+    Calls are recorded as e.g. ``flight_controller.search_flights`` and
+    ``flight_repository.search_flights``; with metrics disabled nothing is
+    wrapped.
+    """
+    for resource in RESOURCES.values():
+        controller = getattr(controllers, resource.controller)
+        repository = getattr(controller, f"{resource.entity}_repository")
+        metrics.instrument(repository, f"{resource.entity}_repository")
+        metrics.instrument(controller, resource.controller)
+    return controllers
+
+
+@dataclasses.dataclass
+class AsyncControllers:
+    json_db: 'AsyncJsonFileDB'
+    client_controller: AsyncClientController
+    airline_controller: AsyncAirlineController
+    flight_controller: AsyncFlightController
+
+
+def open_async_controllers(data_file: str, indexes: bool = True) -> AsyncControllers:
+    """Like open_controllers, for use from an asyncio event loop."""
+    from pkg.async_json_db import AsyncJsonFileDB
+
+    os.makedirs(os.path.dirname(os.path.abspath(data_file)), exist_ok=True)
+    json_db = AsyncJsonFileDB(JsonFileDB(data_file))
+    if indexes:
+        json_db.json_db.open_indexes(PERSISTENT_INDEXES)
+    return AsyncControllers(
+        json_db=json_db,
+        client_controller=AsyncClientController(client_repository=AsyncClientRepositoryJson(json_db)),
+        airline_controller=AsyncAirlineController(airline_repository=AsyncAirlineRepositoryJson(json_db)),
+        flight_controller=AsyncFlightController(flight_repository=AsyncFlightRepositoryJson(json_db))
+    )
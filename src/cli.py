@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Headless Command Line Interface
+
+Runs single operations against the data file for scripts and cron jobs,
+without the Tk user interface. Only the storage and controller layers are
+imported, so a command starts printing within a few tens of milliseconds.
+
+Records are read and written as NDJSON, one JSON object per line:
+
+    list   RESOURCE [--where FIELD=VALUE]   print all records, or those matching
+    search RESOURCE TERM                    print records containing TERM
+    create RESOURCE [JSON]                  create a record, or one per stdin line
+    update RESOURCE [ID JSON]               update a record, or one per stdin line
+    delete RESOURCE [ID ...]                delete records, or one per stdin line
+    import RESOURCE [FILE]                  create records from an NDJSON file or stdin
+    export RESOURCE [FILE]                  write all records to an NDJSON file or stdout
+    stats                                   print record counts and storage details
+    compact [--retain N] [--backups DIR]    drop journal events no consumer needs
+
+RESOURCE is one of ``clients``, ``airlines`` and ``flights``. Records read
+from stdin or a file are all written in one batch, so the data file is saved
+once whatever their number. Writes print one result line per record; the
+exit status is 1 if any of them failed. With --metrics FILE the command is
+timed and the metrics are written to FILE, as Prometheus text if it ends in
+.prom and as JSON otherwise. With --profile, or FRMS_PROFILE set, the command
+runs under cProfile and tracemalloc and the reports are written next to the
+data file (see pkg.profiling).
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TextIO
+
+from pkg import metrics
+from pkg.change_feed import CURSOR_FILE, Cursor
+from pkg.json_db import JOURNAL_RETAIN
+from pkg.profiling import PROFILE_ENV, Profiler
+from pkg.json_object import VERSION
+from src.app import BAD_INPUT_ERRORS, RESOURCES, Controllers, Resource, default_data_file, open_controllers
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    profiler = None
+    if args.profile or os.environ.get(PROFILE_ENV):
+        profiler = Profiler(os.path.dirname(os.path.abspath(args.data)), f"cli-{args.command}")
+        profiler.start()
+    try:
+        controllers = open_controllers(args.data, codec=args.codec,
+                                       indexes=args.command == "search" or bool(getattr(args, "where", None)))
+        resource = RESOURCES.get(getattr(args, "resource", None))
+        return COMMANDS[args.command](controllers, resource, args, sys.stdout)
+    finally:
+        if args.metrics:
+            metrics.REGISTRY.dump(args.metrics)
+        if profiler is not None:
+            # Reports go to stderr so stdout stays NDJSON
+            print(f"Profile written to {profiler.stop()[1]}", file=sys.stderr)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage flight records from the command line.")
+    parser.add_argument("--data", default=default_data_file(), help="path of the records.json data file")
+    parser.add_argument("--codec", help="format to save the data file in, e.g. minified or gzip "
+                        "(default: keep its current format)")
+    parser.add_argument("--metrics", metavar="FILE", help="write operation latencies and counters to FILE")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the command and write the reports next to the data file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="print records as NDJSON")
+    list_parser.add_argument("resource", choices=RESOURCES)
+    list_parser.add_argument("--where", metavar="FIELD=VALUE", help="only records whose field has this value")
+
+    search_parser = commands.add_parser("search", help="print records containing a term as NDJSON")
+    search_parser.add_argument("resource", choices=RESOURCES)
+    search_parser.add_argument("term")
+
+    create_parser = commands.add_parser("create", help="create records")
+    create_parser.add_argument("resource", choices=RESOURCES)
+    create_parser.add_argument("record", nargs="?", help="JSON record; read NDJSON from stdin if omitted")
+
+    update_parser = commands.add_parser("update", help="update records")
+    update_parser.add_argument("resource", choices=RESOURCES)
+    update_parser.add_argument("id", nargs="?", help="record to update; read NDJSON from stdin if omitted")
+    update_parser.add_argument("record", nargs="?", help="JSON object with the fields to change")
+    update_parser.add_argument("--if-match", type=int, metavar="VERSION",
+                               help="only update if the record is still at this version")
+
+    delete_parser = commands.add_parser("delete", help="delete records")
+    delete_parser.add_argument("resource", choices=RESOURCES)
+    delete_parser.add_argument("ids", nargs="*", help="records to delete; read NDJSON from stdin if omitted")
+    delete_parser.add_argument("--if-match", type=int, metavar="VERSION",
+                               help="only delete if the record is still at this version")
+
+    import_parser = commands.add_parser("import", help="create records from NDJSON in one batch")
+    import_parser.add_argument("resource", choices=RESOURCES)
+    import_parser.add_argument("file", nargs="?", default="-", help="NDJSON file, or - for stdin")
+
+    export_parser = commands.add_parser("export", help="write all records as NDJSON")
+    export_parser.add_argument("resource", choices=RESOURCES)
+    export_parser.add_argument("file", nargs="?", default="-", help="output file, or - for stdout")
+
+    commands.add_parser("stats", help="print record counts and storage details")
+
+    compact_parser = commands.add_parser("compact", help="drop journal events no consumer needs any more")
+    compact_parser.add_argument("--retain", type=int, default=JOURNAL_RETAIN, metavar="N",
+                                help=f"always keep the last N events (default {JOURNAL_RETAIN})")
+    compact_parser.add_argument("--backups", action="append", default=[], metavar="DIR",
+                                help="backup directory whose events since the last backup are kept; repeatable")
+
+    args = parser.parse_args(argv)
+    if args.command == "update" and args.id is not None and args.record is None:
+        parser.error("update needs both ID and JSON, or neither to read stdin")
+    return args
+
+
+def list_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    controller = _controller(controllers, resource)
+    if args.where:
+        field, _, value = args.where.partition("=")
+        records = getattr(controller, f"find_{resource.plural}")(field, value)
+    else:
+        records = getattr(controller, f"get_all_{resource.plural}")()
+    write_ndjson(out, records)
+    return 0
+
+
+def search_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    write_ndjson(out, getattr(_controller(controllers, resource), f"search_{resource.plural}")(args.term))
+    return 0
+
+
+def create_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    lines = [args.record] if args.record is not None else read_lines(sys.stdin)
+    return _write_each(controllers, resource, lines, out, _create)
+
+
+def update_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    if args.id is not None:
+        def parse(line: str) -> Dict[str, Any]:
+            return {**json.loads(line), resource.id_field: args.id, VERSION: args.if_match}
+        return _write_each(controllers, resource, [args.record], out, _update, parse)
+    return _write_each(controllers, resource, read_lines(sys.stdin), out, _update)
+
+
+def delete_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    if args.ids:
+        def parse(record_id: str) -> Dict[str, Any]:
+            return {resource.id_field: record_id, VERSION: args.if_match}
+        return _write_each(controllers, resource, args.ids, out, _delete, parse)
+    return _write_each(controllers, resource, read_lines(sys.stdin), out, _delete)
+
+
+def import_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    """Create every record of the file in one save, printing only failures and a summary."""
+    imported = failed = 0
+    file = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    try:
+        with controllers.json_db.batch():
+            for line in read_lines(file):
+                result = _write_one(controllers, resource, line, _create, json.loads)
+                if result["ok"]:
+                    imported += 1
+                else:
+                    failed += 1
+                    write_ndjson(out, [result])
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    write_ndjson(out, [{"imported": imported, "failed": failed}])
+    return 1 if failed else 0
+
+
+def export_records(controllers: Controllers, resource: Resource, args: argparse.Namespace, out: TextIO) -> int:
+    records = getattr(_controller(controllers, resource), f"get_all_{resource.plural}")()
+    if args.file == "-":
+        write_ndjson(out, records)
+    else:
+        with open(args.file, 'w', encoding="utf-8") as file:
+            write_ndjson(file, records)
+    return 0
+
+
+def print_stats(controllers: Controllers, resource: Optional[Resource], args: argparse.Namespace, out: TextIO) -> int:
+    json_db = controllers.json_db
+    snapshot = json_db.snapshot()
+    stats: Dict[str, Any] = {
+        "file": os.path.abspath(json_db.file_path),
+        "bytes": _size(json_db.file_path),
+        "generation": snapshot.generation,
+        "sequence": snapshot.sequence,
+        "records": {name: len(snapshot.data.get(resource.space, {})) for name, resource in RESOURCES.items()},
+        "journal_bytes": _size(json_db.change_feed.journal_path),
+        "index_bytes": _size(json_db.index_path)
+    }
+    if json_db.cache is not None:
+        stats["record_cache"] = json_db.cache.stats()
+    write_ndjson(out, [stats])
+    return 0
+
+
+def compact_journal(controllers: Controllers, resource: Optional[Resource], args: argparse.Namespace,
+                    out: TextIO) -> int:
+    json_db = controllers.json_db
+    backed_up = [Cursor(json_db.change_feed, os.path.join(directory, CURSOR_FILE)).sequence
+                 for directory in args.backups]
+    dropped = json_db.compact_journal(args.retain, backed_up)
+    write_ndjson(out, [{"dropped": dropped, "journal_bytes": _size(json_db.change_feed.journal_path)}])
+    return 0
+
+
+COMMANDS = {
+    "list": list_records,
+    "search": search_records,
+    "create": create_records,
+    "update": update_records,
+    "delete": delete_records,
+    "import": import_records,
+    "export": export_records,
+    "stats": print_stats,
+    "compact": compact_journal
+}
+
+
+def read_lines(file: TextIO) -> Iterator[str]:
+    """Yield each non-blank line of an NDJSON file, to be parsed record by record."""
+    for line in file:
+        if line.strip():
+            yield line
+
+
+def write_ndjson(out: TextIO, records: Iterable[Any]):
+    out.writelines(json.dumps(record) + "\n" for record in records)
+
+
+def _write_each(controllers: Controllers, resource: Resource, lines: Iterable[str], out: TextIO,
+                write, parse: Callable[[str], Dict[str, Any]] = json.loads) -> int:
+    failed = False
+    with controllers.json_db.batch():
+        for line in lines:
+            result = _write_one(controllers, resource, line, write, parse)
+            failed = failed or not result["ok"]
+            write_ndjson(out, [result])
+    return 1 if failed else 0
+
+
+def _write_one(controllers: Controllers, resource: Resource, line: str, write,
+               parse: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    """Parse and write one record, returning its result line.
+
+    A line that is not JSON or a record with fields of the wrong type fails
+    on its own, as the server answers 400, and the batch goes on.
+    """
+    record = None
+    try:
+        record = parse(line)
+        error = write(controllers, resource, record)
+    except BAD_INPUT_ERRORS as e:
+        error = f"invalid record: {e}"
+    result = {"id": record.get(resource.id_field) if isinstance(record, dict) else None, "ok": error is None}
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+def _create(controllers: Controllers, resource: Resource, record: Dict[str, Any]) -> Optional[str]:
+    create = getattr(_controller(controllers, resource), f"create_{resource.entity}")
+    try:
+        # Only create records whose ID is free (version 0), as the server does
+        if create(record, 0):
+            return None
+    except resource.conflict_error:
+        return f"{resource.entity} {record.get(resource.id_field)} already exists"
+    return f"invalid {resource.entity} record"
+
+
+def _update(controllers: Controllers, resource: Resource, record: Dict[str, Any]) -> Optional[str]:
+    record = dict(record)
+    expected_version = record.pop(VERSION, None)
+    update = getattr(_controller(controllers, resource), f"update_{resource.entity}")
+    try:
+        if update(record.get(resource.id_field), record, expected_version):
+            return None
+    except (resource.conflict_error, ValueError) as e:
+        return str(e)
+    return f"could not update {resource.entity} {record.get(resource.id_field)}"
+
+
+def _delete(controllers: Controllers, resource: Resource, record: Dict[str, Any]) -> Optional[str]:
+    delete = getattr(_controller(controllers, resource), f"delete_{resource.entity}")
+    try:
+        if delete(record.get(resource.id_field), record.get(VERSION)):
+            return None
+    except (resource.conflict_error, ValueError) as e:
+        return str(e)
+    return f"{resource.entity} {record.get(resource.id_field)} not found"
+
+
+def _controller(controllers: Controllers, resource: Resource):
+    return getattr(controllers, resource.controller)
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
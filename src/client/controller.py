@@ -1,7 +1,10 @@
-from typing import Optional, Callable, Dict, Any, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
-from src.client.model import ClientInvalidError, Client, ClientUpdateRequest
-from src.client.repository import ClientRepository, ClientRepositoryError
+from pkg.json_object import VERSION
+from src.client.model import Client, ClientInvalidError, ClientUpdateRequest
+from src.client.repository import (
+    AsyncClientRepository, ClientRepository, ClientRepositoryError, ClientVersionConflictError
+)
 
 
 class ClientController:
@@ -12,76 +15,219 @@ class ClientController:
         self.client_repository = client_repository
         self.view_update_callback = view_update_callback
 
-    def create_client(self, client_data: Dict[str, Any]) -> bool:
-        """Create a new client record."""
-        try:
-            client = Client.from_json(client_data)
-        except ClientInvalidError as e:
+    def create_client(self, client_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Create a new client record.
+
+        With expected_version=0 the record is only created if no client has its
+        ID yet; otherwise ClientVersionConflictError is raised.
+        """
+        # Validate data
+        client = _parse_client(client_data)
+        if client is None:
             return False
 
         # Create the record
         try:
-            self.client_repository.create_client(client)
+            self.client_repository.create_client(client, expected_version)
+        except ClientVersionConflictError:
+            raise
         except ClientRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
-    def update_client(self, client_id: str, updated_data: Dict[str, Any]) -> bool:
-        """Update an existing client record."""
-        try:
-            client_update_request = ClientUpdateRequest.from_json(updated_data)
-            client_update_request.client_id = client_id
-        except ClientInvalidError as e:
+    def update_client(self, client_id: str, updated_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Update an existing client record.
+
+        Raises ClientVersionConflictError if expected_version is given and the
+        record has been changed since.
+        """
+        # Validate data
+        client_update_request = _parse_update(client_id, updated_data)
+        if client_update_request is None:
             return False
 
         # Update the record
         try:
-            self.client_repository.update_client(client_update_request)
+            self.client_repository.update_client(client_update_request, expected_version)
+        except ClientVersionConflictError:
+            raise
         except ClientRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
-    def delete_client(self, client_id: str) -> bool:
-        """Delete a client record."""
+    def delete_client(self, client_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete a client record.
+
+        Raises ClientVersionConflictError if expected_version is given and the
+        record has been changed since.
+        """
         # Delete the record
         try:
-            self.client_repository.delete_client(client_id)
+            self.client_repository.delete_client(client_id, expected_version)
+        except ClientVersionConflictError:
+            raise
         except ClientRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
     def search_clients(self, search_term: str) -> List[Dict[str, Any]]:
         """Search for client records."""
         try:
-            return [client.to_json() for client in self.client_repository.get_clients() if client.contains_term(search_term)]
+            return _matching(self.client_repository.search_clients(search_term), search_term)
+        except ClientRepositoryError as e:
+            return []
+
+    def find_clients(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get the client records whose field equals value."""
+        try:
+            return [_to_dict(client) for client in self.client_repository.find_clients(field, value)]
         except ClientRepositoryError as e:
             return []
 
     def get_all_clients(self) -> List[Dict[str, Any]]:
         """Get all client records."""
         try:
-            return [client.to_json() for client in self.client_repository.get_clients()]
+            return [_to_dict(client) for client in self.client_repository.get_clients()]
         except ClientRepositoryError as e:
             return []
 
+    def iter_clients(self, search_term: Optional[str] = None, field: Optional[str] = None,
+                     value: Any = None) -> Iterator[Dict[str, Any]]:
+        """Yield the client records matching search_term, or whose field equals value, one at a time.
+
+        Without either, yields all client records. Each record is converted as it
+        is reached, so a listing is never held in full.
+        """
+        try:
+            clients = self.client_repository.iter_clients(search_term, field, value)
+        except ClientRepositoryError as e:
+            return iter(())
+        if search_term is not None:
+            # Index candidates may only share n-grams with the term; check each
+            clients = (client for client in clients if client.contains_term(search_term))
+        return (_to_dict(client) for client in clients)
+
     def get_client_by_id(self, client_id: str) -> Optional[Dict[str, Any]]:
         """Get a client record by ID."""
         try:
-            return self.client_repository.get_client(client_id).to_json()
+            return _to_dict(self.client_repository.get_client(client_id))
         except ClientRepositoryError as e:
             return None
+
+
+class AsyncClientController:
+    """Controller for client operations on an asyncio event loop.
+
+    Validates and converts records with the same helpers as ClientController.
+    """
+
+    def __init__(self, client_repository: AsyncClientRepository, view_update_callback: Optional[Callable] = None):
+        """Initialize with model and optional view update callback."""
+        self.client_repository = client_repository
+        self.view_update_callback = view_update_callback
+
+    async def create_client(self, client_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Create a new client record; see ClientController.create_client."""
+        client = _parse_client(client_data)
+        if client is None:
+            return False
+        try:
+            await self.client_repository.create_client(client, expected_version)
+        except ClientVersionConflictError:
+            raise
+        except ClientRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def update_client(self, client_id: str, updated_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Update an existing client record; see ClientController.update_client."""
+        client_update_request = _parse_update(client_id, updated_data)
+        if client_update_request is None:
+            return False
+        try:
+            await self.client_repository.update_client(client_update_request, expected_version)
+        except ClientVersionConflictError:
+            raise
+        except ClientRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def delete_client(self, client_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete a client record; see ClientController.delete_client."""
+        try:
+            await self.client_repository.delete_client(client_id, expected_version)
+        except ClientVersionConflictError:
+            raise
+        except ClientRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def search_clients(self, search_term: str) -> List[Dict[str, Any]]:
+        """Search for client records."""
+        try:
+            return _matching(await self.client_repository.search_clients(search_term), search_term)
+        except ClientRepositoryError as e:
+            return []
+
+    async def find_clients(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get the client records whose field equals value."""
+        try:
+            return [_to_dict(client) for client in await self.client_repository.find_clients(field, value)]
+        except ClientRepositoryError as e:
+            return []
+
+    async def get_all_clients(self) -> List[Dict[str, Any]]:
+        """Get all client records."""
+        try:
+            return [_to_dict(client) for client in await self.client_repository.get_clients()]
+        except ClientRepositoryError as e:
+            return []
+
+    async def get_client_by_id(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """Get a client record by ID."""
+        try:
+            return _to_dict(await self.client_repository.get_client(client_id))
+        except ClientRepositoryError as e:
+            return None
+
+
+def _parse_client(client_data: Dict[str, Any]) -> Optional[Client]:
+    """Return the client in client_data, or None if it is invalid."""
+    try:
+        return Client.from_json(client_data)
+    except ClientInvalidError:
+        return None
+
+
+def _parse_update(client_id: str, updated_data: Dict[str, Any]) -> Optional[ClientUpdateRequest]:
+    """Return the update of client_id in updated_data, or None if it is invalid."""
+    try:
+        client_update_request = ClientUpdateRequest.from_json(updated_data)
+    except ClientInvalidError:
+        return None
+    client_update_request.client_id = client_id
+    return client_update_request
+
+
+def _matching(clients: Iterable[Client], search_term: str) -> List[Dict[str, Any]]:
+    # Index candidates may only share n-grams with the term; check each
+    return [_to_dict(client) for client in clients if client.contains_term(search_term)]
+
+
+def _update_view(view_update_callback: Optional[Callable]):
+    # Update the view if callback provided
+    if view_update_callback:
+        view_update_callback()
+
+
+def _to_dict(client: Client) -> Dict[str, Any]:
+    return {**client.to_json(), VERSION: client.version}
@@ -1,7 +1,7 @@
 import dataclasses
 from typing import Dict, Any, Optional
 
-from pkg.json_object import JSONObject
+from pkg.json_object import JSONObject, VERSION
 
 
 ID = "ID"
@@ -24,6 +24,7 @@ class Client(JSONObject):
     state: str
     country: str
     phone: str
+    version: int = 0
 
     def to_json(self) -> Dict[str, Any]:
         return {
@@ -51,7 +52,8 @@ class Client(JSONObject):
             city=json.get(CITY, ""),
             state=json.get(STATE, ""),
             country=json.get(COUNTRY, ""),
-            phone=json.get(PHONE, "")
+            phone=json.get(PHONE, ""),
+            version=json.get(VERSION, 0)
         )
 
 @dataclasses.dataclass
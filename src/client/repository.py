@@ -1,5 +1,5 @@
 import abc
-from typing import List
+from typing import Any, Iterator, List, Optional
 
 from src.client.model import Client, ClientUpdateRequest
 
@@ -14,16 +14,59 @@ class ClientRepository(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def create_client(self, client: Client):
+    def create_client(self, client: Client, expected_version: Optional[int] = None):
         pass
 
     @abc.abstractmethod
-    def update_client(self, client: ClientUpdateRequest):
+    def update_client(self, client: ClientUpdateRequest, expected_version: Optional[int] = None):
         pass
 
     @abc.abstractmethod
-    def delete_client(self, client_id: str):
+    def delete_client(self, client_id: str, expected_version: Optional[int] = None):
         pass
 
+    def find_clients(self, field: str, value: Any) -> List[Client]:
+        return [client for client in self.get_clients() if client.to_json().get(field) == value]
+
+    def search_clients(self, term: str) -> List[Client]:
+        return [client for client in self.get_clients() if client.contains_term(term)]
+
+    def iter_clients(self, term: Optional[str] = None, field: Optional[str] = None, value: Any = None) -> Iterator[Client]:
+        if term is not None:
+            return iter(self.search_clients(term))
+        if field is not None:
+            return iter(self.find_clients(field, value))
+        return iter(self.get_clients())
+
+class AsyncClientRepository(abc.ABC):
+    @abc.abstractmethod
+    async def get_clients(self) -> List[Client]:
+        pass
+
+    @abc.abstractmethod
+    async def get_client(self, client_id: str) -> Client:
+        pass
+
+    @abc.abstractmethod
+    async def create_client(self, client: Client, expected_version: Optional[int] = None):
+        pass
+
+    @abc.abstractmethod
+    async def update_client(self, client: ClientUpdateRequest, expected_version: Optional[int] = None):
+        pass
+
+    @abc.abstractmethod
+    async def delete_client(self, client_id: str, expected_version: Optional[int] = None):
+        pass
+
+    async def find_clients(self, field: str, value: Any) -> List[Client]:
+        return [client for client in await self.get_clients() if client.to_json().get(field) == value]
+
+    async def search_clients(self, term: str) -> List[Client]:
+        return [client for client in await self.get_clients() if client.contains_term(term)]
+
 class ClientRepositoryError(Exception):
     pass
+
+class ClientVersionConflictError(ClientRepositoryError):
+    pass
@@ -1,8 +1,15 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
 
-from pkg.json_db import KeyNotFound
+from pkg import metrics
+from pkg.json_db import KeyNotFound, VersionConflict
+from pkg.json_object import VERSION
 from src.client.model import Client, ClientUpdateRequest
-from src.client.repository import ClientRepository, ClientRepositoryError
+from src.client.repository import (
+    ClientRepository, ClientRepositoryError, ClientVersionConflictError, AsyncClientRepository
+)
+
+if TYPE_CHECKING:
+    from pkg.async_json_db import AsyncJsonFileDB
 
 SPACE = "Client"
 
@@ -12,35 +19,113 @@ class ClientRepositoryJson(ClientRepository):
 
     def get_clients(self) -> List[Client]:
         try:
-            clients_dict = self.json_db.get([SPACE])
+            # Iterate a snapshot so concurrent writes cannot change the dict under us
+            clients_dict = self.json_db.snapshot().get([SPACE])
         except KeyNotFound:
             return []
         clients = [client for client in clients_dict.values()]
+        metrics.add("client_repository.records_scanned", len(clients))
         return [Client.from_json(client) for client in clients]
 
     def get_client(self, client_id):
         try:
             client = self.json_db.get([SPACE, client_id])
-        except KeyError:
-            return None
-        return client
+        except KeyNotFound:
+            raise ClientRepositoryError(f"Client with id {client_id} not found")
+        return Client.from_json(client)
 
-    def create_client(self, client: Client):
-        self.json_db.set([SPACE, client.client_id], client.to_json())
+    def find_clients(self, field: str, value: Any) -> List[Client]:
+        return [Client.from_json(client) for client in self.json_db.find(SPACE, field, value)]
 
-    def update_client(self, client_update_request: ClientUpdateRequest):
+    def search_clients(self, term: str) -> List[Client]:
+        # Candidates from the n-gram index when there is one; the controller
+        # still checks each with contains_term
+        return [Client.from_json(client) for client in self.json_db.search(SPACE, term)]
+
+    def iter_clients(self, term: Optional[str] = None, field: Optional[str] = None, value: Any = None) -> Iterator[Client]:
+        # Only references to the stored records are gathered up front; each is
+        # converted as the caller gets to it
+        if term is not None:
+            clients = self.json_db.search(SPACE, term)
+        elif field is not None:
+            clients = self.json_db.find(SPACE, field, value)
+        else:
+            try:
+                clients_dict = self.json_db.snapshot().get([SPACE])
+            except KeyNotFound:
+                return iter(())
+            metrics.add("client_repository.records_scanned", len(clients_dict))
+            clients = clients_dict.values()
+        return (Client.from_json(client) for client in clients)
+
+    def create_client(self, client: Client, expected_version: Optional[int] = None):
         try:
-            client = self.json_db.get([SPACE, client_update_request.client_id])
-        except KeyNotFound:
-            raise ClientRepositoryError(f"Client with id {client_update_request.client_id} not found")
-        updated_client = client_update_request.to_json()
-        for key, value in updated_client.items():
-            if value is not None:
-                client[key] = value
-        self.json_db.set([SPACE, client_update_request.client_id], client)
-
-    def delete_client(self, client_id):
+            self.json_db.set([SPACE, client.client_id], client.to_json(), expected_version=expected_version)
+        except VersionConflict as e:
+            raise ClientVersionConflictError(str(e))
+
+    def update_client(self, client_update_request: ClientUpdateRequest, expected_version: Optional[int] = None):
+        # Compare-and-set: without an expected version, retry against the
+        # latest stored version until no concurrent write slips in between
+        while True:
+            try:
+                client = dict(self.json_db.get([SPACE, client_update_request.client_id]))
+            except KeyNotFound:
+                raise ClientRepositoryError(f"Client with id {client_update_request.client_id} not found")
+            _merge_update(client, client_update_request)
+            version = client.get(VERSION, 0) if expected_version is None else expected_version
+            try:
+                self.json_db.set([SPACE, client_update_request.client_id], client, expected_version=version)
+                return
+            except VersionConflict as e:
+                if expected_version is not None:
+                    raise ClientVersionConflictError(str(e))
+
+    def delete_client(self, client_id, expected_version: Optional[int] = None):
         try:
-            self.json_db.delete([SPACE, client_id])
+            self.json_db.delete([SPACE, client_id], expected_version=expected_version)
         except KeyNotFound:
             raise ClientRepositoryError(f"Client with id {client_id} not found")
+        except VersionConflict as e:
+            raise ClientVersionConflictError(str(e))
+
+
+class AsyncClientRepositoryJson(AsyncClientRepository):
+    """Non-blocking counterpart of ClientRepositoryJson.
+
+    Runs the same operations of a ClientRepositoryJson over the JsonFileDB of
+    the AsyncJsonFileDB: reads on the default thread pool, writes in the next
+    batch of the writer thread, resolving once it is saved.
+    """
+
+    def __init__(self, json_db: 'AsyncJsonFileDB'):
+        self.json_db = json_db
+        self.repository = ClientRepositoryJson(json_db.json_db)
+
+    async def get_clients(self) -> List[Client]:
+        return await self.json_db.read(self.repository.get_clients)
+
+    async def get_client(self, client_id: str) -> Client:
+        return await self.json_db.read(self.repository.get_client, client_id)
+
+    async def find_clients(self, field: str, value: Any) -> List[Client]:
+        return await self.json_db.read(self.repository.find_clients, field, value)
+
+    async def search_clients(self, term: str) -> List[Client]:
+        return await self.json_db.read(self.repository.search_clients, term)
+
+    async def create_client(self, client: Client, expected_version: Optional[int] = None):
+        await self.json_db.write(self.repository.create_client, client, expected_version)
+
+    async def update_client(self, client_update_request: ClientUpdateRequest, expected_version: Optional[int] = None):
+        # Runs on the writer thread inside the batch, which holds the write lock
+        await self.json_db.write(self.repository.update_client, client_update_request, expected_version)
+
+    async def delete_client(self, client_id: str, expected_version: Optional[int] = None):
+        await self.json_db.write(self.repository.delete_client, client_id, expected_version)
+
+
+def _merge_update(client: Dict[str, Any], client_update_request: ClientUpdateRequest):
+    for key, value in client_update_request.to_json().items():
+        if value is not None:
+            client[key] = value
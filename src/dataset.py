@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Synthetic Dataset Generator
+
+Produces clients, airlines and flights with the shape of production data, for
+load and scale testing:
+
+- a few clients book most flights (Zipf-distributed activity), and a few
+  airlines carry most of them;
+- routes between busy cities are flown more often (gravity model);
+- dates cluster on Fridays and Sundays and in the summer;
+- flights before the reference date are mostly completed, later ones mostly
+  confirmed, with some pending, delayed and cancelled.
+
+The output depends only on the seed and the counts, and each record type has
+its own random stream, so changing the number of flights leaves the clients
+and airlines unchanged. Records are written through the repositories inside
+one JsonFileDB.batch(), so a million flights are saved once:
+
+    python -m src.dataset --data /tmp/records.json --clients 10000 --airlines 200 --flights 1000000
+"""
+
+import argparse
+import bisect
+import datetime
+import itertools
+import math
+import random
+import sys
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.airline.model import Airline
+from src.app import Controllers, open_controllers
+from src.client.model import Client
+from src.flight.model import Flight
+
+DEFAULT_SEED = 42
+# Exponents of the Zipf distributions of bookings over clients and airlines
+CLIENT_SKEW = 1.1
+AIRLINE_SKEW = 0.9
+
+# City, state, country, international dialling code and relative traffic
+CITIES = [
+    ("London", "Greater London", "UK", "+44", 80),
+    ("Manchester", "Greater Manchester", "UK", "+44", 20),
+    ("Edinburgh", "Scotland", "UK", "+44", 12),
+    ("Paris", "Ile-de-France", "France", "+33", 70),
+    ("Nice", "Provence-Alpes-Cote d'Azur", "France", "+33", 10),
+    ("Amsterdam", "North Holland", "Netherlands", "+31", 45),
+    ("Frankfurt", "Hesse", "Germany", "+49", 50),
+    ("Berlin", "Berlin", "Germany", "+49", 25),
+    ("Madrid", "Community of Madrid", "Spain", "+34", 40),
+    ("Barcelona", "Catalonia", "Spain", "+34", 30),
+    ("Rome", "Lazio", "Italy", "+39", 30),
+    ("Dublin", "Leinster", "Ireland", "+353", 22),
+    ("New York", "New York", "USA", "+1", 75),
+    ("Los Angeles", "California", "USA", "+1", 55),
+    ("Chicago", "Illinois", "USA", "+1", 45),
+    ("Toronto", "Ontario", "Canada", "+1", 30),
+    ("Dubai", "Dubai", "UAE", "+971", 60),
+    ("Singapore", "Singapore", "Singapore", "+65", 45),
+    ("Tokyo", "Tokyo", "Japan", "+81", 50),
+    ("Sydney", "New South Wales", "Australia", "+61", 25),
+]
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Susan", "Richard", "Jessica", "Joseph", "Sarah", "Thomas", "Karen", "Wei", "Aisha",
+    "Mohammed", "Priya", "Hiroshi", "Sofia", "Lucas", "Emma", "Noah", "Olivia", "Mateo", "Amara",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Wilson", "Taylor",
+    "Anderson", "Thomas", "Moore", "Martin", "Lee", "Thompson", "White", "Harris", "Clark", "Lewis",
+    "Chen", "Khan", "Patel", "Tanaka", "Rossi", "Muller", "Dubois", "Silva", "Okafor", "Kowalski",
+]
+STREETS = ["High Street", "Station Road", "Main Street", "Park Avenue", "Church Lane", "Victoria Road",
+           "Green Lane", "Mill Road", "King Street", "Queen Street", "Market Square", "River Walk"]
+CLIENT_TYPES = [("Regular", 80), ("Premium", 15), ("Corporate", 5)]
+AIRLINE_NAME_PARTS = (
+    ["Blue", "Sky", "Global", "Royal", "Atlantic", "Pacific", "Northern", "Sun", "Star", "Eagle", "Silver", "Crown"],
+    ["Airways", "Airlines", "Air", "Wings", "Jet", "Aviation", "Express", "Connect"],
+)
+AIRLINE_TYPES = [("International", 40), ("Domestic", 25), ("Regional", 15), ("Low-cost", 15), ("Charter", 5)]
+# Status mixes of flights before and after the reference date
+PAST_STATUSES = [("Completed", 90), ("Cancelled", 6), ("Delayed", 4)]
+FUTURE_STATUSES = [("Confirmed", 78), ("Pending", 14), ("Delayed", 3), ("Cancelled", 5)]
+# Relative traffic by weekday, Monday first
+WEEKDAY_TRAFFIC = [1.0, 0.85, 0.85, 0.95, 1.3, 1.05, 1.2]
+
+
+class DatasetGenerator:
+    """Deterministic source of synthetic clients, airlines and flights.
+
+    Flights span days days from start; reference is the date that separates
+    flown flights from booked ones, by default two thirds into the span.
+    """
+
+    def __init__(self, seed: int = DEFAULT_SEED, start: datetime.date = datetime.date(2025, 1, 1),
+                 days: int = 365, reference: Optional[datetime.date] = None):
+        self.seed = seed
+        self.start = start
+        self.days = days
+        self.reference = reference or start + datetime.timedelta(days=days * 2 // 3)
+
+    def clients(self, count: int) -> Iterator[Client]:
+        rng = self._random("clients")
+        cities = _cumulative([city[4] for city in CITIES])
+        types = _cumulative([weight for _, weight in CLIENT_TYPES])
+        for i in range(1, count + 1):
+            city, state, country, prefix, _ = CITIES[_pick(rng, cities)]
+            yield Client(
+                client_id=str(i),
+                client_type=CLIENT_TYPES[_pick(rng, types)][0],
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                address_line_1=f"{rng.randint(1, 250)} {rng.choice(STREETS)}",
+                city=city,
+                state=state,
+                country=country,
+                phone=f"{prefix} {rng.randint(100, 999)} {rng.randint(1000000, 9999999)}"
+            )
+
+    def airlines(self, count: int) -> Iterator[Airline]:
+        rng = self._random("airlines")
+        names = list(itertools.product(*AIRLINE_NAME_PARTS))
+        rng.shuffle(names)
+        codes = [a + b for a in "ABCDEFGHIJKLMNOPQRSTUVWXYZ" for b in "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"]
+        rng.shuffle(codes)
+        types = _cumulative([weight for _, weight in AIRLINE_TYPES])
+        for i in range(1, count + 1):
+            first, second = names[(i - 1) % len(names)]
+            # Reuse names with a number once every combination is taken
+            suffix = f" {(i - 1) // len(names) + 1}" if i > len(names) else ""
+            yield Airline(
+                airline_id=str(i),
+                airline_type=AIRLINE_TYPES[_pick(rng, types)][0],
+                company_name=f"{first} {second}{suffix}",
+                country=rng.choice(CITIES)[2],
+                iata_code=codes[(i - 1) % len(codes)]
+            )
+
+    def flights(self, count: int, client_count: int, airline_count: int) -> Iterator[Flight]:
+        """Yield count flights booked by clients 1..client_count on airlines 1..airline_count."""
+        rng = self._random("flights")
+        client_ids, client_weights = _zipf_ranks(rng, client_count, CLIENT_SKEW)
+        airline_ids, airline_weights = _zipf_ranks(rng, airline_count, AIRLINE_SKEW)
+        routes, route_weights = _routes()
+        days = _cumulative([self._day_traffic(day) for day in range(self.days)])
+        width = len(str(count))
+        for i in range(1, count + 1):
+            departure, arrival = routes[_pick(rng, route_weights)]
+            date = self.start + datetime.timedelta(days=_pick(rng, days))
+            statuses = PAST_STATUSES if date < self.reference else FUTURE_STATUSES
+            yield Flight(
+                flight_id=f"F{i:0{width}d}",
+                client_id=str(client_ids[_pick(rng, client_weights)]),
+                airline_id=str(airline_ids[_pick(rng, airline_weights)]),
+                date=date.isoformat(),
+                departure=departure,
+                arrival=arrival,
+                status=_weighted(rng, statuses)
+            )
+
+    def _day_traffic(self, day: int) -> float:
+        date = self.start + datetime.timedelta(days=day)
+        # Peak in late July, trough in late January
+        season = 1 + 0.35 * math.cos(2 * math.pi * (date.timetuple().tm_yday - 205) / 365)
+        return WEEKDAY_TRAFFIC[date.weekday()] * season
+
+    def _random(self, stream: str) -> random.Random:
+        return random.Random(f"{self.seed}:{stream}")
+
+
+def populate(controllers: Controllers, clients: int, airlines: int, flights: int,
+             seed: int = DEFAULT_SEED) -> Dict[str, int]:
+    """Write a generated dataset through the repositories in one batch; returns the counts."""
+    generator = DatasetGenerator(seed)
+    client_repository = controllers.client_controller.client_repository
+    airline_repository = controllers.airline_controller.airline_repository
+    flight_repository = controllers.flight_controller.flight_repository
+    with controllers.json_db.batch():
+        for client in generator.clients(clients):
+            client_repository.create_client(client)
+        for airline in generator.airlines(airlines):
+            airline_repository.create_airline(airline)
+        for flight in generator.flights(flights, clients, airlines):
+            flight_repository.create_flight(flight)
+    return {"clients": clients, "airlines": airlines, "flights": flights}
+
+
+def _cumulative(weights: Sequence[float]) -> List[float]:
+    return list(itertools.accumulate(weights))
+
+
+def _pick(rng: random.Random, cumulative_weights: List[float]) -> int:
+    # Index drawn in proportion to its weight, like random.choices but
+    # without building a list per draw
+    return bisect.bisect_right(cumulative_weights, rng.random() * cumulative_weights[-1])
+
+
+def _weighted(rng: random.Random, choices: List[Tuple[str, int]]) -> str:
+    return rng.choices([value for value, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+def _zipf_ranks(rng: random.Random, count: int, skew: float) -> Tuple[List[int], List[float]]:
+    # IDs 1..count in random order of popularity, with Zipf cumulative weights
+    ids = list(range(1, count + 1))
+    rng.shuffle(ids)
+    return ids, _cumulative([1 / rank ** skew for rank in range(1, count + 1)])
+
+
+def _routes() -> Tuple[List[Tuple[str, str]], List[float]]:
+    routes = [(a[0], b[0]) for a in CITIES for b in CITIES if a is not b]
+    traffic = {city[0]: city[4] for city in CITIES}
+    return routes, _cumulative([traffic[a] * traffic[b] for a, b in routes])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fill a data file with a synthetic dataset.")
+    parser.add_argument("--data", required=True, help="path of the records.json data file to write to")
+    parser.add_argument("--clients", type=int, default=1000, help="number of clients")
+    parser.add_argument("--airlines", type=int, default=50, help="number of airlines")
+    parser.add_argument("--flights", type=int, default=10000, help="number of flights")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed")
+    parser.add_argument("--codec", help="format to save the data file in, e.g. segment "
+                        "(default: keep its current format, pretty for a new file)")
+    args = parser.parse_args(argv)
+    if args.flights and not (args.clients and args.airlines):
+        parser.error("flights need at least one client and one airline")
+    controllers = open_controllers(args.data, codec=args.codec, indexes=False)
+    counts = populate(controllers, args.clients, args.airlines, args.flights, args.seed)
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" written to {args.data}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
-from typing import Callable, Optional, Dict, Any, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
+from pkg.json_object import VERSION
 from src.flight.model import Flight, FlightInvalidError, FlightUpdateRequest
-from src.flight.repository import FlightRepository, FlightRepositoryError
+from src.flight.repository import (
+    AsyncFlightRepository, FlightRepository, FlightRepositoryError, FlightVersionConflictError
+)
 
 
 class FlightController:
@@ -12,78 +15,219 @@ class FlightController:
         self.flight_repository = flight_repository
         self.view_update_callback = view_update_callback
 
-    def create_flight(self, flight_data: Dict[str, Any]) -> bool:
-        """Create a new flight record."""
+    def create_flight(self, flight_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Create a new flight record.
+
+        With expected_version=0 the record is only created if no flight has its
+        ID yet; otherwise FlightVersionConflictError is raised.
+        """
         # Validate data
-        try:
-            flight = Flight.from_json(flight_data)
-        except FlightInvalidError as e:
+        flight = _parse_flight(flight_data)
+        if flight is None:
             return False
 
         # Create the record
         try:
-            self.flight_repository.create_flight(flight)
+            self.flight_repository.create_flight(flight, expected_version)
+        except FlightVersionConflictError:
+            raise
         except FlightRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
-    def update_flight(self, flight_id: str, updated_data: Dict[str, Any]) -> bool:
-        """Update an existing flight record."""
+    def update_flight(self, flight_id: str, updated_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Update an existing flight record.
+
+        Raises FlightVersionConflictError if expected_version is given and the
+        record has been changed since.
+        """
         # Validate data
-        try:
-            update_flight_request = FlightUpdateRequest.from_json(updated_data)
-            update_flight_request.flight_id = flight_id
-        except FlightInvalidError as e:
+        flight_update_request = _parse_update(flight_id, updated_data)
+        if flight_update_request is None:
             return False
 
         # Update the record
         try:
-            self.flight_repository.update_flight(update_flight_request)
+            self.flight_repository.update_flight(flight_update_request, expected_version)
+        except FlightVersionConflictError:
+            raise
         except FlightRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if  self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
-    def delete_flight(self, flight_id: str) -> bool:
-        """Delete a flight record."""
+    def delete_flight(self, flight_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete a flight record.
+
+        Raises FlightVersionConflictError if expected_version is given and the
+        record has been changed since.
+        """
         # Delete the record
         try:
-            self.flight_repository.delete_flight(flight_id)
+            self.flight_repository.delete_flight(flight_id, expected_version)
+        except FlightVersionConflictError:
+            raise
         except FlightRepositoryError as e:
             return False
 
-        # Update the view if callback provided
-        if self.view_update_callback:
-            self.view_update_callback()
-
+        _update_view(self.view_update_callback)
         return True
 
     def search_flights(self, search_term: str) -> List[Dict[str, Any]]:
         """Search for flight records."""
         try:
-            return [flight.to_json() for flight in self.flight_repository.get_flights() if flight.contains_term(search_term)]
+            return _matching(self.flight_repository.search_flights(search_term), search_term)
+        except FlightRepositoryError as e:
+            return []
+
+    def find_flights(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get the flight records whose field equals value."""
+        try:
+            return [_to_dict(flight) for flight in self.flight_repository.find_flights(field, value)]
         except FlightRepositoryError as e:
             return []
 
     def get_all_flights(self) -> List[Dict[str, Any]]:
         """Get all flight records."""
         try:
-            return [flight.to_json() for flight in self.flight_repository.get_flights()]
+            return [_to_dict(flight) for flight in self.flight_repository.get_flights()]
         except FlightRepositoryError as e:
             return []
 
+    def iter_flights(self, search_term: Optional[str] = None, field: Optional[str] = None,
+                     value: Any = None) -> Iterator[Dict[str, Any]]:
+        """Yield the flight records matching search_term, or whose field equals value, one at a time.
+
+        Without either, yields all flight records. Each record is converted as it
+        is reached, so a listing is never held in full.
+        """
+        try:
+            flights = self.flight_repository.iter_flights(search_term, field, value)
+        except FlightRepositoryError as e:
+            return iter(())
+        if search_term is not None:
+            # Index candidates may only share n-grams with the term; check each
+            flights = (flight for flight in flights if flight.contains_term(search_term))
+        return (_to_dict(flight) for flight in flights)
+
     def get_flight_by_id(self, flight_id: str) -> Optional[Dict[str, Any]]:
         """Get a flight record by ID."""
         try:
-            return self.flight_repository.get_flight(flight_id).to_json()
+            return _to_dict(self.flight_repository.get_flight(flight_id))
         except FlightRepositoryError as e:
             return None
+
+
+class AsyncFlightController:
+    """Controller for flight operations on an asyncio event loop.
+
+    Validates and converts records with the same helpers as FlightController.
+    """
+
+    def __init__(self, flight_repository: AsyncFlightRepository, view_update_callback: Optional[Callable] = None):
+        """Initialize with model and optional view update callback."""
+        self.flight_repository = flight_repository
+        self.view_update_callback = view_update_callback
+
+    async def create_flight(self, flight_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Create a new flight record; see FlightController.create_flight."""
+        flight = _parse_flight(flight_data)
+        if flight is None:
+            return False
+        try:
+            await self.flight_repository.create_flight(flight, expected_version)
+        except FlightVersionConflictError:
+            raise
+        except FlightRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def update_flight(self, flight_id: str, updated_data: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Update an existing flight record; see FlightController.update_flight."""
+        flight_update_request = _parse_update(flight_id, updated_data)
+        if flight_update_request is None:
+            return False
+        try:
+            await self.flight_repository.update_flight(flight_update_request, expected_version)
+        except FlightVersionConflictError:
+            raise
+        except FlightRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def delete_flight(self, flight_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete a flight record; see FlightController.delete_flight."""
+        try:
+            await self.flight_repository.delete_flight(flight_id, expected_version)
+        except FlightVersionConflictError:
+            raise
+        except FlightRepositoryError as e:
+            return False
+        _update_view(self.view_update_callback)
+        return True
+
+    async def search_flights(self, search_term: str) -> List[Dict[str, Any]]:
+        """Search for flight records."""
+        try:
+            return _matching(await self.flight_repository.search_flights(search_term), search_term)
+        except FlightRepositoryError as e:
+            return []
+
+    async def find_flights(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get the flight records whose field equals value."""
+        try:
+            return [_to_dict(flight) for flight in await self.flight_repository.find_flights(field, value)]
+        except FlightRepositoryError as e:
+            return []
+
+    async def get_all_flights(self) -> List[Dict[str, Any]]:
+        """Get all flight records."""
+        try:
+            return [_to_dict(flight) for flight in await self.flight_repository.get_flights()]
+        except FlightRepositoryError as e:
+            return []
+
+    async def get_flight_by_id(self, flight_id: str) -> Optional[Dict[str, Any]]:
+        """Get a flight record by ID."""
+        try:
+            return _to_dict(await self.flight_repository.get_flight(flight_id))
+        except FlightRepositoryError as e:
+            return None
+
+
+def _parse_flight(flight_data: Dict[str, Any]) -> Optional[Flight]:
+    """Return the flight in flight_data, or None if it is invalid."""
+    try:
+        return Flight.from_json(flight_data)
+    except FlightInvalidError:
+        return None
+
+
+def _parse_update(flight_id: str, updated_data: Dict[str, Any]) -> Optional[FlightUpdateRequest]:
+    """Return the update of flight_id in updated_data, or None if it is invalid."""
+    try:
+        flight_update_request = FlightUpdateRequest.from_json(updated_data)
+    except FlightInvalidError:
+        return None
+    flight_update_request.flight_id = flight_id
+    return flight_update_request
+
+
+def _matching(flights: Iterable[Flight], search_term: str) -> List[Dict[str, Any]]:
+    # Index candidates may only share n-grams with the term; check each
+    return [_to_dict(flight) for flight in flights if flight.contains_term(search_term)]
+
+
+def _update_view(view_update_callback: Optional[Callable]):
+    # Update the view if callback provided
+    if view_update_callback:
+        view_update_callback()
+
+
+def _to_dict(flight: Flight) -> Dict[str, Any]:
+    return {**flight.to_json(), VERSION: flight.version}
@@ -1,7 +1,7 @@
 import dataclasses
 from typing import Dict, Any, Optional
 
-from pkg.json_object import JSONObject
+from pkg.json_object import JSONObject, VERSION
 
 ID = "Flight ID"
 CLIENT_ID = "Client ID"
@@ -20,6 +20,7 @@ class Flight(JSONObject):
     departure: str
     arrival: str
     status: str
+    version: int = 0
 
     def to_json(self) -> Dict[str, Any]:
         return {
@@ -52,7 +53,8 @@ class Flight(JSONObject):
             date=json.get(DATE, ""),
             departure=json.get(DEPARTURE, ""),
             arrival=json.get(ARRIVAL, ""),
-            status=json.get(STATUS, "")
+            status=json.get(STATUS, ""),
+            version=json.get(VERSION, 0)
         )
 
 @dataclasses.dataclass
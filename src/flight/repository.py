@@ -1,5 +1,5 @@
 import abc
-from typing import List
+from typing import Any, Iterator, List, Optional
 
 from src.flight.model import Flight, FlightUpdateRequest
 
@@ -14,16 +14,59 @@ class FlightRepository(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def create_flight(self, flight: Flight):
+    def create_flight(self, flight: Flight, expected_version: Optional[int] = None):
         pass
 
     @abc.abstractmethod
-    def update_flight(self, flight: FlightUpdateRequest):
+    def update_flight(self, flight: FlightUpdateRequest, expected_version: Optional[int] = None):
         pass
 
     @abc.abstractmethod
-    def delete_flight(self, flight_id: str):
+    def delete_flight(self, flight_id: str, expected_version: Optional[int] = None):
         pass
 
+    def find_flights(self, field: str, value: Any) -> List[Flight]:
+        return [flight for flight in self.get_flights() if flight.to_json().get(field) == value]
+
+    def search_flights(self, term: str) -> List[Flight]:
+        return [flight for flight in self.get_flights() if flight.contains_term(term)]
+
+    def iter_flights(self, term: Optional[str] = None, field: Optional[str] = None, value: Any = None) -> Iterator[Flight]:
+        if term is not None:
+            return iter(self.search_flights(term))
+        if field is not None:
+            return iter(self.find_flights(field, value))
+        return iter(self.get_flights())
+
+class AsyncFlightRepository(abc.ABC):
+    @abc.abstractmethod
+    async def get_flights(self) -> List[Flight]:
+        pass
+
+    @abc.abstractmethod
+    async def get_flight(self, flight_id: str) -> Flight:
+        pass
+
+    @abc.abstractmethod
+    async def create_flight(self, flight: Flight, expected_version: Optional[int] = None):
+        pass
+
+    @abc.abstractmethod
+    async def update_flight(self, flight: FlightUpdateRequest, expected_version: Optional[int] = None):
+        pass
+
+    @abc.abstractmethod
+    async def delete_flight(self, flight_id: str, expected_version: Optional[int] = None):
+        pass
+
+    async def find_flights(self, field: str, value: Any) -> List[Flight]:
+        return [flight for flight in await self.get_flights() if flight.to_json().get(field) == value]
+
+    async def search_flights(self, term: str) -> List[Flight]:
+        return [flight for flight in await self.get_flights() if flight.contains_term(term)]
+
 class FlightRepositoryError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class FlightVersionConflictError(FlightRepositoryError):
+    pass
@@ -1,8 +1,15 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
 
-from pkg.json_db import JsonFileDB, KeyNotFound
+from pkg import metrics
+from pkg.json_db import JsonFileDB, KeyNotFound, VersionConflict
+from pkg.json_object import VERSION
 from src.flight.model import FlightUpdateRequest, Flight
-from src.flight.repository import FlightRepository, FlightRepositoryError
+from src.flight.repository import (
+    FlightRepository, FlightRepositoryError, FlightVersionConflictError, AsyncFlightRepository
+)
+
+if TYPE_CHECKING:
+    from pkg.async_json_db import AsyncJsonFileDB
 
 SPACE = "Flight"
 
@@ -12,10 +19,12 @@ class FlightRepositoryJson(FlightRepository):
 
     def get_flights(self) -> List[Flight]:
         try:
-            flights_dict = self.json_db.get([SPACE])
+            # Iterate a snapshot so concurrent writes cannot change the dict under us
+            flights_dict = self.json_db.snapshot().get([SPACE])
         except KeyNotFound:
             return []
         flights = [flight for flight in flights_dict.values()]
+        metrics.add("flight_repository.records_scanned", len(flights))
         return [Flight.from_json(flight) for flight in flights]
 
     def get_flight(self, flight_id: str):
@@ -25,25 +34,100 @@ class FlightRepositoryJson(FlightRepository):
             raise FlightRepositoryError(f"Flight with id {flight_id} not found")
         return Flight.from_json(flight)
 
-    def create_flight(self, flight: Flight):
-        self.json_db.set([SPACE, flight.flight_id], flight.to_json())
+    def find_flights(self, field: str, value: Any) -> List[Flight]:
+        return [Flight.from_json(flight) for flight in self.json_db.find(SPACE, field, value)]
+
+    def search_flights(self, term: str) -> List[Flight]:
+        # Candidates from the n-gram index when there is one; the controller
+        # still checks each with contains_term
+        return [Flight.from_json(flight) for flight in self.json_db.search(SPACE, term)]
+
+    def iter_flights(self, term: Optional[str] = None, field: Optional[str] = None, value: Any = None) -> Iterator[Flight]:
+        # Only references to the stored records are gathered up front; each is
+        # converted as the caller gets to it
+        if term is not None:
+            flights = self.json_db.search(SPACE, term)
+        elif field is not None:
+            flights = self.json_db.find(SPACE, field, value)
+        else:
+            try:
+                flights_dict = self.json_db.snapshot().get([SPACE])
+            except KeyNotFound:
+                return iter(())
+            metrics.add("flight_repository.records_scanned", len(flights_dict))
+            flights = flights_dict.values()
+        return (Flight.from_json(flight) for flight in flights)
 
-    def update_flight(self, flight_update_request: FlightUpdateRequest):
+    def create_flight(self, flight: Flight, expected_version: Optional[int] = None):
         try:
-            flight = self.json_db.get([SPACE, flight_update_request.flight_id])
-        except KeyNotFound:
-            raise FlightRepositoryError(f"Flight with id {flight_update_request.flight_id} not found")
+            self.json_db.set([SPACE, flight.flight_id], flight.to_json(), expected_version=expected_version)
+        except VersionConflict as e:
+            raise FlightVersionConflictError(str(e))
 
-        updated_flight = flight_update_request.to_json()
-        for key, value in updated_flight.items():
-            if value is not None:
-                flight[key] = value
+    def update_flight(self, flight_update_request: FlightUpdateRequest, expected_version: Optional[int] = None):
+        # Compare-and-set: without an expected version, retry against the
+        # latest stored version until no concurrent write slips in between
+        while True:
+            try:
+                flight = dict(self.json_db.get([SPACE, flight_update_request.flight_id]))
+            except KeyNotFound:
+                raise FlightRepositoryError(f"Flight with id {flight_update_request.flight_id} not found")
 
-        self.json_db.set([SPACE, flight_update_request.flight_id], flight)
+            _merge_update(flight, flight_update_request)
 
+            version = flight.get(VERSION, 0) if expected_version is None else expected_version
+            try:
+                self.json_db.set([SPACE, flight_update_request.flight_id], flight, expected_version=version)
+                return
+            except VersionConflict as e:
+                if expected_version is not None:
+                    raise FlightVersionConflictError(str(e))
 
-    def delete_flight(self, flight_id: str):
+    def delete_flight(self, flight_id: str, expected_version: Optional[int] = None):
         try:
-            self.json_db.delete([SPACE, flight_id])
+            self.json_db.delete([SPACE, flight_id], expected_version=expected_version)
         except KeyNotFound:
             raise FlightRepositoryError(f"Flight with id {flight_id} not found")
+        except VersionConflict as e:
+            raise FlightVersionConflictError(str(e))
+
+
+class AsyncFlightRepositoryJson(AsyncFlightRepository):
+    """Non-blocking counterpart of FlightRepositoryJson.
+
+    Runs the same operations of a FlightRepositoryJson over the JsonFileDB of
+    the AsyncJsonFileDB: reads on the default thread pool, writes in the next
+    batch of the writer thread, resolving once it is saved.
+    """
+
+    def __init__(self, json_db: 'AsyncJsonFileDB'):
+        self.json_db = json_db
+        self.repository = FlightRepositoryJson(json_db.json_db)
+
+    async def get_flights(self) -> List[Flight]:
+        return await self.json_db.read(self.repository.get_flights)
+
+    async def get_flight(self, flight_id: str) -> Flight:
+        return await self.json_db.read(self.repository.get_flight, flight_id)
+
+    async def find_flights(self, field: str, value: Any) -> List[Flight]:
+        return await self.json_db.read(self.repository.find_flights, field, value)
+
+    async def search_flights(self, term: str) -> List[Flight]:
+        return await self.json_db.read(self.repository.search_flights, term)
+
+    async def create_flight(self, flight: Flight, expected_version: Optional[int] = None):
+        await self.json_db.write(self.repository.create_flight, flight, expected_version)
+
+    async def update_flight(self, flight_update_request: FlightUpdateRequest, expected_version: Optional[int] = None):
+        # Runs on the writer thread inside the batch, which holds the write lock
+        await self.json_db.write(self.repository.update_flight, flight_update_request, expected_version)
+
+    async def delete_flight(self, flight_id: str, expected_version: Optional[int] = None):
+        await self.json_db.write(self.repository.delete_flight, flight_id, expected_version)
+
+
+def _merge_update(flight: Dict[str, Any], flight_update_request: FlightUpdateRequest):
+    for key, value in flight_update_request.to_json().items():
+        if value is not None:
+            flight[key] = value
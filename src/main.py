@@ -11,13 +11,18 @@ import os
 import sys
 from tkinter import messagebox
 
+from pkg import metrics
 from pkg.json_db import JsonFileDB
+from pkg.profiling import PROFILE_ENV, Profiler
+from src.app import PERSISTENT_INDEXES, Controllers, instrument_controllers
 from src.airline.repository_json import AirlineRepositoryJson
 from src.client.controller import ClientController
 from src.airline.controller import AirlineController
 from src.client.repository_json import ClientRepositoryJson
 from src.flight.controller import FlightController
 from src.flight.repository_json import FlightRepositoryJson
+from src.perf_hud import HUD_ENV
+from src.workload import TRACE_ENV, record_workload
 from views import RecordManagementGUI
 
 
@@ -29,43 +34,89 @@ def main():
         os.makedirs(data_dir, exist_ok=True)
         data_file = os.path.join(data_dir, "records.json")
 
-        # Initialize JSON database with data file
-        json_db = JsonFileDB(data_file)
+        # Create the GUI first; it is usable while the records load
+        app = RecordManagementGUI()
 
-        # Initialize models (repositories) with the JSON database
-        client_repository = ClientRepositoryJson(json_db)
-        airline_repository = AirlineRepositoryJson(json_db)
-        flight_repository = FlightRepositoryJson(json_db)
+        # F9 profiles a time window; FRMS_PROFILE profiles the whole session,
+        # including loading the data
+        app.profile_directory = data_dir
+        if os.environ.get(PROFILE_ENV):
+            app.profiler = Profiler(data_dir, "gui-session")
+            app.profiler.start()
 
-        # Create GUI instance first (without showing it)
-        app = RecordManagementGUI()
+        def open_data(progress):
+            # Reading the file and building any missing indexes take time in
+            # proportion to the data, so they run on a worker thread while
+            # the window is already shown
+            json_db = JsonFileDB(data_file, progress=progress)
+            json_db.open_indexes(PERSISTENT_INDEXES)
+            return json_db
+
+        def opened(json_db):
+            # Initialize models (repositories) with the JSON database
+            client_repository = ClientRepositoryJson(json_db)
+            airline_repository = AirlineRepositoryJson(json_db)
+            flight_repository = FlightRepositoryJson(json_db)
+
+            # Set up controllers with view update callbacks
+            client_controller = ClientController(
+                client_repository=client_repository,
+                view_update_callback=app.display_client_records
+            )
+            airline_controller = AirlineController(
+                airline_repository=airline_repository,
+                view_update_callback=app.display_airline_records
+            )
+            flight_controller = FlightController(
+                flight_repository=flight_repository,
+                view_update_callback=app.display_flight_records
+            )
+
+            # Time operations while metrics are enabled, and record the
+            # workload for replay if asked to
+            controllers = instrument_controllers(
+                Controllers(json_db, client_controller, airline_controller, flight_controller))
+            if os.environ.get(TRACE_ENV):
+                record_workload(controllers, os.environ[TRACE_ENV])
 
-        # Set up controllers with view update callbacks
-        client_controller = ClientController(
-            client_repository=client_repository,
-            view_update_callback=app.display_client_records
-        )
-        airline_controller = AirlineController(
-            airline_repository=airline_repository,
-            view_update_callback=app.display_airline_records
-        )
-        flight_controller = FlightController(
-            flight_repository=flight_repository,
-            view_update_callback=app.display_flight_records
-        )
-
-        # Inject controllers into the view
-        app.client_controller = client_controller
-        app.airline_controller = airline_controller
-        app.flight_controller = flight_controller
-
-        # Refresh all displays
-        app.display_client_records()
-        app.display_airline_records()
-        app.display_flight_records()
+            # Inject controllers into the view
+            app.client_controller = client_controller
+            app.airline_controller = airline_controller
+            app.flight_controller = flight_controller
+
+            # The performance line in the status bar (F12) turns timings on
+            # when first shown; methods timed already, e.g. with metrics
+            # enabled at startup, are not wrapped again
+            def enable_metrics():
+                metrics.enable()
+                instrument_controllers(controllers)
+
+            app.json_db = json_db
+            app.enable_metrics = enable_metrics
+            if app.hud_job is not None:
+                # Shown while loading, before timings could be turned on
+                enable_metrics()
+            elif os.environ.get(HUD_ENV):
+                app.toggle_hud()
+
+            # Load the tabs built so far in the background; the others load
+            # when selected
+            app.refresh_built_tabs()
+
+        app.open_in_background(open_data, opened)
 
         # Start the main event loop
         app.mainloop()
+
+        # Save the indexes as of the last write and the warm cache for the
+        # next start
+        if app.json_db is not None:
+            app.json_db.persist_indexes()
+            app.json_db.write_warm_cache()
+        if metrics.REGISTRY.enabled:
+            metrics.REGISTRY.dump(os.path.join(data_dir, "metrics.json"))
+        if app.profiler is not None and app.profiler.running:
+            print(f"Profile written to {app.profiler.stop()[1]}")
         
     except Exception as e:
         messagebox.showerror("Error", f"An error occurred while starting the application: {str(e)}")
@@ -0,0 +1,93 @@
+"""
+Flight Record Management System
+Performance HUD
+
+Text for the performance line of the GUI status bar: the latency of the last
+controller operation split into storage, controller and render time, the
+size of the data file, record counts and the record cache hit rate.
+
+Timings come from the metrics registry (see pkg.metrics), so the HUD only
+has numbers while metrics are enabled. Storage time is the time spent in
+repository calls made during the operation, which includes reading and
+writing the file; controller time is the rest of the operation. Render time
+is that of the first table fill finished after it. F12 shows or hides the
+line, and FRMS_HUD shows it at startup.
+"""
+
+import dataclasses
+import os
+from typing import List, Optional, Tuple
+
+from pkg import metrics
+from pkg.json_db import JsonFileDB
+from src.app import RESOURCES
+
+# Environment variable that shows the HUD at startup
+HUD_ENV = "FRMS_HUD"
+CONTROLLER = "_controller."
+REPOSITORY = "_repository."
+# Observed by the view for the time spent inserting the rows of a table
+RENDER = "view.render"
+
+
+@dataclasses.dataclass
+class OperationBreakdown:
+    name: str
+    total: float
+    storage: float
+    render: Optional[float] = None
+
+    @property
+    def controller(self) -> float:
+        return max(self.total - self.storage, 0.0)
+
+
+def last_operation(observations: List[Tuple[str, float, float]]) -> Optional[OperationBreakdown]:
+    """Break down the latest controller call among observations of (name, end, seconds)."""
+    for position in range(len(observations) - 1, -1, -1):
+        name, end, seconds = observations[position]
+        if CONTROLLER in name:
+            break
+    else:
+        return None
+    start = end - seconds
+    storage = sum(other_seconds for other, other_end, other_seconds in observations[:position]
+                  if REPOSITORY in other and other_end - other_seconds >= start and other_end <= end)
+    render = next((other_seconds for other, other_end, other_seconds in observations[position + 1:]
+                   if other == RENDER and other_end >= end), None)
+    return OperationBreakdown(name.split(".", 1)[1], seconds, storage, render)
+
+
+def hud_text(json_db: JsonFileDB, registry: metrics.MetricsRegistry = metrics.REGISTRY) -> str:
+    """Return the performance line for the status bar."""
+    parts = []
+    operation = last_operation(registry.recent_observations())
+    if operation is not None:
+        render = f", render {_ms(operation.render)}" if operation.render is not None else ""
+        parts.append(f"Last: {operation.name} {_ms(operation.total)} "
+                     f"(storage {_ms(operation.storage)}, controller {_ms(operation.controller)}{render})")
+    elif not registry.enabled:
+        parts.append("Timings off")
+    try:
+        parts.append(_size(os.path.getsize(json_db.file_path)))
+    except OSError:
+        pass
+    parts.append(", ".join(f"{len(json_db.data.get(resource.space, {})):,} {name}"
+                           for name, resource in RESOURCES.items()))
+    if json_db.cache is not None:
+        stats = json_db.cache.stats()
+        if stats["hits"] + stats["misses"]:
+            parts.append(f"cache {stats['hit_ratio']:.0%} hits")
+    return " | ".join(parts)
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} ms"
+
+
+def _size(size: int) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Headless HTTP/JSON API Server
+
+Exposes the client, airline and flight controllers over HTTP without the
+Tk user interface. Every connection is served on its own thread and kept
+alive between requests (HTTP/1.1), so clients may pipeline requests on one
+connection. Listings are streamed with chunked transfer encoding. With
+``--workers N`` the server pre-forks N processes sharing the data file.
+With ``--replica`` it serves read-only queries from a replica that tails
+the journal, so reporting load stays away from the writing processes.
+
+Endpoints, for each of ``clients``, ``airlines`` and ``flights``:
+
+    GET    /flights             list all records (``?q=term`` to search,
+                                ``?Field=value`` to filter on a field)
+    GET    /flights/<id>        fetch one record
+    POST   /flights             create a record from a JSON body (409 if the ID is taken)
+    PUT    /flights/<id>        update a record (``If-Match: <version>`` optional)
+    DELETE /flights/<id>        delete a record (``If-Match: <version>`` optional)
+    GET    /_replication        replication lag of a ``--replica`` server
+    GET    /_metrics            latency histograms and counters of a ``--metrics`` server
+
+On a ``--profile`` server, a request sent with an ``X-Profile: 1`` header
+runs under cProfile and tracemalloc, and the reports are written next to
+the data file (see pkg.profiling).
+"""
+
+import argparse
+import functools
+import io
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from pkg import metrics
+from pkg.json_db import JsonFileDB
+from pkg.profiling import profile_call
+from pkg.record_cache import DEFAULT_CACHE_BYTES
+from pkg.replica import ReplicaDB
+from src.app import BAD_INPUT_ERRORS, RESOURCES, Controllers, Resource, default_data_file, open_controllers
+from src.workload import record_workload
+
+# Number of records encoded per chunk of a streamed listing
+STREAM_BATCH_SIZE = 256
+# Request header asking a --profile server to profile that request
+PROFILE_HEADER = "X-Profile"
+
+
+class ApiServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the controllers shared by all handlers."""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], controllers: Optional[Controllers], verbose: bool = False,
+                 profile_directory: Optional[str] = None):
+        super().__init__(address, ApiRequestHandler)
+        self.controllers = controllers
+        self.verbose = verbose
+        # Where requests with PROFILE_HEADER are profiled to; None ignores it
+        self.profile_directory = profile_directory
+        # tracemalloc is process-wide, so profiled requests take turns
+        self.profile_lock = threading.Lock()
+
+    @property
+    def replica(self) -> Optional[ReplicaDB]:
+        json_db = self.controllers.json_db if self.controllers else None
+        return json_db if isinstance(json_db, ReplicaDB) else None
+
+
+def answer_errors(method):
+    """Answer 400 or 500 when method raises, keeping the connection usable.
+
+    Errors of a write with a body of the wrong shape answer 400, any other
+    error 500. If the response was already started the connection is
+    closed instead, since the client cannot tell where it ends. Requests
+    with PROFILE_HEADER are profiled on a server with a profile_directory.
+    """
+    @functools.wraps(method)
+    def handle(self):
+        self.body_read = False
+        self.response_started = False
+        try:
+            directory = self.server.profile_directory
+            if directory is not None and self.headers.get(PROFILE_HEADER):
+                label = f"server-{self.command}-{urlsplit(self.path).path}"
+                with self.server.profile_lock:
+                    _, (_, report_path) = profile_call(directory, label, method, self)
+                print(f"Profile of {self.command} {self.path} written to {report_path}", file=sys.stderr)
+            else:
+                method(self)
+        except Exception as e:
+            if self.response_started:
+                traceback.print_exc()
+                self.close_connection = True
+                return
+            if not self.body_read:
+                try:
+                    self.discard_body()
+                except ValueError:
+                    # Without a valid length the next request cannot be found
+                    self.close_connection = True
+            if self.command in ("POST", "PUT", "PATCH") and isinstance(e, BAD_INPUT_ERRORS):
+                self.send_error_json(HTTPStatus.BAD_REQUEST, f"invalid request body: {e}")
+            else:
+                traceback.print_exc()
+                self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR, "internal server error")
+
+    return handle
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests on a kept-alive connection to the controllers."""
+    protocol_version = "HTTP/1.1"
+    server_version = "FlightRecordAPI/1.0"
+    disable_nagle_algorithm = True
+    # Buffer responses; BaseHTTPRequestHandler flushes after each request
+    wbufsize = io.DEFAULT_BUFFER_SIZE
+
+    @answer_errors
+    def do_GET(self):
+        if urlsplit(self.path).path.rstrip("/") == "/_replication":
+            replica = self.server.replica
+            if replica is None:
+                self.send_error_json(HTTPStatus.NOT_FOUND, "this server is not a replica")
+            else:
+                replica.refresh()
+                self.send_json(HTTPStatus.OK, replica.lag())
+            return
+        if urlsplit(self.path).path.rstrip("/") == "/_metrics":
+            self.send_metrics()
+            return
+        route = self.route()
+        if route is None:
+            return
+        resource, record_id, query = route
+        controller = self.controller(resource)
+        if record_id is None:
+            # Records are converted and sent one at a time as the listing streams
+            iter_records = getattr(controller, f"iter_{resource.plural}")
+            terms = query.pop("q", None)
+            if terms:
+                records = iter_records(search_term=terms[0])
+            elif query:
+                # The first field goes to the (possibly indexed) lookup
+                field, values = next(iter(query.items()))
+                records = iter_records(field=field, value=values[0])
+            else:
+                records = iter_records()
+            filters = {field: values[0] for field, values in query.items()}
+            if filters:
+                records = (record for record in records
+                           if all(str(record.get(field)) == value for field, value in filters.items()))
+            self.send_stream(records)
+            return
+        record = getattr(controller, f"get_{resource.entity}_by_id")(record_id)
+        if record is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"{resource.entity} {record_id} not found")
+            return
+        self.send_json(HTTPStatus.OK, record)
+
+    @answer_errors
+    def do_POST(self):
+        route = self.route()
+        if route is None or not self.writable():
+            return
+        body = self.read_json()
+        if body is None:
+            return
+        resource, record_id, _ = route
+        if record_id is not None:
+            self.send_error_json(HTTPStatus.METHOD_NOT_ALLOWED, "POST to a collection to create a record")
+            return
+        controller = self.controller(resource)
+        create = getattr(controller, f"create_{resource.entity}")
+        try:
+            # Only create records whose ID is free (version 0), so concurrent
+            # creates cannot overwrite each other
+            created = create(body, 0)
+        except resource.conflict_error as e:
+            self.send_error_json(HTTPStatus.CONFLICT, str(e))
+            return
+        if created:
+            record_id = body[resource.id_field]
+            self.send_json(HTTPStatus.CREATED, getattr(controller, f"get_{resource.entity}_by_id")(record_id))
+        else:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"invalid {resource.entity} record")
+
+    @answer_errors
+    def do_PUT(self):
+        route = self.route()
+        if route is None or not self.writable():
+            return
+        body = self.read_json()
+        if body is None:
+            return
+        resource, record_id, _ = route
+        if record_id is None:
+            self.send_error_json(HTTPStatus.METHOD_NOT_ALLOWED, "PUT to a record to update it")
+            return
+        body.setdefault(resource.id_field, record_id)
+        update = getattr(self.controller(resource), f"update_{resource.entity}")
+        try:
+            success = update(record_id, body, self.expected_version())
+        except resource.conflict_error as e:
+            self.send_error_json(HTTPStatus.CONFLICT, str(e))
+            return
+        except ValueError as e:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        if success:
+            self.send_json(HTTPStatus.OK, getattr(self.controller(resource), f"get_{resource.entity}_by_id")(record_id))
+        else:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"could not update {resource.entity} {record_id}")
+
+    do_PATCH = do_PUT
+
+    @answer_errors
+    def do_DELETE(self):
+        route = self.route()
+        if route is None or not self.writable():
+            return
+        resource, record_id, _ = route
+        if record_id is None:
+            self.send_error_json(HTTPStatus.METHOD_NOT_ALLOWED, "DELETE a record, not a collection")
+            return
+        delete = getattr(self.controller(resource), f"delete_{resource.entity}")
+        try:
+            success = delete(record_id, self.expected_version())
+        except resource.conflict_error as e:
+            self.send_error_json(HTTPStatus.CONFLICT, str(e))
+            return
+        except ValueError as e:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        if success:
+            self.send_response(HTTPStatus.NO_CONTENT)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"{resource.entity} {record_id} not found")
+
+    def route(self) -> Optional[Tuple[Resource, Optional[str], Dict[str, Any]]]:
+        """Split the path into resource, record id and query, or answer 404."""
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+            self.discard_body()
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"no such endpoint: {url.path}")
+            return None
+        record_id = parts[1] if len(parts) == 2 else None
+        return RESOURCES[parts[0]], record_id, parse_qs(url.query)
+
+    def writable(self) -> bool:
+        """Answer 405 on a replica, which only serves reads."""
+        if self.server.replica is None:
+            return True
+        self.discard_body()
+        self.send_error_json(HTTPStatus.METHOD_NOT_ALLOWED, "this server is a read-only replica")
+        return False
+
+    def controller(self, resource: Resource):
+        return getattr(self.server.controllers, resource.controller)
+
+    def expected_version(self) -> Optional[int]:
+        value = self.headers.get("If-Match")
+        if value is None:
+            return None
+        try:
+            return int(value.strip('"'))
+        except ValueError:
+            raise ValueError(f"If-Match must be a record version, got {value!r}")
+
+    def read_json(self) -> Optional[Dict[str, Any]]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        self.body_read = True
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, "request body is not valid JSON")
+            return None
+        if not isinstance(body, dict):
+            self.send_error_json(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+            return None
+        return body
+
+    def discard_body(self):
+        # Keep the connection in step with pipelined requests
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.body_read = True
+
+    def send_metrics(self):
+        """Answer with the metrics of this process, as Prometheus text unless ?format=json."""
+        if not metrics.REGISTRY.enabled:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "metrics are disabled; start the server with --metrics")
+            return
+        if parse_qs(urlsplit(self.path).query).get("format") == ["json"]:
+            self.send_json(HTTPStatus.OK, metrics.REGISTRY.snapshot())
+            return
+        body = metrics.REGISTRY.to_prometheus().encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: HTTPStatus, value: Any):
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_response(self, code, message=None):
+        self.response_started = True
+        super().send_response(code, message)
+
+    def end_headers(self):
+        replica = self.server.replica
+        if replica is not None:
+            self.send_header("X-Replication-Sequence", str(replica.sequence))
+        super().end_headers()
+
+    def send_error_json(self, status: HTTPStatus, message: str):
+        self.send_json(status, {"error": message})
+
+    def send_stream(self, records: Iterable[Dict[str, Any]]):
+        """Send a JSON array in chunks, encoding records as they are taken from records."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        encode = json.JSONEncoder().encode
+        self.write_chunk(b"[")
+        batch = []
+        first = True
+        for record in records:
+            batch.append(encode(record))
+            if len(batch) == STREAM_BATCH_SIZE:
+                self.write_chunk(("" if first else ",").encode() + ",".join(batch).encode())
+                batch.clear()
+                first = False
+        if batch:
+            self.write_chunk(("" if first else ",").encode() + ",".join(batch).encode())
+        self.write_chunk(b"]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(data_file: str, host: str = "127.0.0.1", port: int = 8080, verbose: bool = False,
+          workload_trace: Optional[str] = None, profile: bool = False, **options):
+    """Open the data file and serve the API until interrupted.
+
+    With workload_trace, controller calls are recorded to that file (see
+    src.workload). With profile, requests with PROFILE_HEADER are profiled
+    next to the data file. options are passed on to open_controllers.
+    """
+    server = ApiServer((host, port), open_serving_controllers(data_file, workload_trace, **options), verbose=verbose,
+                       profile_directory=os.path.dirname(os.path.abspath(data_file)) if profile else None)
+    mode = " as a read-only replica" if options.get("replica") else ""
+    print(f"Serving {data_file} on http://{host}:{server.server_address[1]}{mode}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    # Let the next start load the warm cache instead of parsing the file
+    server.controllers.json_db.write_warm_cache()
+
+
+def serve_workers(data_file: str, workers: int, host: str = "127.0.0.1", port: int = 8080, verbose: bool = False,
+                  workload_trace: Optional[str] = None, profile: bool = False, **options):
+    """Serve the API from several pre-forked worker processes.
+
+    The parent binds the listening socket and forks the workers, which all
+    accept on it. Each worker opens its own JsonFileDB: writes are serialised
+    between workers by the data file lock, and reads are answered from the
+    worker's in-memory copy, which is reloaded only when another worker has
+    saved. Workers that die are replaced until the parent is stopped.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Multi-process serving needs a platform with os.fork")
+    if not options.get("replica"):
+        # Load the file once here, writing the warm cache if it is stale, so
+        # the workers start from the cache instead of all parsing the file
+        # and racing to write it
+        JsonFileDB(data_file, codec=options.get("codec"), cache_bytes=0)
+
+    server = ApiServer((host, port), None, verbose=verbose,
+                       profile_directory=os.path.dirname(os.path.abspath(data_file)) if profile else None)
+    print(f"Serving {data_file} on http://{host}:{server.server_address[1]} with {workers} workers", flush=True)
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            status = 0
+            try:
+                server.controllers = open_serving_controllers(data_file, workload_trace, **options)
+                server.serve_forever()
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    try:
+        while children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            children.discard(pid)
+            if not stopping:
+                # Avoid a tight fork loop if workers die on start-up
+                time.sleep(0.5)
+                spawn()
+    finally:
+        server.server_close()
+
+
+def open_serving_controllers(data_file: str, workload_trace: Optional[str] = None, **options) -> Controllers:
+    controllers = open_controllers(data_file, **options)
+    if workload_trace:
+        # Workers append to the same trace; each line is a single write
+        record_workload(controllers, workload_trace)
+    return controllers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the flight record controllers over HTTP/JSON.")
+    parser.add_argument("--data", default=default_data_file(), help="path of the records.json data file")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes to fork")
+    parser.add_argument("--replica", action="store_true", help="serve read-only queries from a journal-tailing replica")
+    parser.add_argument("--codec", help="format to save the data file in, e.g. minified or gzip "
+                        "(default: keep its current format)")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="memory budget for decoded records of segment files, 0 to disable")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--record-workload", metavar="FILE", help="append every controller call to this trace file")
+    parser.add_argument("--metrics", action="store_true", help="time operations and serve them at /_metrics")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"profile requests sent with an {PROFILE_HEADER}: 1 header, writing the reports "
+                        "next to the data file")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    options = {"replica": args.replica, "codec": args.codec, "cache_bytes": args.cache_mb * 1024 * 1024,
+               "workload_trace": args.record_workload, "profile": args.profile}
+    if args.workers > 1:
+        serve_workers(args.data, args.workers, args.host, args.port, args.verbose, **options)
+    else:
+        serve(args.data, args.host, args.port, args.verbose, **options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
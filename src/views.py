@@ -1,8 +1,30 @@
+import contextlib
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from tkinter.font import Font
 from typing import Dict, Any, List, Optional, Callable
 
+from pkg import metrics
+from pkg.json_object import VERSION
+from pkg.profiling import Profiler
+from src.airline.repository import AirlineVersionConflictError
+from src.client.repository import ClientVersionConflictError
+from src.flight.repository import FlightVersionConflictError
+from src.perf_hud import RENDER, hud_text
+
+# Rows inserted into a table per turn of the event loop
+INSERT_CHUNK = 500
+# How often to check whether records loading in the background have arrived
+LOAD_POLL_MS = 50
+# Key that shows or hides the performance line, and how often it is updated
+HUD_KEY = "<F12>"
+HUD_REFRESH_MS = 1000
+# Key that starts and stops a profiling window
+PROFILE_KEY = "<F9>"
+
 class ModernUI:
     """Custom colour scheme and styling constants"""
     # Colour palette
@@ -48,6 +70,14 @@ class RecordManagementGUI(tk.Tk):
         self.client_controller = client_controller
         self.airline_controller = airline_controller
         self.flight_controller = flight_controller
+        # Storage shown by the performance line, and a callback that turns
+        # timings on when it is first shown; both set by main
+        self.json_db = None
+        self.enable_metrics = None
+        # Directory profiling reports are written to, set by main, and the
+        # profiler of the current or last window
+        self.profile_directory = None
+        self.profiler = None
         
         # Configure UI colours and fonts
         self.ui = ModernUI()
@@ -158,10 +188,23 @@ class RecordManagementGUI(tk.Tk):
         self.notebook.add(self.airline_frame, text="✈️ Airlines")
         self.notebook.add(self.flight_frame, text="🛫 Flights")
         
-        # Build tab contents
-        self.build_client_frame()
-        self.build_airline_frame()
-        self.build_flight_frame()
+        # Tabs are built when first selected, and records load on a worker
+        # thread and fill the tables in chunks, so the window is usable at
+        # once whatever the size of the data
+        self.tab_builders = {
+            str(self.client_frame): self.build_client_frame,
+            str(self.airline_frame): self.build_airline_frame,
+            str(self.flight_frame): self.build_flight_frame
+        }
+        self.tab_displays = {
+            str(self.client_frame): self.display_client_records,
+            str(self.airline_frame): self.display_airline_records,
+            str(self.flight_frame): self.display_flight_records
+        }
+        self.built_tabs = set()
+        self.load_tokens = {}
+        self.pending_inserts = {}
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Status bar at the bottom
         status_frame = ttk.Frame(self)
@@ -173,6 +216,176 @@ class RecordManagementGUI(tk.Tk):
         version_label = ttk.Label(status_frame, text="v1.0.0", font=self.small_font, 
                                  foreground=self.ui.TEXT_SECONDARY)
         version_label.pack(side="right")
+        # Performance line, shown next to the version while toggled on
+        self.hud_var = tk.StringVar()
+        self.hud_label = ttk.Label(status_frame, textvariable=self.hud_var, font=self.small_font,
+                                   foreground=self.ui.TEXT_SECONDARY)
+        self.hud_job = None
+        self.bind(HUD_KEY, self.toggle_hud)
+        self.bind(PROFILE_KEY, self.toggle_profiling)
+
+        self.build_tab(str(self.client_frame))
+
+    def build_tab(self, tab):
+        """Build the contents of a tab unless that has been done already."""
+        if tab not in self.built_tabs:
+            self.built_tabs.add(tab)
+            self.tab_builders[tab]()
+
+    def on_tab_changed(self, event):
+        """Build a tab, which loads its records, the first time it is selected."""
+        self.build_tab(self.notebook.select())
+
+    def load_in_background(self, name, fetch, display):
+        """Call fetch on a worker thread and pass its result to display on this one.
+
+        Only the latest load of each table is displayed; showing other records
+        in the table in the meantime (see begin_display) cancels it.
+        """
+        token = self.begin_display(name)
+        self.status_var.set(f"Loading {name} records...")
+        results = queue.Queue(maxsize=1)
+
+        def work():
+            # Loads made while a profiling window is open are part of it
+            profiling = self.profiler.thread() if self.profiler is not None else contextlib.nullcontext()
+            try:
+                with profiling:
+                    results.put(fetch())
+            except Exception as e:
+                results.put(e)
+
+        def poll():
+            if self.load_tokens.get(name) != token:
+                return
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                self.after(LOAD_POLL_MS, poll)
+                return
+            if isinstance(result, Exception):
+                self.status_var.set(f"Failed to load {name} records: {result}")
+            else:
+                display(result)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.after(LOAD_POLL_MS, poll)
+
+    def open_in_background(self, open_data, opened):
+        """Call open_data on a worker thread and pass its result to opened on this one.
+
+        open_data is called with a progress callback taking the bytes read and
+        the file size. It runs on the worker, so the latest progress is only
+        recorded there and shown in the status bar from this thread.
+        """
+        progress = [0, 0]
+        results = queue.Queue(maxsize=1)
+
+        def report(done, total):
+            progress[:] = [done, total]
+
+        def work():
+            profiling = self.profiler.thread() if self.profiler is not None else contextlib.nullcontext()
+            try:
+                with profiling:
+                    results.put(open_data(report))
+            except Exception as e:
+                results.put(e)
+
+        def poll():
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                if progress[1]:
+                    self.show_load_progress(*progress)
+                self.after(LOAD_POLL_MS, poll)
+                return
+            if isinstance(result, Exception):
+                self.status_var.set(f"Failed to load records: {result}")
+                messagebox.showerror("Error", f"An error occurred while loading the records: {result}")
+            else:
+                opened(result)
+
+        self.status_var.set("Loading records...")
+        threading.Thread(target=work, daemon=True).start()
+        self.after(LOAD_POLL_MS, poll)
+
+    def refresh_built_tabs(self):
+        """Load the records of every tab built so far in the background.
+
+        Tabs built before the controllers were set, such as those selected
+        while the data file was loading, are still empty until then.
+        """
+        for tab in self.built_tabs:
+            self.tab_displays[tab]()
+
+    def begin_display(self, name):
+        """Start showing new records in a table, superseding loads still in progress."""
+        self.load_tokens[name] = self.load_tokens.get(name, 0) + 1
+        return self.load_tokens[name]
+
+    def insert_rows(self, tree, rows):
+        """Replace the rows of tree, inserting INSERT_CHUNK rows per turn of the event loop."""
+        pending = self.pending_inserts.pop(str(tree), None)
+        if pending is not None:
+            self.after_cancel(pending)
+        began = time.perf_counter()
+        tree.delete(*tree.get_children())
+        # Time spent filling the table, not counting the event loop turns in between
+        rendering = [time.perf_counter() - began]
+
+        def insert(start):
+            began = time.perf_counter()
+            for values in rows[start:start + INSERT_CHUNK]:
+                tree.insert("", "end", values=values)
+            rendering[0] += time.perf_counter() - began
+            if start + INSERT_CHUNK < len(rows):
+                self.pending_inserts[str(tree)] = self.after(1, insert, start + INSERT_CHUNK)
+            else:
+                self.pending_inserts.pop(str(tree), None)
+                metrics.REGISTRY.observe(RENDER, rendering[0])
+
+        insert(0)
+
+    def toggle_hud(self, event=None):
+        """Show or hide the performance line, turning timings on the first time."""
+        if self.hud_job is not None:
+            self.after_cancel(self.hud_job)
+            self.hud_job = None
+            self.hud_label.pack_forget()
+            return
+        if not metrics.REGISTRY.enabled and self.enable_metrics is not None:
+            self.enable_metrics()
+        self.hud_label.pack(side="right", padx=(0, self.ui.PADDING_MEDIUM))
+        self.refresh_hud()
+
+    def refresh_hud(self):
+        """Update the performance line, then again every HUD_REFRESH_MS while it is shown."""
+        if self.json_db is not None:
+            self.hud_var.set(hud_text(self.json_db))
+        self.hud_job = self.after(HUD_REFRESH_MS, self.refresh_hud)
+
+    def toggle_profiling(self, event=None):
+        """Open a profiling window, or close it and show where the report was written."""
+        if self.profiler is not None and self.profiler.running:
+            self.status_var.set(f"Profile written to {self.profiler.stop()[1]}")
+            return
+        if self.profile_directory is None:
+            self.status_var.set("Profiling is not available")
+            return
+        self.profiler = Profiler(self.profile_directory, "gui")
+        self.profiler.start()
+        self.status_var.set("Profiling... press F9 again to stop and write the report")
+
+    def show_load_progress(self, done, total):
+        """Show how much of the data file has been loaded in the status bar."""
+        percent = done * 100 // total if total else 100
+        self.status_var.set(f"Loading records... {percent}%")
+
+    def show_conflict(self, record_type):
+        """Tell the user a record was changed by someone else before their edit."""
+        messagebox.showwarning("Conflict", f"This {record_type} record was changed by another user. "
+                                           "The list has been refreshed; please review and try again.")
 
     def create_form_entry(self, parent, label, row, column, span=1, required=False):
         """Create a labeled form entry field."""
@@ -218,6 +431,7 @@ class RecordManagementGUI(tk.Tk):
         form_frame.pack(fill="x", pady=(0, self.ui.PADDING_MEDIUM))
         
         self.client_entries = {}
+        self.client_versions = {}
         self.client_entries["ID"] = self.create_form_entry(form_frame, "ID", 0, 0, required=True)
         self.client_entries["Type"] = self.create_form_entry(form_frame, "Type", 1, 0)
         self.client_entries["Name"] = self.create_form_entry(form_frame, "Name", 2, 0, required=True)
@@ -312,8 +526,13 @@ class RecordManagementGUI(tk.Tk):
         # Get client ID
         client_id = client_data["ID"]
         
-        # Call controller
-        success = self.client_controller.update_client(client_id, client_data)
+        # Call controller with the version that was displayed
+        try:
+            success = self.client_controller.update_client(client_id, client_data, self.client_versions.get(client_id))
+        except ClientVersionConflictError:
+            self.show_conflict("client")
+            self.display_client_records()
+            return
         
         if success:
             messagebox.showinfo("Success", "Client record updated successfully.")
@@ -343,8 +562,13 @@ class RecordManagementGUI(tk.Tk):
         values = self.client_tree.item(item, "values")
         client_id = values[0]
         
-        # Call controller
-        success = self.client_controller.delete_client(client_id)
+        # Call controller with the version that was displayed
+        try:
+            success = self.client_controller.delete_client(client_id, self.client_versions.get(client_id))
+        except ClientVersionConflictError:
+            self.show_conflict("client")
+            self.display_client_records()
+            return
         
         if success:
             messagebox.showinfo("Success", "Client record deleted successfully.")
@@ -372,23 +596,28 @@ class RecordManagementGUI(tk.Tk):
         self.status_var.set(f"Found {len(results)} clients matching '{search_term}'")
     
     def display_client_records(self, clients=None):
-        """Display client records in the treeview."""
-        # Clear existing records
-        for item in self.client_tree.get_children():
-            self.client_tree.delete(item)
-            
+        """Display client records in the treeview, loading them in the background if not provided."""
+        if str(self.client_frame) not in self.built_tabs:
+            # Loaded when the tab is first selected
+            return
+
         # Get records from controller if not provided
         if clients is None and self.client_controller:
-            clients = self.client_controller.get_all_clients()
+            self.load_in_background("client", self.client_controller.get_all_clients, self.display_client_records)
+            return
+        self.begin_display("client")
             
         # If no controller and no clients provided, show sample data
         if clients is None:
             self.populate_sample_clients()
             return
             
-        # Display records
+        # Display records, remembering versions for conflict detection
+        self.client_versions = {}
+        rows = []
         for client in clients:
-            values = (
+            self.client_versions[client.get("ID", "")] = client.get(VERSION)
+            rows.append((
                 client.get("ID", ""),
                 client.get("Type", ""),
                 client.get("Name", ""),
@@ -397,8 +626,8 @@ class RecordManagementGUI(tk.Tk):
                 client.get("State", ""),
                 client.get("Country", ""),
                 client.get("Phone Number", "")
-            )
-            self.client_tree.insert("", "end", values=values)
+            ))
+        self.insert_rows(self.client_tree, rows)
             
         self.status_var.set(f"Displaying {len(clients)} client records")
     
@@ -455,6 +684,7 @@ class RecordManagementGUI(tk.Tk):
         form_frame.pack(fill="x", pady=(0, self.ui.PADDING_MEDIUM))
         
         self.airline_entries = {}
+        self.airline_versions = {}
         self.airline_entries["ID"] = self.create_form_entry(form_frame, "ID", 0, 0, required=True)
         self.airline_entries["Type"] = self.create_form_entry(form_frame, "Type", 1, 0)
         self.airline_entries["Company Name"] = self.create_form_entry(form_frame, "Company Name", 2, 0, required=True)
@@ -543,8 +773,13 @@ class RecordManagementGUI(tk.Tk):
         # Get airline ID
         airline_id = airline_data["ID"]
         
-        # Call controller
-        success = self.airline_controller.update_airline(airline_id, airline_data)
+        # Call controller with the version that was displayed
+        try:
+            success = self.airline_controller.update_airline(airline_id, airline_data, self.airline_versions.get(airline_id))
+        except AirlineVersionConflictError:
+            self.show_conflict("airline")
+            self.display_airline_records()
+            return
         
         if success:
             messagebox.showinfo("Success", "Airline record updated successfully.")
@@ -574,8 +809,13 @@ class RecordManagementGUI(tk.Tk):
         values = self.airline_tree.item(item, "values")
         airline_id = values[0]
         
-        # Call controller
-        success = self.airline_controller.delete_airline(airline_id)
+        # Call controller with the version that was displayed
+        try:
+            success = self.airline_controller.delete_airline(airline_id, self.airline_versions.get(airline_id))
+        except AirlineVersionConflictError:
+            self.show_conflict("airline")
+            self.display_airline_records()
+            return
         
         if success:
             messagebox.showinfo("Success", "Airline record deleted successfully.")
@@ -603,30 +843,35 @@ class RecordManagementGUI(tk.Tk):
         self.status_var.set(f"Found {len(results)} airlines matching '{search_term}'")
     
     def display_airline_records(self, airlines=None):
-        """Display airline records in the treeview."""
-        # Clear existing records
-        for item in self.airline_tree.get_children():
-            self.airline_tree.delete(item)
-            
+        """Display airline records in the treeview, loading them in the background if not provided."""
+        if str(self.airline_frame) not in self.built_tabs:
+            # Loaded when the tab is first selected
+            return
+
         # Get records from controller if not provided
         if airlines is None and self.airline_controller:
-            airlines = self.airline_controller.get_all_airlines()
+            self.load_in_background("airline", self.airline_controller.get_all_airlines, self.display_airline_records)
+            return
+        self.begin_display("airline")
             
         # If no controller and no airlines provided, show sample data
         if airlines is None:
             self.populate_sample_airlines()
             return
             
-        # Display records
+        # Display records, remembering versions for conflict detection
+        self.airline_versions = {}
+        rows = []
         for airline in airlines:
-            values = (
+            self.airline_versions[airline.get("ID", "")] = airline.get(VERSION)
+            rows.append((
                 airline.get("ID", ""),
                 airline.get("Type", ""),
                 airline.get("Company Name", ""),
                 airline.get("Country", ""),
                 airline.get("IATA Code", "")
-            )
-            self.airline_tree.insert("", "end", values=values)
+            ))
+        self.insert_rows(self.airline_tree, rows)
             
         self.status_var.set(f"Displaying {len(airlines)} airline records")
     
@@ -683,6 +928,7 @@ class RecordManagementGUI(tk.Tk):
         form_frame.pack(fill="x", pady=(0, self.ui.PADDING_MEDIUM))
         
         self.flight_entries = {}
+        self.flight_versions = {}
         self.flight_entries["Flight ID"] = self.create_form_entry(form_frame, "Flight ID", 0, 0, required=True)
         self.flight_entries["Client ID"] = self.create_form_entry(form_frame, "Client ID", 1, 0, required=True)
         self.flight_entries["Airline ID"] = self.create_form_entry(form_frame, "Airline ID", 2, 0, required=True)
@@ -773,8 +1019,13 @@ class RecordManagementGUI(tk.Tk):
         # Get flight ID
         flight_id = flight_data["Flight ID"]
         
-        # Call controller
-        success = self.flight_controller.update_flight(flight_id, flight_data)
+        # Call controller with the version that was displayed
+        try:
+            success = self.flight_controller.update_flight(flight_id, flight_data, self.flight_versions.get(flight_id))
+        except FlightVersionConflictError:
+            self.show_conflict("flight")
+            self.display_flight_records()
+            return
         
         if success:
             messagebox.showinfo("Success", "Flight record updated successfully.")
@@ -804,8 +1055,13 @@ class RecordManagementGUI(tk.Tk):
         values = self.flight_tree.item(item, "values")
         flight_id = values[0]
         
-        # Call controller
-        success = self.flight_controller.delete_flight(flight_id)
+        # Call controller with the version that was displayed
+        try:
+            success = self.flight_controller.delete_flight(flight_id, self.flight_versions.get(flight_id))
+        except FlightVersionConflictError:
+            self.show_conflict("flight")
+            self.display_flight_records()
+            return
         
         if success:
             messagebox.showinfo("Success", "Flight record deleted successfully.")
@@ -833,23 +1089,28 @@ class RecordManagementGUI(tk.Tk):
         self.status_var.set(f"Found {len(results)} flights matching '{search_term}'")
     
     def display_flight_records(self, flights=None):
-        """Display flight records in the treeview."""
-        # Clear existing records
-        for item in self.flight_tree.get_children():
-            self.flight_tree.delete(item)
-            
+        """Display flight records in the treeview, loading them in the background if not provided."""
+        if str(self.flight_frame) not in self.built_tabs:
+            # Loaded when the tab is first selected
+            return
+
         # Get records from controller if not provided
         if flights is None and self.flight_controller:
-            flights = self.flight_controller.get_all_flights()
+            self.load_in_background("flight", self.flight_controller.get_all_flights, self.display_flight_records)
+            return
+        self.begin_display("flight")
             
         # If no controller and no flights provided, show sample data
         if flights is None:
             self.populate_sample_flights()
             return
             
-        # Display records
+        # Display records, remembering versions for conflict detection
+        self.flight_versions = {}
+        rows = []
         for flight in flights:
-            values = (
+            self.flight_versions[flight.get("Flight ID", "")] = flight.get(VERSION)
+            rows.append((
                 flight.get("Flight ID", ""),
                 flight.get("Client ID", ""),
                 flight.get("Airline ID", ""),
@@ -857,8 +1118,8 @@ class RecordManagementGUI(tk.Tk):
                 flight.get("Departure", ""),
                 flight.get("Arrival", ""),
                 flight.get("Status", "")
-            )
-            self.flight_tree.insert("", "end", values=values)
+            ))
+        self.insert_rows(self.flight_tree, rows)
             
         self.status_var.set(f"Displaying {len(flights)} flight records")
     
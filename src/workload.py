@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Flight Record Management System
+Workload Recording and Replay
+
+Records the calls made to the controllers and replays them against any data
+file and storage codec, to measure engines against real traffic.
+
+A WorkloadRecorder attached to the controllers appends one line per call to a
+trace file: the time of the call, the resource, the operation, its arguments,
+its latency and an outcome (the result of a write, the number of records a
+query returned, or the exception it raised). The GUI records when
+FRMS_RECORD_WORKLOAD names a trace file, the API server with
+--record-workload. Each line is written with a single unbuffered append, so
+the workers of a server can share a trace and it survives the process being
+killed. A streamed listing (iter_flights etc.) is recorded as the search,
+find or get_all it stands for once it has been consumed, with the time spent
+producing its records as the latency.
+
+    python -m src.workload stats trace.ndjson
+    python -m src.workload replay trace.ndjson --data /tmp/copy.json --codec segment --speed 10
+
+Replay issues the calls in order, waiting to keep the recorded spacing
+divided by --speed (0 replays as fast as possible), and prints the latency
+percentiles of each operation. It changes the data file it is given, so
+replay against a copy.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from src.app import RESOURCES, Controllers, open_controllers
+
+TRACE_FORMAT = 1
+# Environment variable naming the trace file the GUI records to
+TRACE_ENV = "FRMS_RECORD_WORKLOAD"
+# Controller methods recorded, by name without the resource
+OPERATIONS = ["create", "update", "delete", "search", "find", "get_all", "get_by_id"]
+PERCENTILES = [50, 95, 99]
+
+
+def method_name(resource: str, operation: str) -> str:
+    """Return the controller method for an operation on a resource, e.g. search_flights."""
+    entity, plural = RESOURCES[resource].entity, RESOURCES[resource].plural
+    return {
+        "create": f"create_{entity}",
+        "update": f"update_{entity}",
+        "delete": f"delete_{entity}",
+        "search": f"search_{plural}",
+        "find": f"find_{plural}",
+        "get_all": f"get_all_{plural}",
+        "get_by_id": f"get_{entity}_by_id",
+    }[operation]
+
+
+def outcome(result: Any) -> Any:
+    """Summarise a controller result: record counts for lists, found or not for lookups."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return True
+    return result if isinstance(result, bool) else result is not None
+
+
+class WorkloadRecorder:
+    """Appends the controller calls of one process to a trace file."""
+
+    def __init__(self, path: str, data_file: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._write({"format": TRACE_FORMAT, "started": time.time(), "data_file": data_file, "pid": os.getpid()})
+
+    def attach(self, controllers: Controllers) -> Controllers:
+        """Wrap the recorded methods of every controller; returns controllers."""
+        for resource_name, resource in RESOURCES.items():
+            controller = getattr(controllers, resource.controller)
+            for operation in OPERATIONS:
+                name = method_name(resource_name, operation)
+                setattr(controller, name, self._wrap(resource_name, operation, getattr(controller, name)))
+            name = f"iter_{resource.plural}"
+            setattr(controller, name, self._wrap_iter(resource_name, getattr(controller, name)))
+        return controllers
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _wrap(self, resource: str, operation: str, method: Callable) -> Callable:
+        def recorded(*args, **kwargs):
+            called, start = time.time(), time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                self._event(called, start, resource, operation, args, kwargs, type(e).__name__)
+                raise
+            self._event(called, start, resource, operation, args, kwargs, outcome(result))
+            return result
+
+        recorded.__wrapped__ = method
+        return recorded
+
+    def _wrap_iter(self, resource: str, method: Callable) -> Callable:
+        def recorded(search_term: Optional[str] = None, field: Optional[str] = None, value: Any = None):
+            if search_term is not None:
+                operation, args = "search", (search_term,)
+            elif field is not None:
+                operation, args = "find", (field, value)
+            else:
+                operation, args = "get_all", ()
+            return self._iterate(resource, operation, args, method, (search_term, field, value))
+
+        recorded.__wrapped__ = method
+        return recorded
+
+    def _iterate(self, resource: str, operation: str, args: Tuple, method: Callable, method_args: Tuple) -> Iterator:
+        # Only the time spent in the controller counts, not the caller's work between records
+        called, elapsed, count, result = time.time(), 0.0, 0, None
+        try:
+            start = time.perf_counter()
+            try:
+                records = method(*method_args)
+            finally:
+                elapsed += time.perf_counter() - start
+            while True:
+                start = time.perf_counter()
+                try:
+                    record = next(records)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                count += 1
+                yield record
+            result = count
+        except Exception as e:
+            result = type(e).__name__
+            raise
+        finally:
+            # A listing abandoned part way, e.g. by a client disconnecting, records what it produced
+            self._event(called, time.perf_counter() - elapsed, resource, operation, args, {},
+                        count if result is None else result)
+
+    def _event(self, called: float, start: float, resource: str, operation: str, args: Tuple,
+               kwargs: Dict[str, Any], result: Any):
+        latency = round((time.perf_counter() - start) * 1000, 3)
+        # Keyword arguments are rare, so they only lengthen the lines that have them
+        self._write([round(called, 6), resource, operation, list(args), latency, result] + ([kwargs] if kwargs else []))
+
+    def _write(self, entry: Any):
+        line = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode()
+        with self._lock:
+            if self._fd is not None:
+                os.write(self._fd, line)
+
+
+def record_workload(controllers: Controllers, path: str) -> WorkloadRecorder:
+    """Start recording the calls made to controllers to the trace file at path."""
+    recorder = WorkloadRecorder(path, controllers.json_db.file_path)
+    recorder.attach(controllers)
+    return recorder
+
+
+def read_trace(file: TextIO) -> Iterator[List[Any]]:
+    """Yield the calls of a trace as [time, resource, operation, args, latency_ms, outcome, kwargs?]."""
+    for line in file:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        # Headers start each recording appended to the file
+        if isinstance(entry, list):
+            yield entry
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(len(ordered) * percent / 100), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies: Dict[str, List[float]], **extra: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Return the call count and latency percentiles in ms of each operation."""
+    summary = {}
+    for key in sorted(latencies):
+        ordered = sorted(latencies[key])
+        summary[key] = {"count": len(ordered), **{f"p{p}_ms": round(percentile(ordered, p), 3) for p in PERCENTILES},
+                        "max_ms": round(ordered[-1], 3) if ordered else 0.0}
+        for name, values in extra.items():
+            summary[key][name] = values.get(key, 0)
+    return summary
+
+
+def replay(calls: Iterator[List[Any]], controllers: Controllers, speed: float = 1.0,
+           sleep: Callable[[float], None] = time.sleep) -> Dict[str, Dict[str, Any]]:
+    """Issue the recorded calls against controllers and return the summary of their latencies.
+
+    Calls keep their recorded spacing divided by speed; with speed 0 each is
+    issued as soon as the previous one returns. Outcomes that differ from the
+    recording, e.g. a create failing because the record exists, are counted
+    as mismatches.
+    """
+    latencies: Dict[str, List[float]] = {}
+    mismatches: Dict[str, int] = {}
+    first_call = None
+    clock = time.perf_counter()
+    for call in calls:
+        called, resource, operation, args, _, recorded = call[:6]
+        if first_call is None:
+            first_call = called
+        if speed > 0:
+            delay = (called - first_call) / speed - (time.perf_counter() - clock)
+            if delay > 0:
+                sleep(delay)
+        method = getattr(getattr(controllers, RESOURCES[resource].controller), method_name(resource, operation))
+        start = time.perf_counter()
+        try:
+            result = outcome(method(*args, **(call[6] if len(call) > 6 else {})))
+        except Exception as e:
+            result = type(e).__name__
+        key = f"{resource}.{operation}"
+        latencies.setdefault(key, []).append((time.perf_counter() - start) * 1000)
+        if result != recorded:
+            mismatches[key] = mismatches.get(key, 0) + 1
+    return summarize(latencies, mismatches=mismatches)
+
+
+def trace_stats(calls: Iterator[List[Any]]) -> Dict[str, Dict[str, Any]]:
+    """Return the mix of a trace: calls, their share and recorded latency percentiles per operation."""
+    latencies: Dict[str, List[float]] = {}
+    for call in calls:
+        _, resource, operation, _, latency = call[:5]
+        latencies.setdefault(f"{resource}.{operation}", []).append(latency)
+    total = sum(len(values) for values in latencies.values())
+    shares = {key: round(len(values) / total, 4) for key, values in latencies.items()}
+    return summarize(latencies, share=shares)
+
+
+def print_summary(summary: Dict[str, Dict[str, Any]], out: TextIO):
+    columns = [column for column in next(iter(summary.values()), {}) if column != "count"]
+    print(f"{'operation':<24}{'count':>8}" + "".join(f"{column:>12}" for column in columns), file=out)
+    for key, row in summary.items():
+        print(f"{key:<24}{row['count']:>8}" + "".join(f"{row[column]:>12}" for column in columns), file=out)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and replay recorded controller workloads.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = commands.add_parser("stats", help="print the operation mix and recorded latencies of a trace")
+    stats_parser.add_argument("trace")
+    stats_parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+
+    replay_parser = commands.add_parser("replay", help="replay a trace against a data file")
+    replay_parser.add_argument("trace")
+    replay_parser.add_argument("--data", required=True, help="data file to replay against; it is changed")
+    replay_parser.add_argument("--codec", help="format to save the data file in, e.g. segment "
+                               "(default: keep its current format)")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="speed-up of the recorded timing, 0 for as fast as possible")
+    replay_parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    with open(args.trace, encoding="utf-8") as file:
+        if args.command == "stats":
+            summary = trace_stats(read_trace(file))
+        else:
+            summary = replay(read_trace(file), open_controllers(args.data, codec=args.codec), args.speed)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
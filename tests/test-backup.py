@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from pkg.backup import FULL, INCREMENTAL, BackupError, BackupStore
+from pkg.json_db import JsonFileDB, KeyNotFound
+
+
+class TestBackupStore(unittest.TestCase):
+    """Test case for hot full and incremental backups with point-in-time restore."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = JsonFileDB(os.path.join(self.temp_dir.name, "records.json"))
+        self.store = BackupStore(self.db, os.path.join(self.temp_dir.name, "backups"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_incremental_backups_hold_only_new_events(self):
+        """Test that increments start after the previous backup and are skipped when idle."""
+        self.db.set(["Client", "1"], {"ID": "1"})
+        self.assertEqual(self.store.incremental().kind, FULL)
+        self.db.set(["Client", "2"], {"ID": "2"})
+        self.db.delete(["Client", "1"])
+
+        backup = self.store.incremental()
+        self.assertEqual((backup.kind, backup.first_sequence, backup.last_sequence), (INCREMENTAL, 2, 3))
+        self.assertIsNone(self.store.incremental())
+        self.assertEqual([backup.kind for backup in self.store.list()], [FULL, INCREMENTAL])
+
+    def test_restore_to_sequence(self):
+        """Test restoring an earlier state from a full backup plus increments."""
+        self.db.set(["Client", "1"], {"ID": "1", "Name": "John"})
+        self.store.full()
+        self.db.set(["Client", "1"], {"ID": "1", "Name": "Jane"})
+        self.db.set(["Client", "2"], {"ID": "2"})
+        self.store.incremental()
+        self.db.delete(["Client", "2"])
+
+        self.assertEqual(self.store.restore(2), 2)
+        self.assertEqual(self.db.get(["Client", "1"])["Name"], "Jane")
+        with self.assertRaises(KeyNotFound):
+            self.db.get(["Client", "2"])
+
+        other = JsonFileDB(self.db.file_path)
+        self.db.set(["Client", "3"], {"ID": "3"})
+        self.assertEqual(other.get(["Client"]).keys(), {"1", "3"})
+        self.assertEqual([event.sequence for event in other.change_feed.read()], [1, 2, 3])
+
+    def test_restore_latest_replays_journal(self):
+        """Test that a restore without a sequence also replays the live journal."""
+        self.db.set(["Airline", "101"], {"ID": "101"})
+        self.store.full()
+        self.db.set(["Airline", "102"], {"ID": "102"})
+
+        self.assertEqual(self.store.restore(), 2)
+        self.assertEqual(self.db.get(["Airline"]).keys(), {"101", "102"})
+        with self.assertRaises(BackupError):
+            self.store.restore(10)
+
+    def test_restore_segment_backup(self):
+        """Test that events are replayed onto a full backup in the segment codec."""
+        db = JsonFileDB(os.path.join(self.temp_dir.name, "segment.json"), codec="segment")
+        store = BackupStore(db, os.path.join(self.temp_dir.name, "segment-backups"))
+        db.set(["Client", "1"], {"ID": "1", "Name": "John"})
+        store.full()
+        db.set(["Client", "1"], {"ID": "1", "Name": "Jane"})
+        db.set(["Client", "2"], {"ID": "2"})
+
+        self.assertEqual(store.restore(), 3)
+        self.assertEqual(db.get(["Client", "1"])["Name"], "Jane")
+        self.assertEqual(JsonFileDB(db.file_path).get(["Client"]).keys(), {"1", "2"})
+
+    def test_full_backup_is_consistent_during_writes(self):
+        """Test that a full backup taken while writing matches its sequence."""
+        for i in range(200):
+            self.db.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}"})
+        writer = threading.Thread(target=lambda: [
+            self.db.set(["Flight", f"G{i}"], {"Flight ID": f"G{i}"}) for i in range(100)
+        ])
+        writer.start()
+        backup = self.store.full()
+        writer.join()
+
+        self.assertEqual(self.store.restore(backup.last_sequence), backup.last_sequence)
+        self.assertEqual(len(self.db.get(["Flight"])), backup.last_sequence)
+
+
+if __name__ == '__main__':
+    unittest.main()
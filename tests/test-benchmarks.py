@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import compare, suite
+
+
+def run_results(create_ms, per_s, cpus=1):
+    return {"format": 1, "environment": {"python": "3.11", "cpus": cpus}, "results": [{
+        "backend": "pretty", "records": 1000, "metrics": {
+            "create_ms": {"unit": "ms", "better": "lower", "samples": create_ms},
+            "get_all_flights_per_s": {"unit": "records/s", "better": "higher", "samples": per_s}
+        }
+    }]}
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """Test case for the storage benchmark suite."""
+
+    def test_json_results(self):
+        """Test that a small run prints every metric with its samples and the environment."""
+        out = io.StringIO()
+        with mock.patch.object(sys, "stdout", out):
+            suite.main(["--backends", "pretty", "segment", "--records", "50", "--repeat", "2"])
+        results = json.loads(out.getvalue())
+        self.assertEqual(results["format"], suite.RESULTS_FORMAT)
+        self.assertIn("python", results["environment"])
+        self.assertEqual([(run["backend"], run["records"]) for run in results["results"]],
+                         [("pretty", 50), ("segment", 50)])
+        metrics = results["results"][0]["metrics"]
+        for name in ["file_bytes", "cold_startup_s", "cold_startup_writes_s", "startup_s", "startup_peak_bytes",
+                     "create_ms", "update_ms", "delete_ms", "search_london_ms", "get_all_flights_per_s"]:
+            self.assertIn(name, metrics)
+        self.assertEqual(len(metrics["create_ms"]["samples"]), 2)
+        self.assertEqual(metrics["get_all_flights_per_s"]["better"], "higher")
+
+
+class TestBaselineComparison(unittest.TestCase):
+    """Test case for the benchmark baseline store and regression check."""
+
+    def test_regressions_beyond_threshold_and_noise(self):
+        """Test that only slowdowns larger than the threshold and the spread of samples regress."""
+        baseline = run_results([10, 11, 10, 12, 10], [1000, 1100, 1050])
+        statuses = lambda current: {row.metric: row.status for row in compare.compare(baseline, current)}
+        self.assertEqual(statuses(run_results([20, 21, 22, 20, 21], [400, 450, 420])),
+                         {"create_ms": "regressed", "get_all_flights_per_s": "regressed"})
+        self.assertEqual(statuses(run_results([10, 30, 10, 11, 10], [1000, 1200, 2000])),
+                         {"create_ms": "unchanged", "get_all_flights_per_s": "unchanged"})
+        self.assertEqual(statuses(run_results([5, 5, 6], [1100, 1050, 1000])),
+                         {"create_ms": "improved", "get_all_flights_per_s": "unchanged"})
+        rows = compare.compare(baseline, run_results([20, 21, 22], [1000]), thresholds={"create_ms": 1.5})
+        self.assertEqual(rows[0].status, "unchanged")
+
+    def test_check_exit_status(self):
+        """Test that check exits non-zero on a regression and warns about a different environment."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = {}
+            for name, run in [("base", run_results([10, 10, 11], [1000])), ("slow", run_results([30, 31, 30], [990], cpus=8))]:
+                paths[name] = os.path.join(temp_dir, name + ".json")
+                with open(paths[name], 'w') as file:
+                    json.dump(run, file)
+            store = os.path.join(temp_dir, "baselines")
+            out, err = io.StringIO(), io.StringIO()
+            with mock.patch.object(sys, "stdout", out), mock.patch.object(sys, "stderr", err):
+                self.assertEqual(compare.main(["--store", store, "save", paths["base"], "--name", "main"]), 0)
+                self.assertEqual(compare.main(["--store", store, "check", paths["base"], "--baseline", "main"]), 0)
+                self.assertEqual(compare.main(["--store", store, "check", paths["slow"], "--baseline", "main"]), 1)
+                self.assertEqual(compare.main(["--store", store, "check", paths["base"], "--baseline", "nope"]), 2)
+            self.assertIn("cpus: 1 -> 8", err.getvalue())
+            self.assertEqual(compare.BaselineStore(store).names(), ["main"])
+
+    def test_merge_pools_samples(self):
+        """Test that results of separate runs are pooled per metric."""
+        merged = compare.merge_results([run_results([1, 2], [10]), run_results([3], [20])])
+        self.assertEqual(merged["results"][0]["metrics"]["create_ms"]["samples"], [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
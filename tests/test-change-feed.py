@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+from pkg.change_feed import COMPACTED, CREATE, DELETE, UPDATE, Cursor
+from pkg.index import NGRAM
+from pkg.json_db import JsonFileDB
+
+
+class TestChangeFeed(unittest.TestCase):
+    """Test case for the mutation change feed of JsonFileDB."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_subscriber_receives_typed_events(self):
+        """Test that create, update and delete are published with before and after images."""
+        db = JsonFileDB(self.file_path)
+        events = []
+        unsubscribe = db.change_feed.subscribe(events.append)
+
+        db.set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Pending"})
+        db.set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Confirmed"})
+        db.delete(["Flight", "F1"])
+        unsubscribe()
+        db.set(["Flight", "F2"], {"Flight ID": "F2"})
+
+        self.assertEqual([event.op for event in events], [CREATE, UPDATE, DELETE])
+        self.assertEqual([event.sequence for event in events], [1, 2, 3])
+        self.assertEqual(events[1].before["Status"], "Pending")
+        self.assertEqual(events[1].after["Status"], "Confirmed")
+        self.assertIsNone(events[2].after)
+        self.assertEqual((events[0].entity, events[0].record_id), ("Flight", "F1"))
+
+    def test_sequence_is_shared_between_instances(self):
+        """Test that two instances on one file produce a single sequence and see each other's events."""
+        first = JsonFileDB(self.file_path)
+        second = JsonFileDB(self.file_path)
+        seen = []
+        second.change_feed.subscribe(seen.append)
+
+        first.set(["Client", "1"], {"ID": "1"})
+        second.set(["Client", "2"], {"ID": "2"})
+
+        self.assertEqual([event.sequence for event in seen], [1, 2])
+        self.assertEqual([event.record_id for event in seen], ["1", "2"])
+        self.assertEqual(first.change_feed.last_sequence(), 2)
+
+    def test_batch_publishes_after_save(self):
+        """Test that a batch journals all of its events when it is saved."""
+        db = JsonFileDB(self.file_path)
+        with db.batch():
+            db.set(["Client", "1"], {"ID": "1"})
+            db.set(["Client", "2"], {"ID": "2"})
+            self.assertEqual(list(db.change_feed.read()), [])
+        self.assertEqual([event.sequence for event in db.change_feed.read()], [1, 2])
+
+    def test_cursor_resumes_after_commit(self):
+        """Test that a durable cursor resumes from the last committed sequence."""
+        db = JsonFileDB(self.file_path)
+        cursor_path = os.path.join(self.temp_dir.name, "consumer.cursor")
+        for i in range(3):
+            db.set(["Client", str(i)], {"ID": str(i)})
+
+        cursor = Cursor(db.change_feed, cursor_path)
+        events = cursor.poll()
+        self.assertEqual(len(events), 3)
+        cursor.commit(events[1].sequence)
+
+        db.set(["Client", "3"], {"ID": "3"})
+        resumed = Cursor(db.change_feed, cursor_path)
+        self.assertEqual([event.sequence for event in resumed.poll()], [3, 4])
+
+    def test_compaction_keeps_what_consumers_need(self):
+        """Test that compaction stops at the index checkpoint, cursors and retention, and offsets stay valid."""
+        db = JsonFileDB(self.file_path)
+        for i in range(1, 9):
+            db.set(["Client", str(i)], {"ID": str(i)})
+        db.open_indexes([("Client", NGRAM)])
+        for i in range(9, 13):
+            db.set(["Client", str(i)], {"ID": str(i)})
+        cursor = Cursor(db.change_feed, os.path.join(self.temp_dir.name, "consumer.cursor"))
+        cursor.poll()
+        cursor.commit(12)
+        other = JsonFileDB(self.file_path)
+        seen = []
+        other.change_feed.subscribe(seen.append)
+        size = db.change_feed.size()
+
+        self.assertEqual(db.compact_journal(retain=2, keep_after=[10]), 8)
+        self.assertEqual([event.sequence for event in db.change_feed.read()], [9, 10, 11, 12])
+        with open(db.change_feed.journal_path) as file:
+            self.assertIn(COMPACTED, file.readline())
+        self.assertEqual(db.change_feed.size(), size)
+
+        db.set(["Client", "13"], {"ID": "13"})
+        self.assertEqual([event.sequence for event in cursor.poll()], [13])
+        other.refresh()
+        self.assertEqual([event.sequence for event in seen], [13])
+        self.assertTrue(JsonFileDB(self.file_path).open_indexes([("Client", NGRAM)]))
+
+        self.assertEqual(db.compact_journal(retain=0), 5)
+        self.assertEqual(list(db.change_feed.read()), [])
+        db.set(["Client", "14"], {"ID": "14"})
+        self.assertEqual([event.sequence for event in db.change_feed.read()], [14])
+        self.assertEqual(db.change_feed.last_sequence(), 14)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from pkg.json_db import JsonFileDB
+from src import cli
+
+FLIGHT = {"Flight ID": "F1", "Client ID": "1", "Airline ID": "2", "Date": "2025-01-02",
+          "Departure": "London", "Arrival": "Paris", "Status": "Confirmed"}
+
+
+class TestCli(unittest.TestCase):
+    """Test case for the headless command line interface."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_cli(self, *args, stdin=""):
+        out = io.StringIO()
+        with mock.patch.object(sys, "stdout", out), mock.patch.object(sys, "stdin", io.StringIO(stdin)):
+            status = cli.main(["--data", self.file_path, *args])
+        return status, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_create_list_and_search(self):
+        """Test that records created from arguments are listed and found as NDJSON."""
+        status, results = self.run_cli("create", "flights", json.dumps(FLIGHT))
+        self.assertEqual((status, results), (0, [{"id": "F1", "ok": True}]))
+
+        _, records = self.run_cli("list", "flights", "--where", "Client ID=1")
+        self.assertEqual([record["Flight ID"] for record in records], ["F1"])
+        _, records = self.run_cli("search", "flights", "pari")
+        self.assertEqual([record["Flight ID"] for record in records], ["F1"])
+
+    def test_create_existing_id_fails(self):
+        """Test that creating an ID that already exists reports an error and keeps the stored record."""
+        self.run_cli("create", "flights", json.dumps(FLIGHT))
+        status, results = self.run_cli("create", "flights", json.dumps({**FLIGHT, "Client ID": "9"}))
+        self.assertEqual((status, results), (1, [{"id": "F1", "ok": False, "error": "flight F1 already exists"}]))
+        record = JsonFileDB(self.file_path).get(["Flight", "F1"])
+        self.assertEqual((record["Client ID"], record["_version"]), ("1", 1))
+
+    def test_stdin_writes_share_one_save(self):
+        """Test that NDJSON records from stdin are written in a single batch."""
+        lines = "".join(json.dumps({**FLIGHT, "Flight ID": f"F{i}"}) + "\n" for i in range(5))
+        status, results = self.run_cli("create", "flights", stdin=lines)
+        self.assertEqual(status, 0)
+        self.assertEqual(len(results), 5)
+        db = JsonFileDB(self.file_path)
+        self.assertEqual((db.generation, db.sequence), (1, 5))
+
+        status, results = self.run_cli("delete", "flights", stdin=json.dumps({"Flight ID": "F1", "_version": 7}) + "\n")
+        self.assertEqual(status, 1)
+        self.assertFalse(results[0]["ok"])
+
+    def test_bad_lines_fail_on_their_own(self):
+        """Test that lines that are not JSON or have fields of the wrong type fail without stopping the batch."""
+        lines = "".join([json.dumps({**FLIGHT, "Flight ID": "F1", "Date": 5}) + "\n", "not json\n",
+                         json.dumps({**FLIGHT, "Flight ID": "F2"}) + "\n"])
+        status, results = self.run_cli("create", "flights", stdin=lines)
+        self.assertEqual(status, 1)
+        self.assertEqual([(result["id"], result["ok"]) for result in results],
+                         [("F1", False), (None, False), ("F2", True)])
+        self.assertTrue(all(result["error"].startswith("invalid record: ") for result in results[:2]))
+
+        status, results = self.run_cli("update", "flights", "F2", "[1]")
+        self.assertEqual(status, 1)
+        self.assertFalse(results[0]["ok"])
+        self.assertEqual(list(JsonFileDB(self.file_path).data["Flight"]), ["F2"])
+
+    def test_import_export_round_trip(self):
+        """Test that an export imports into another file, reporting invalid records."""
+        self.run_cli("create", "flights", json.dumps(FLIGHT))
+        export_path = os.path.join(self.temp_dir.name, "flights.ndjson")
+        self.assertEqual(self.run_cli("export", "flights", export_path)[0], 0)
+        with open(export_path, 'a') as file:
+            file.write(json.dumps({"Flight ID": ""}) + "\n")
+
+        self.file_path = os.path.join(self.temp_dir.name, "other.json")
+        status, results = self.run_cli("import", "flights", export_path)
+        self.assertEqual(status, 1)
+        self.assertEqual(results[-1], {"imported": 1, "failed": 1})
+        _, stats = self.run_cli("stats")
+        self.assertEqual(stats[0]["records"], {"clients": 0, "airlines": 0, "flights": 1})
+
+    def test_compact_journal(self):
+        """Test that compact drops journal events beyond the retained ones."""
+        lines = "".join(json.dumps({**FLIGHT, "Flight ID": f"F{i}"}) + "\n" for i in range(5))
+        self.run_cli("create", "flights", stdin=lines)
+        status, results = self.run_cli("compact", "--retain", "2")
+        self.assertEqual(status, 0)
+        self.assertEqual(results[0]["dropped"], 3)
+        self.assertEqual([event.sequence for event in JsonFileDB(self.file_path).change_feed.read()], [4, 5])
+
+    def test_no_gui_or_asyncio_imports(self):
+        """Test that the CLI does not pay for importing tkinter, asyncio, the profilers or unused storage modules."""
+        code = ("import sys, src.cli; print(sorted({'tkinter', 'asyncio', 'cProfile', 'pstats', 'tracemalloc', "
+                "'gzip', 'lzma', 'pkg.backup'} & set(sys.modules)))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.stdout.strip(), "[]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import collections
+import os
+import tempfile
+import unittest
+
+from pkg.json_db import JsonFileDB
+from src.app import open_controllers
+from src.client.model import Client
+from src.dataset import DatasetGenerator, populate
+from src.flight.model import Flight
+
+
+class TestDatasetGenerator(unittest.TestCase):
+    """Test case for the synthetic dataset generator."""
+
+    def test_same_seed_same_data(self):
+        """Test that the output depends only on the seed, and streams do not affect each other."""
+        first = DatasetGenerator(seed=7)
+        second = DatasetGenerator(seed=7)
+        self.assertEqual(list(first.flights(50, 10, 5)), list(second.flights(50, 10, 5)))
+        self.assertEqual(list(first.clients(10)), list(second.clients(10)))
+        self.assertNotEqual(list(first.flights(50, 10, 5)), list(DatasetGenerator(seed=8).flights(50, 10, 5)))
+        self.assertEqual(list(first.clients(10)), list(first.clients(20))[:10])
+
+    def test_records_are_valid_and_skewed(self):
+        """Test that records pass model validation and a few clients book most flights."""
+        generator = DatasetGenerator()
+        for client in generator.clients(100):
+            self.assertEqual(Client.from_json(client.to_json()), client)
+        flights = list(generator.flights(5000, 100, 10))
+        for flight in flights:
+            self.assertEqual(Flight.from_json(flight.to_json()), flight)
+            self.assertNotEqual(flight.departure, flight.arrival)
+        bookings = collections.Counter(flight.client_id for flight in flights)
+        top_ten = sum(count for _, count in bookings.most_common(10))
+        self.assertGreater(top_ten, len(flights) / 2)
+        statuses = {flight.status for flight in flights if flight.date < generator.reference.isoformat()}
+        self.assertNotIn("Confirmed", statuses)
+
+    def test_populate_saves_once(self):
+        """Test that a generated dataset is written through the repositories in one batch."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "records.json")
+            controllers = open_controllers(file_path, indexes=False)
+            populate(controllers, clients=20, airlines=5, flights=200)
+            db = JsonFileDB(file_path)
+            self.assertEqual(db.generation, 1)
+            self.assertEqual({space: len(records) for space, records in db.data.items()},
+                             {"Client": 20, "Airline": 5, "Flight": 200})
+
+
+if __name__ == '__main__':
+    unittest.main()
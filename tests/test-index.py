@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pkg.index import NGRAM, NgramIndex
+from pkg.json_db import JsonFileDB
+from src.client.model import Client
+
+SPECS = [("Flight", "Client ID"), ("Flight", NGRAM)]
+
+
+class TestPersistentIndexes(unittest.TestCase):
+    """Test case for index files kept next to the data file."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+        self.db = JsonFileDB(self.file_path)
+        with self.db.batch():
+            for i in range(20):
+                self.db.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}", "Client ID": str(i % 3), "Status": "Confirmed"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_index_file_is_reused(self):
+        """Test that a second start loads the index file instead of building the indexes."""
+        self.assertFalse(self.db.open_indexes(SPECS))
+
+        reader = JsonFileDB(self.file_path)
+        with mock.patch.object(NgramIndex, "build", side_effect=AssertionError("rebuilt")):
+            self.assertTrue(reader.open_indexes(SPECS))
+        self.assertEqual({r["Flight ID"] for r in reader.find("Flight", "Client ID", "1")},
+                         {f"F{i}" for i in range(1, 20, 3)})
+        self.assertEqual([r["Flight ID"] for r in reader.search("Flight", "f13")], ["F13"])
+
+    def test_catches_up_from_journal_tail(self):
+        """Test that writes made after the file was saved are replayed from the journal."""
+        self.db.open_indexes(SPECS)
+        writer = JsonFileDB(self.file_path)
+        writer.set(["Flight", "F1"], {"Flight ID": "F1", "Client ID": "9", "Status": "Delayed"})
+        writer.delete(["Flight", "F2"])
+
+        reader = JsonFileDB(self.file_path)
+        self.assertTrue(reader.open_indexes(SPECS))
+        self.assertEqual([r["Flight ID"] for r in reader.find("Flight", "Client ID", "9")], ["F1"])
+        self.assertEqual([r["Flight ID"] for r in reader.search("Flight", "delay")], ["F1"])
+        self.assertEqual(reader.search("Flight", "F2"), [])
+
+        # The first instance catches up its own indexes on refresh
+        self.assertEqual([r["Flight ID"] for r in self.db.find("Flight", "Client ID", "9")], ["F1"])
+
+    def test_damaged_or_different_file_is_rebuilt(self):
+        """Test that a bad checksum or another set of indexes makes the indexes be built again."""
+        self.db.open_indexes(SPECS)
+        with open(self.db.index_path, 'r+b') as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b"\x00")
+        self.assertFalse(JsonFileDB(self.file_path).open_indexes(SPECS))
+        self.assertFalse(JsonFileDB(self.file_path).open_indexes(SPECS[:1]))
+
+    def test_swapped_data_file_is_reindexed(self):
+        """Test that an index file is not used for a data file swapped for another at the same sequence."""
+        self.db.open_indexes(SPECS)
+        other_path = os.path.join(self.temp_dir.name, "other.json")
+        other = JsonFileDB(other_path)
+        with other.batch():
+            for i in range(20):
+                other.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}", "Client ID": "7", "Status": "Confirmed"})
+        os.replace(other_path, self.file_path)
+
+        reader = JsonFileDB(self.file_path)
+        self.assertEqual((reader.generation, reader.sequence), (self.db.generation, self.db.sequence))
+        self.assertFalse(reader.open_indexes(SPECS))
+        self.assertEqual(len(reader.find("Flight", "Client ID", "7")), 20)
+        self.assertEqual(reader.find("Flight", "Client ID", "1"), [])
+        self.assertTrue(JsonFileDB(self.file_path).open_indexes(SPECS))
+
+    def test_search_matches_contains_term(self):
+        """Test that the n-gram index finds the same records as a scan with contains_term."""
+        clients = [
+            Client(client_id=str(i), client_type="Regular", name=name, address_line_1=f"{i} Main St",
+                   city="Springfield", state="IL", country="USA", phone=f"555-010{i}")
+            for i, name in enumerate(["Ann Lee", "Bob Stone", "Lee Ann Marsh", "Zoe"])
+        ]
+        for client in clients:
+            self.db.set(["Client", client.client_id], client.to_json())
+        self.db.add_index("Client", NGRAM)
+        for term in ["ann", "LEE", "e", "st", "010", "springfield", "x", "ee a"]:
+            with self.subTest(term=term):
+                expected = {client.client_id for client in clients if client.contains_term(term)}
+                self.assertEqual({r["ID"] for r in self.db.search("Client", term)}, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+
+from pkg import codec
+from pkg.json_db import JsonFileDB, KeyNotFound, VersionConflict
+from pkg.json_object import VERSION
+from pkg.segment import LazySpace, OverlaySpace
+
+
+def _write_records(file_path, prefix, count):
+    db = JsonFileDB(file_path)
+    for i in range(count):
+        db.set(["Client", f"{prefix}{i}"], {"ID": f"{prefix}{i}"})
+
+
+class TestJsonFileDB(unittest.TestCase):
+    """Test case for the JsonFileDB class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_set_and_get(self):
+        """Test that a value written can be read back after a reload."""
+        db = JsonFileDB(self.file_path)
+        db.set(["Client", "1"], {"ID": "1", "Name": "John Doe"})
+
+        reloaded = JsonFileDB(self.file_path)
+        self.assertEqual(reloaded.get(["Client", "1"])["Name"], "John Doe")
+
+    def test_delete_missing_raises(self):
+        """Test deleting a missing path raises KeyNotFound."""
+        db = JsonFileDB(self.file_path)
+        db.set(["Client", "1"], {"ID": "1"})
+        with self.assertRaises(KeyNotFound):
+            db.delete(["Client", "2"])
+
+    def test_load_legacy_file(self):
+        """Test loading a file written without the metadata header."""
+        with open(self.file_path, 'w') as f:
+            json.dump({"Client": {"1": {"ID": "1"}}, "Airline": {}, "Flight": {}}, f)
+
+        db = JsonFileDB(self.file_path)
+        self.assertEqual(db.get(["Client", "1"]), {"ID": "1"})
+        self.assertEqual(db.generation, 0)
+
+    def test_writes_from_other_instance_are_merged(self):
+        """Test that two instances on the same file do not lose each other's writes."""
+        first = JsonFileDB(self.file_path)
+        second = JsonFileDB(self.file_path)
+
+        first.set(["Client", "1"], {"ID": "1"})
+        second.set(["Flight", "F1"], {"Flight ID": "F1"})
+
+        self.assertEqual(second.get(["Client", "1"])["ID"], "1")
+        self.assertEqual(first.get(["Flight", "F1"])["Flight ID"], "F1")
+        with open(self.file_path) as f:
+            data = json.load(f)
+        self.assertIn("1", data["Client"])
+        self.assertIn("F1", data["Flight"])
+
+    def test_refresh_only_replaces_changed_space(self):
+        """Test that a reload keeps spaces that were not written elsewhere."""
+        first = JsonFileDB(self.file_path)
+        first.set(["Client", "1"], {"ID": "1"})
+        first.set(["Flight", "F1"], {"Flight ID": "F1"})
+        second = JsonFileDB(self.file_path)
+        clients = second.data["Client"]
+
+        first.set(["Flight", "F2"], {"Flight ID": "F2"})
+
+        self.assertTrue(second.refresh())
+        self.assertIs(second.data["Client"], clients)
+        self.assertIn("F2", second.data["Flight"])
+        self.assertFalse(second.refresh())
+
+    def test_codecs_round_trip_and_are_detected(self):
+        """Test that files saved with any codec load back, whatever the reader's codec."""
+        for codec in ["pretty", "minified", "keydict", "gzip", "lzma", "keydict+gzip", "segment"]:
+            with self.subTest(codec=codec):
+                os.makedirs(os.path.join(self.temp_dir.name, codec))
+                file_path = os.path.join(self.temp_dir.name, codec, "records.json")
+                db = JsonFileDB(file_path, codec=codec)
+                db.set(["Client", "1"], {"ID": "1", "Name": "John"})
+                db.set(["Client", "2"], {"ID": "2"})
+                db.set(["Airline", "101"], {"ID": "101", "Country": "UK"})
+
+                reader = JsonFileDB(file_path)
+                self.assertEqual({space: dict(records) for space, records in reader.data.items()}, db.data)
+                self.assertEqual(reader.sequence, 3)
+                self.assertEqual((reader.codec.encoding, reader.codec.compression),
+                                 (db.codec.encoding, db.codec.compression))
+
+    def test_save_keeps_the_format_of_the_file(self):
+        """Test that a write without a codec keeps a gzip file gzipped, and a codec converts it."""
+        JsonFileDB(self.file_path, codec="gzip").set(["Client", "1"], {"ID": "1"})
+        JsonFileDB(self.file_path).set(["Client", "2"], {"ID": "2"})
+        with open(self.file_path, 'rb') as file:
+            self.assertTrue(file.read().startswith(codec.GZIP_MAGIC))
+        self.assertEqual(JsonFileDB(self.file_path).get(["Client"]).keys(), {"1", "2"})
+
+        JsonFileDB(self.file_path, codec="pretty").set(["Client", "3"], {"ID": "3"})
+        self.assertEqual(codec.detect(self.file_path), "pretty")
+
+    def test_segment_records_are_decoded_lazily(self):
+        """Test that segment records are decoded on access and writes only hold changed records."""
+        db = JsonFileDB(self.file_path, codec="segment")
+        with db.batch():
+            for i in range(10):
+                db.set(["Client", str(i)], {"ID": str(i)})
+            db.set(["Airline", "101"], {"ID": "101"})
+
+        reader = JsonFileDB(self.file_path, codec="segment")
+        self.assertIsInstance(reader.data["Client"], LazySpace)
+        self.assertEqual(reader.get(["Client", "7"])["ID"], "7")
+        with reader.batch():
+            reader.set(["Client", "10"], {"ID": "10"})
+            reader.delete(["Client", "3"])
+            self.assertIsInstance(reader.data["Client"], OverlaySpace)
+            self.assertEqual(reader.data["Client"].changes.keys(), {"10"})
+            self.assertNotIn("3", reader.data["Client"])
+        # After the save the records are served from the new file again
+        self.assertIsInstance(reader.data["Client"], LazySpace)
+        self.assertIsInstance(reader.data["Airline"], LazySpace)
+
+        db.refresh()
+        self.assertEqual(sorted(db.get(["Client"]), key=int), [str(i) for i in range(11) if i != 3])
+        self.assertEqual(db.get(["Airline", "101"])["ID"], "101")
+
+    def test_versions_increment(self):
+        """Test that each write of a record bumps its version."""
+        db = JsonFileDB(self.file_path)
+        db.set(["Client", "1"], {"ID": "1"})
+        self.assertEqual(db.get(["Client", "1"])[VERSION], 1)
+        db.set(["Client", "1"], {"ID": "1", "Name": "Jane"}, expected_version=1)
+        self.assertEqual(db.get(["Client", "1"])[VERSION], 2)
+
+    def test_stale_version_is_rejected(self):
+        """Test that writes and deletes with a stale version raise VersionConflict."""
+        db = JsonFileDB(self.file_path)
+        db.set(["Client", "1"], {"ID": "1"})
+        db.set(["Client", "1"], {"ID": "1", "Name": "Jane"})
+
+        with self.assertRaises(VersionConflict):
+            db.set(["Client", "1"], {"ID": "1", "Name": "John"}, expected_version=1)
+        with self.assertRaises(VersionConflict):
+            db.delete(["Client", "1"], expected_version=1)
+        self.assertEqual(db.get(["Client", "1"])["Name"], "Jane")
+
+    def test_snapshot_is_isolated_from_writes(self):
+        """Test that a snapshot keeps its view while the database changes."""
+        db = JsonFileDB(self.file_path)
+        db.set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Pending"})
+        snapshot = db.snapshot()
+
+        db.set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Confirmed"})
+        db.set(["Flight", "F2"], {"Flight ID": "F2"})
+        db.delete(["Flight", "F1"])
+
+        self.assertEqual(snapshot.get(["Flight", "F1"])["Status"], "Pending")
+        self.assertNotIn("F2", snapshot.get(["Flight"]))
+        self.assertEqual(list(db.get(["Flight"])), ["F2"])
+
+    def test_scan_snapshot_during_writes(self):
+        """Test iterating a snapshot while another thread keeps writing."""
+        db = JsonFileDB(self.file_path)
+        for i in range(100):
+            db.set(["Flight", str(i)], {"Flight ID": str(i)})
+        stop = threading.Event()
+
+        def writer():
+            i = 100
+            while not stop.is_set():
+                db.set(["Flight", str(i)], {"Flight ID": str(i)})
+                i += 1
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for _ in range(20):
+                flights = db.snapshot().get(["Flight"])
+                count = len(flights)
+                self.assertEqual(len([f for f in flights.values()]), count)
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_concurrent_processes(self):
+        """Test that writers in several processes do not clobber each other."""
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=_write_records, args=(self.file_path, f"{n}-", 10))
+            for n in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        db = JsonFileDB(self.file_path)
+        self.assertEqual(len(db.get(["Client"])), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
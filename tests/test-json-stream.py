@@ -0,0 +1,57 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pkg import codec
+from pkg.json_db import JsonFileDB
+from pkg.json_stream import StreamReader
+
+
+class TestStreamReader(unittest.TestCase):
+    """Test case for the incremental JSON loader."""
+
+    DOCUMENT = {
+        "_meta": {"generation": 3, "sequence": 12, "spaces": {"Client": 2}},
+        "Client": {
+            str(i): {"ID": str(i), "Name": f"Client \"{i}\"", "Score": i * 1234567, "Tags": ["a", None, True]}
+            for i in range(50)
+        },
+        "Esc\"aped": {"k\\ey": 1.5, "plain": {"nested": {"deep": [1, 2, 3]}}},
+        "Empty": {},
+        "Scalar": 42
+    }
+
+    def test_matches_json_load_for_any_chunk_size(self):
+        """Test that records cut at every possible chunk boundary are parsed correctly."""
+        for text in [json.dumps(self.DOCUMENT, indent=4), json.dumps(self.DOCUMENT, separators=(",", ":"))]:
+            for chunk_size in [1, 3, 16, 1024]:
+                with self.subTest(chunk_size=chunk_size):
+                    reader = StreamReader(io.StringIO(text), chunk_size=chunk_size)
+                    self.assertEqual(reader.document(lambda key: 1), self.DOCUMENT)
+
+    def test_large_files_are_streamed_with_progress(self):
+        """Test that files above the threshold load through the stream with progress reports."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ["pretty", "keydict+gzip"]:
+                file_path = os.path.join(temp_dir, f"{name}.json")
+                db = JsonFileDB(file_path, codec=name)
+                with db.batch():
+                    for i in range(200):
+                        db.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}", "Status": "Confirmed"})
+
+                progress = []
+                with mock.patch.object(codec, "STREAM_THRESHOLD", 0), \
+                        mock.patch("pkg.json_stream.CHUNK_SIZE", 512):
+                    reader = JsonFileDB(file_path, progress=lambda done, total: progress.append((done, total)))
+                self.assertEqual(reader.data, db.data)
+                self.assertEqual(reader.sequence, 200)
+                size = os.path.getsize(file_path)
+                self.assertEqual(progress[-1], (size, size))
+                self.assertEqual(progress, sorted(progress))
+
+
+if __name__ == '__main__':
+    unittest.main()
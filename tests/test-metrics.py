@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from pkg import metrics
+from pkg.metrics import Histogram, MetricsRegistry
+from src.app import instrument_controllers, open_controllers
+from src.workload import record_workload
+
+FLIGHT = {"Flight ID": "F1", "Client ID": "1", "Airline ID": "2", "Date": "2025-01-02",
+          "Departure": "London", "Arrival": "Paris", "Status": "Confirmed"}
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test case for latency histograms and counters."""
+
+    def test_histogram_percentiles(self):
+        """Test that percentiles are interpolated within the bucket holding them."""
+        histogram = Histogram()
+        for i in range(1, 101):
+            histogram.observe(i / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.05, delta=0.01)
+        self.assertAlmostEqual(histogram.quantile(0.99), 0.099, delta=0.005)
+        self.assertLessEqual(histogram.quantile(1.0), histogram.max)
+
+    def test_disabled_registry_wraps_nothing(self):
+        """Test that a disabled registry leaves objects alone and records nothing."""
+        registry = MetricsRegistry()
+        obj = MetricsRegistry()
+        self.assertIs(registry.instrument(obj, "obj"), obj)
+        self.assertNotIn("snapshot", vars(obj))
+        with registry.timer("block"):
+            registry.add("bytes", 10)
+        self.assertEqual(registry.snapshot(), {"latency": {}, "counters": {}})
+
+    def test_json_and_prometheus(self):
+        """Test that timings and counters are exported in both formats."""
+        registry = MetricsRegistry(enabled=True)
+        with registry.timer("json_db.save"):
+            pass
+        registry.add("json_db.bytes_written", 512)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["latency"]["json_db.save"]["count"], 1)
+        self.assertEqual(snapshot["counters"], {"json_db.bytes_written": 512})
+        text = registry.to_prometheus()
+        self.assertIn('frms_operation_duration_seconds_count{operation="json_db.save"} 1', text)
+        self.assertIn('frms_operation_duration_seconds_bucket{operation="json_db.save",le="+Inf"} 1', text)
+        self.assertIn("frms_json_db_bytes_written_total 512", text)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test case for the instrumentation of the storage, repository and controller layers."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        metrics.REGISTRY.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.REGISTRY.reset()
+        self.temp_dir.cleanup()
+
+    def test_layers_are_timed(self):
+        """Test that controller, repository and storage calls and bytes written are recorded."""
+        controllers = open_controllers(os.path.join(self.temp_dir.name, "records.json"), indexes=False)
+        controllers.flight_controller.create_flight(FLIGHT)
+        controllers.flight_controller.get_all_flights()
+        snapshot = metrics.REGISTRY.snapshot()
+        for name in ["flight_controller.create_flight", "flight_repository.create_flight",
+                     "flight_controller.get_all_flights", "json_db.save", "json_db.encode", "json_db.write"]:
+            self.assertEqual(snapshot["latency"][name]["count"], 1, name)
+        self.assertGreater(snapshot["counters"]["json_db.bytes_written"], 0)
+        self.assertEqual(snapshot["counters"]["flight_repository.records_scanned"], 1)
+
+        path = os.path.join(self.temp_dir.name, "metrics.prom")
+        metrics.REGISTRY.dump(path)
+        with open(path) as file:
+            self.assertIn("flight_controller.create_flight", file.read())
+
+    def test_instrumenting_twice_times_once(self):
+        """Test that instrumenting controllers again, e.g. when the HUD turns timings on, counts each call once."""
+        controllers = open_controllers(os.path.join(self.temp_dir.name, "records.json"), indexes=False)
+        record_workload(controllers, os.path.join(self.temp_dir.name, "trace.ndjson")).close()
+        instrument_controllers(controllers)
+        controllers.flight_controller.get_all_flights()
+        latency = metrics.REGISTRY.snapshot()["latency"]
+        self.assertEqual(latency["flight_controller.get_all_flights"]["count"], 1)
+        self.assertEqual(latency["flight_repository.get_flights"]["count"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
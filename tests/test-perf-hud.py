@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from pkg import metrics
+from pkg.metrics import MetricsRegistry
+from src.app import open_controllers
+from src.perf_hud import RENDER, hud_text, last_operation
+
+FLIGHT = {"Flight ID": "F1", "Client ID": "1", "Airline ID": "2", "Date": "2025-01-02",
+          "Departure": "London", "Arrival": "Paris", "Status": "Confirmed"}
+
+
+class TestPerformanceHud(unittest.TestCase):
+    """Test case for the performance line of the status bar."""
+
+    def test_breakdown_of_last_operation(self):
+        """Test that repository time inside the last controller call counts as storage."""
+        observations = [
+            ("client_controller.get_all_clients", 1.0, 0.5),
+            ("flight_repository.search_flights", 10.03, 0.02),
+            ("json_db.refresh", 10.035, 0.001),
+            ("flight_controller.search_flights", 10.05, 0.05),
+            (RENDER, 10.2, 0.01),
+            (RENDER, 10.3, 0.5),
+        ]
+        operation = last_operation(observations)
+        self.assertEqual(operation.name, "search_flights")
+        self.assertAlmostEqual(operation.storage, 0.02)
+        self.assertAlmostEqual(operation.controller, 0.03)
+        self.assertEqual(operation.render, 0.01)
+        self.assertIsNone(last_operation([(RENDER, 1.0, 0.1)]))
+
+    def test_hud_text(self):
+        """Test that the line shows the last operation, file size and record counts."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            controllers = open_controllers(os.path.join(temp_dir, "records.json"), indexes=False)
+            self.assertIn("Timings off", hud_text(controllers.json_db, MetricsRegistry()))
+            metrics.REGISTRY.reset()
+            metrics.enable()
+            try:
+                controllers = open_controllers(os.path.join(temp_dir, "records.json"), indexes=False)
+                controllers.flight_controller.create_flight(FLIGHT)
+                text = hud_text(controllers.json_db)
+            finally:
+                metrics.disable()
+                metrics.REGISTRY.reset()
+        self.assertTrue(text.startswith("Last: create_flight "), text)
+        self.assertIn("0 clients, 0 airlines, 1 flights", text)
+        self.assertIn(" B |", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import glob
+import io
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pkg.profiling import Profiler, profile_call
+from src import cli
+
+
+def allocate():
+    return [str(i) * 10 for i in range(20000)]
+
+
+class TestProfiler(unittest.TestCase):
+    """Test case for on-demand profiling reports."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_profile_call_writes_reports(self):
+        """Test that a call leaves a loadable pstats file and a report of functions and allocations."""
+        result, (stats_path, report_path) = profile_call(self.temp_dir.name, "one call", allocate)
+        self.assertEqual(len(result), 20000)
+        self.assertTrue(os.path.basename(stats_path).endswith("-one-call.pstats"), stats_path)
+        functions = {name for _, _, name in pstats.Stats(stats_path).stats}
+        self.assertIn("allocate", functions)
+        with open(report_path) as file:
+            report = file.read()
+        self.assertIn("functions by cumulative time", report)
+        self.assertIn("allocation sites", report)
+        self.assertIn("test-profiling.py", report)
+
+    def test_thread_blocks_join_the_window(self):
+        """Test that worker threads are profiled only while the window is open."""
+        profiler = Profiler(self.temp_dir.name)
+
+        def work():
+            with profiler.thread():
+                allocate()
+
+        with profiler.thread():
+            pass
+        with profiler:
+            worker = threading.Thread(target=work)
+            worker.start()
+            worker.join()
+        self.assertFalse(profiler.running)
+        stats_path, report_path = profiler.report_paths
+        self.assertIn("allocate", {name for _, _, name in pstats.Stats(stats_path).stats})
+        with open(report_path) as file:
+            self.assertIn("1 other thread block(s)", file.readline())
+        with self.assertRaises(RuntimeError):
+            profiler.stop()
+
+    def test_cli_profile_flag(self):
+        """Test that --profile writes the reports next to the data file."""
+        data_path = os.path.join(self.temp_dir.name, "records.json")
+        stderr = io.StringIO()
+        with mock.patch("sys.stdout", io.StringIO()), mock.patch("sys.stderr", stderr):
+            self.assertEqual(cli.main(["--data", data_path, "--profile", "list", "flights"]), 0)
+        reports = glob.glob(os.path.join(self.temp_dir.name, "profile-*-cli-list.txt"))
+        self.assertEqual(len(reports), 1)
+        self.assertIn(reports[0], stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from pkg.json_db import JsonFileDB
+from pkg.record_cache import RecordCache
+
+
+class TestRecordCache(unittest.TestCase):
+    """Test case for the bounded LRU cache of decoded records."""
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the cache stays within its budget and evicts the coldest entry."""
+        cache = RecordCache(max_bytes=30)
+        cache.put("a", {"n": 1}, 10)
+        cache.put("b", {"n": 2}, 10)
+        cache.put("c", {"n": 3}, 10)
+        self.assertEqual(cache.get("a"), {"n": 1})
+        cache.put("d", {"n": 4}, 10)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"n": 1})
+        self.assertEqual(cache.stats()["bytes"], 30)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 1, 1))
+
+    def test_segment_reads_go_through_the_cache(self):
+        """Test that records of a segment file are decoded once while they stay hot."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "records.json")
+            db = JsonFileDB(file_path, codec="segment")
+            with db.batch():
+                for i in range(100):
+                    db.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}", "Status": "Confirmed"})
+
+            reader = JsonFileDB(file_path, cache_bytes=2000)
+            for _ in range(3):
+                self.assertEqual(reader.get(["Flight", "F1"])["Flight ID"], "F1")
+            self.assertEqual((reader.cache.hits, reader.cache.misses), (2, 1))
+
+            self.assertEqual(len(list(reader.get(["Flight"]).values())), 100)
+            stats = reader.cache.stats()
+            self.assertGreater(stats["evictions"], 0)
+            self.assertLessEqual(stats["bytes"], 2000)
+
+    def test_cached_records_survive_unrelated_saves(self):
+        """Test that a save keeps the cached records of the spaces it did not write, and only those."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db = JsonFileDB(os.path.join(temp_dir, "records.json"), codec="segment")
+            with db.batch():
+                db.set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Confirmed"})
+                db.set(["Client", "1"], {"ID": "1", "Name": "Ada"})
+            db.get(["Flight", "F1"])
+            db.get(["Client", "1"])
+
+            db.set(["Client", "1"], {"ID": "1", "Name": "Grace"})
+            hits = db.cache.hits
+            self.assertEqual(db.get(["Flight", "F1"])["Status"], "Confirmed")
+            self.assertEqual(db.cache.hits, hits + 1)
+            self.assertEqual(db.get(["Client", "1"])["Name"], "Grace")
+            self.assertEqual(db.cache.hits, hits + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from pkg.json_db import JsonFileDB
+from pkg.replica import ReadOnlyError, ReplicaDB
+from src.app import open_controllers
+from src.server import ApiServer
+
+
+class TestReplicaDB(unittest.TestCase):
+    """Test case for the journal-tailing read replica."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+        self.primary = JsonFileDB(self.file_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_replica_follows_primary_writes(self):
+        """Test that the replica applies creates, updates and deletes from the journal."""
+        self.primary.set(["Flight", "F1"], {"Flight ID": "F1", "Client ID": "1"})
+        replica = ReplicaDB(self.file_path)
+        self.primary.set(["Flight", "F2"], {"Flight ID": "F2", "Client ID": "1"})
+        self.primary.set(["Flight", "F1"], {"Flight ID": "F1", "Client ID": "2"})
+        self.primary.delete(["Flight", "F2"])
+
+        self.assertEqual(replica.get(["Flight"]).keys(), {"F1"})
+        self.assertEqual(replica.get(["Flight", "F1"])["Client ID"], "2")
+        self.assertEqual(replica.sequence, self.primary.sequence)
+
+    def test_indexes_and_lag(self):
+        """Test that indexed lookups see new events and lag counts unapplied ones."""
+        replica = ReplicaDB(self.file_path)
+        replica.add_index("Flight", "Client ID")
+        for i in range(5):
+            self.primary.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}", "Client ID": str(i % 2)})
+
+        self.assertEqual(replica.lag()["events_behind"], 5)
+        self.assertGreaterEqual(replica.lag()["seconds_behind"], 0)
+        found = replica.find("Flight", "Client ID", "1")
+        self.assertEqual(sorted(record["Flight ID"] for record in found), ["F1", "F3"])
+        self.assertEqual(replica.lag()["events_behind"], 0)
+        self.assertEqual(replica.lag()["seconds_behind"], 0.0)
+
+    def test_rewritten_journal_resyncs(self):
+        """Test that the replica reloads the data file when the journal shrinks."""
+        replica = ReplicaDB(self.file_path)
+        self.primary.set(["Client", "1"], {"ID": "1"})
+        self.primary.set(["Client", "2"], {"ID": "2"})
+        replica.refresh()
+        os.truncate(self.primary.change_feed.journal_path, 0)
+        self.primary.set(["Client", "3"], {"ID": "3"})
+
+        self.assertEqual(replica.get(["Client"]).keys(), {"1", "2", "3"})
+
+    def test_writes_are_rejected(self):
+        """Test that a replica cannot be written to."""
+        replica = ReplicaDB(self.file_path)
+        with self.assertRaises(ReadOnlyError):
+            replica.set(["Client", "1"], {"ID": "1"})
+        with self.assertRaises(ReadOnlyError):
+            replica.delete(["Client", "1"])
+
+
+class TestReplicaServer(unittest.TestCase):
+    """Test case for the API server in read-only replica mode."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        data_file = os.path.join(self.temp_dir.name, "records.json")
+        self.primary = open_controllers(data_file)
+        self.server = ApiServer(("127.0.0.1", 0), open_controllers(data_file, replica=True))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1])
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def request(self, method, path, body=None):
+        self.connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = self.connection.getresponse()
+        data = response.read()
+        return response, json.loads(data) if data else None
+
+    def test_replica_serves_reads_only(self):
+        """Test that the replica answers filtered queries and refuses writes."""
+        for i in range(4):
+            self.primary.flight_controller.create_flight({
+                "Flight ID": f"F{i}", "Client ID": str(i % 2), "Airline ID": "101", "Date": "2025-03-05",
+                "Departure": "London", "Arrival": "Paris"
+            })
+
+        response, flights = self.request("GET", "/flights?Client%20ID=1")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(sorted(flight["Flight ID"] for flight in flights), ["F1", "F3"])
+        self.assertEqual(response.getheader("X-Replication-Sequence"), "4")
+
+        response, lag = self.request("GET", "/_replication")
+        self.assertEqual((lag["sequence"], lag["events_behind"]), (4, 0))
+
+        response, _ = self.request("POST", "/clients", {"ID": "1"})
+        self.assertEqual(response.status, 405)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from pkg.json_db import JsonFileDB
+from src.app import open_async_controllers
+from src.flight.controller import FlightController
+from src.flight.repository import FlightVersionConflictError
+from src.flight.repository_json import FlightRepositoryJson
+
+
+class TestFlightRepositoryJson(unittest.TestCase):
+    """Test case for the FlightRepositoryJson class and its controller."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.json_db = JsonFileDB(os.path.join(self.temp_dir.name, "records.json"))
+        self.controller = FlightController(FlightRepositoryJson(self.json_db))
+        self.flight_data = {
+            "Flight ID": "F001",
+            "Client ID": "1",
+            "Airline ID": "101",
+            "Date": "2025-03-05",
+            "Departure": "London",
+            "Arrival": "Paris",
+            "Status": "Confirmed"
+        }
+        self.controller.create_flight(self.flight_data)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_update_with_current_version(self):
+        """Test updating a flight with the version that was read."""
+        flight = self.controller.get_flight_by_id("F001")
+        self.assertTrue(self.controller.update_flight("F001", {"Flight ID": "F001", "Status": "Cancelled"},
+                                                      flight["_version"]))
+        self.assertEqual(self.controller.get_flight_by_id("F001")["Status"], "Cancelled")
+
+    def test_update_with_stale_version_raises(self):
+        """Test that a concurrent edit surfaces as a conflict through the controller."""
+        version = self.controller.get_flight_by_id("F001")["_version"]
+        self.controller.update_flight("F001", {"Flight ID": "F001", "Status": "Delayed"})
+
+        with self.assertRaises(FlightVersionConflictError):
+            self.controller.update_flight("F001", {"Flight ID": "F001", "Status": "Cancelled"}, version)
+        with self.assertRaises(FlightVersionConflictError):
+            self.controller.delete_flight("F001", version)
+        self.assertEqual(self.controller.get_flight_by_id("F001")["Status"], "Delayed")
+
+    def test_unversioned_update_still_succeeds(self):
+        """Test that callers that do not pass a version keep last-writer-wins behaviour."""
+        self.assertTrue(self.controller.update_flight("F001", {"Flight ID": "F001", "Status": "Delayed"}))
+        self.assertTrue(self.controller.delete_flight("F001"))
+        self.assertIsNone(self.controller.get_flight_by_id("F001"))
+
+
+
+class TestAsyncControllers(unittest.TestCase):
+    """Test case for the asyncio repositories and controllers."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.controllers = open_async_controllers(os.path.join(self.temp_dir.name, "records.json"))
+
+    def tearDown(self):
+        self.controllers.json_db.close()
+        self.temp_dir.cleanup()
+
+    def test_concurrent_creates_share_saves(self):
+        """Test that many concurrent writes are committed in a few batched saves."""
+        controller = self.controllers.client_controller
+
+        async def scenario():
+            results = await asyncio.gather(*[
+                controller.create_client({"ID": str(i), "Name": f"Client {i}"}) for i in range(200)
+            ])
+            return results, await controller.get_all_clients()
+
+        results, clients = asyncio.run(scenario())
+        self.assertTrue(all(results))
+        self.assertEqual(len(clients), 200)
+        self.assertLess(self.controllers.json_db.json_db.generation, 10)
+
+    def test_conflict_and_missing_record(self):
+        """Test that conflicts and failures surface per request inside a batch."""
+        controller = self.controllers.flight_controller
+        flight = {"Flight ID": "F1", "Client ID": "1", "Airline ID": "101", "Date": "2025-03-05",
+                  "Departure": "London", "Arrival": "Paris"}
+
+        async def scenario():
+            await controller.create_flight(flight)
+            updated, missing = await asyncio.gather(
+                controller.update_flight("F1", {"Flight ID": "F1", "Status": "Delayed"}, 1),
+                controller.delete_flight("F2")
+            )
+            with self.assertRaises(FlightVersionConflictError):
+                await controller.update_flight("F1", {"Flight ID": "F1", "Status": "Cancelled"}, 1)
+            return updated, missing, await controller.get_flight_by_id("F1")
+
+        updated, missing, stored = asyncio.run(scenario())
+        self.assertTrue(updated)
+        self.assertFalse(missing)
+        self.assertEqual(stored["Status"], "Delayed")
+
+    def test_search_and_find_use_the_indexes(self):
+        """Test that async search and find answer from the indexes without listing every record."""
+        controller = self.controllers.flight_controller
+        flights = [{"Flight ID": f"F{i}", "Client ID": str(i % 2), "Airline ID": "101", "Date": "2025-03-05",
+                    "Departure": "London", "Arrival": "Paris" if i else "Oslo"} for i in range(4)]
+
+        async def scenario():
+            await asyncio.gather(*[controller.create_flight(flight) for flight in flights])
+            with mock.patch.object(FlightRepositoryJson, "get_flights", side_effect=AssertionError("scanned")):
+                return await controller.search_flights("oslo"), await controller.find_flights("Client ID", "1")
+
+        found, clients = asyncio.run(scenario())
+        self.assertEqual([flight["Flight ID"] for flight in found], ["F0"])
+        self.assertEqual(sorted(flight["Flight ID"] for flight in clients), ["F1", "F3"])
+
+    def test_reads_do_not_block_the_loop(self):
+        """Test that a read waiting for the lock held by a save leaves the event loop running."""
+        json_db = self.controllers.json_db
+        held, release = threading.Event(), threading.Event()
+
+        def save():
+            with json_db.json_db.lock.exclusive():
+                held.set()
+                release.wait(2)
+
+        async def scenario():
+            saver = threading.Thread(target=save)
+            saver.start()
+            held.wait(5)
+            # The file looks unchanged to the first check and changed after,
+            # as when a save replaces it in between
+            changed = itertools.chain([False], itertools.repeat(True))
+            with mock.patch.object(json_db.json_db, "changed", side_effect=changed):
+                read = asyncio.ensure_future(self.controllers.client_controller.get_client_by_id("1"))
+                start = time.perf_counter()
+                await asyncio.sleep(0.05)
+                elapsed = time.perf_counter() - start
+                release.set()
+                result = await read
+            self.assertLess(elapsed, 1)
+            saver.join()
+            return result
+
+        self.assertIsNone(asyncio.run(scenario()))
+
+
+if __name__ == '__main__':
+    unittest.main()
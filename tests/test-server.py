@@ -0,0 +1,233 @@
+import glob
+import http.client
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pkg import metrics
+from src.app import open_controllers
+from src.flight import controller as flight_controller
+from src.server import STREAM_BATCH_SIZE, ApiRequestHandler, ApiServer
+
+
+class TestApiServer(unittest.TestCase):
+    """Test case for the headless HTTP/JSON API server."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        controllers = open_controllers(os.path.join(self.temp_dir.name, "records.json"))
+        self.server = ApiServer(("127.0.0.1", 0), controllers)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.port)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def request(self, method, path, body=None, headers=None):
+        payload = json.dumps(body) if body is not None else None
+        self.connection.request(method, path, body=payload, headers=headers or {})
+        response = self.connection.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+    def test_crud_on_one_connection(self):
+        """Test create, read, update and delete over a kept-alive connection."""
+        status, client = self.request("POST", "/clients", {"ID": "1", "Name": "John Doe"})
+        self.assertEqual(status, 201)
+        self.assertEqual(client["_version"], 1)
+
+        status, client = self.request("PUT", "/clients/1", {"Name": "Jane Doe"}, {"If-Match": "1"})
+        self.assertEqual(status, 200)
+        self.assertEqual(client["Name"], "Jane Doe")
+
+        status, _ = self.request("GET", "/clients/1")
+        self.assertEqual(status, 200)
+        status, _ = self.request("DELETE", "/clients/1")
+        self.assertEqual(status, 204)
+        status, _ = self.request("GET", "/clients/1")
+        self.assertEqual(status, 404)
+
+    def test_stale_version_conflicts(self):
+        """Test that an update with an old version answers 409."""
+        self.request("POST", "/airlines", {"ID": "101", "Company Name": "Global Airways"})
+        self.request("PUT", "/airlines/101", {"Country": "USA"})
+
+        status, body = self.request("PUT", "/airlines/101", {"Country": "UK"}, {"If-Match": "1"})
+        self.assertEqual(status, 409)
+        self.assertIn("error", body)
+
+    def test_create_existing_id_conflicts(self):
+        """Test that creating a record whose ID is taken answers 409 and keeps the record."""
+        self.request("POST", "/clients", {"ID": "1", "Name": "John Doe"})
+        status, body = self.request("POST", "/clients", {"ID": "1", "Name": "Jane Doe"})
+        self.assertEqual(status, 409)
+        self.assertIn("error", body)
+        status, client = self.request("GET", "/clients/1")
+        self.assertEqual((client["Name"], client["_version"]), ("John Doe", 1))
+
+    def test_streamed_listing_and_search(self):
+        """Test that listings larger than one chunk are streamed as a JSON array."""
+        for i in range(300):
+            self.request("POST", "/flights", {
+                "Flight ID": f"F{i}", "Client ID": "1", "Airline ID": "101", "Date": "2025-03-05",
+                "Departure": "London", "Arrival": "Paris" if i % 2 else "Rome"
+            })
+
+        status, flights = self.request("GET", "/flights")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(flights), 300)
+        status, flights = self.request("GET", "/flights?q=rome")
+        self.assertEqual(len(flights), 150)
+
+    def test_listings_are_not_built_in_full(self):
+        """Test that listings convert records as they are sent instead of collecting them first."""
+        for i in range(300):
+            self.request("POST", "/flights", {
+                "Flight ID": f"F{i}", "Client ID": "1", "Airline ID": "101", "Date": "2025-03-05",
+                "Departure": "London", "Arrival": "Paris" if i % 2 else "Rome"
+            })
+        flights = self.server.controllers.flight_controller
+        converted, chunks_after = [], []
+        to_dict = flight_controller._to_dict
+        write_chunk = ApiRequestHandler.write_chunk
+
+        def counting_to_dict(flight):
+            converted.append(flight.flight_id)
+            return to_dict(flight)
+
+        def recording_write_chunk(handler, data):
+            chunks_after.append(len(converted))
+            write_chunk(handler, data)
+
+        with mock.patch.object(flight_controller, "_to_dict", counting_to_dict), \
+                mock.patch.object(ApiRequestHandler, "write_chunk", recording_write_chunk), \
+                mock.patch.object(flights, "get_all_flights", side_effect=AssertionError), \
+                mock.patch.object(flights, "search_flights", side_effect=AssertionError), \
+                mock.patch.object(flights, "find_flights", side_effect=AssertionError):
+            status, all_flights = self.request("GET", "/flights")
+            self.assertEqual(len(all_flights), 300)
+            # The first batch went out before the rest of the records were converted
+            self.assertEqual(chunks_after[:3], [0, STREAM_BATCH_SIZE, 300])
+            status, rome = self.request("GET", "/flights?q=rome")
+            self.assertEqual(len(rome), 150)
+            status, rome = self.request("GET", "/flights?Departure=London&Arrival=Rome")
+            self.assertEqual(status, 200)
+            self.assertEqual(len(rome), 150)
+
+    def test_invalid_requests(self):
+        """Test error answers for unknown endpoints, bad JSON and invalid records."""
+        self.assertEqual(self.request("GET", "/unknown")[0], 404)
+        self.assertEqual(self.request("POST", "/clients", {"Name": "No ID"})[0], 400)
+        self.connection.request("POST", "/clients", body="not json")
+        response = self.connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+
+    def test_bad_field_types_keep_the_connection(self):
+        """Test that a body with wrong field types answers 400 and the connection stays usable."""
+        status, body = self.request("POST", "/clients", {"ID": 5})
+        self.assertEqual(status, 400)
+        self.assertIn("error", body)
+        sock = self.connection.sock
+        status, _ = self.request("POST", "/clients", {"ID": "1", "Name": "John Doe"})
+        self.assertEqual(status, 201)
+        self.assertIs(self.connection.sock, sock)
+
+    def test_pipelined_requests(self):
+        """Test that several requests written at once are all answered in order."""
+        requests = b"".join(
+            b"GET /clients/%d HTTP/1.1\r\nHost: localhost\r\n\r\n" % i for i in range(3)
+        )
+        with socket.create_connection(("127.0.0.1", self.port)) as sock:
+            sock.sendall(requests)
+            sock.shutdown(socket.SHUT_WR)
+            received = b""
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                received += data
+        self.assertEqual(received.count(b"HTTP/1.1 404"), 3)
+
+    def test_metrics_endpoint(self):
+        """Test that /_metrics serves Prometheus text while metrics are enabled, and 404 otherwise."""
+        self.assertEqual(self.request("GET", "/_metrics")[0], 404)
+        metrics.enable()
+        try:
+            self.request("POST", "/clients", {"ID": "1", "Name": "John Doe"})
+            self.connection.request("GET", "/_metrics")
+            response = self.connection.getresponse()
+            text = response.read().decode()
+        finally:
+            metrics.disable()
+            metrics.REGISTRY.reset()
+        self.assertEqual(response.status, 200)
+        self.assertIn('frms_operation_duration_seconds_count{operation="json_db.save"} 1', text)
+
+    def test_profiled_request(self):
+        """Test that only requests with the profile header are profiled, and only on a profiling server."""
+        self.request("GET", "/flights", headers={"X-Profile": "1"})
+        self.assertEqual(glob.glob(os.path.join(self.temp_dir.name, "profile-*")), [])
+
+        self.server.profile_directory = self.temp_dir.name
+        with mock.patch("sys.stderr", io.StringIO()) as stderr:
+            status, _ = self.request("POST", "/clients", {"ID": "1", "Name": "John Doe"}, {"X-Profile": "1"})
+            self.request("GET", "/clients")
+        self.assertEqual(status, 201)
+        reports = glob.glob(os.path.join(self.temp_dir.name, "profile-*-server-POST--clients.txt"))
+        self.assertEqual(len(reports), 1)
+        self.assertIn(reports[0], stderr.getvalue())
+        self.assertEqual(len(glob.glob(os.path.join(self.temp_dir.name, "profile-*.txt"))), 1)
+
+
+
+class TestApiServerWorkers(unittest.TestCase):
+    """Test case for serving the API from several worker processes."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "src.server", "--port", "0", "--workers", "3",
+             "--data", os.path.join(self.temp_dir.name, "records.json")],
+            stdout=subprocess.PIPE, text=True
+        )
+        banner = self.process.stdout.readline()
+        self.port = int(banner.split("http://127.0.0.1:")[1].split()[0])
+
+    def tearDown(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=10)
+        self.process.stdout.close()
+        self.temp_dir.cleanup()
+
+    def test_writes_are_visible_from_every_worker(self):
+        """Test that records written through one worker are read back through fresh connections."""
+        for i in range(20):
+            connection = http.client.HTTPConnection("127.0.0.1", self.port)
+            connection.request("POST", "/clients", body=json.dumps({"ID": str(i), "Name": f"Client {i}"}))
+            self.assertEqual(connection.getresponse().status, 201)
+            connection.close()
+
+        for _ in range(10):
+            connection = http.client.HTTPConnection("127.0.0.1", self.port)
+            connection.request("GET", "/clients")
+            self.assertEqual(len(json.loads(connection.getresponse().read())), 20)
+            connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
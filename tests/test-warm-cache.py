@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pkg import json_db
+from pkg.json_db import JsonFileDB
+from pkg.replica import ReplicaDB
+
+
+class TestWarmCache(unittest.TestCase):
+    """Test case for the parsed copy of the data file used on startup."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+        self.db = JsonFileDB(self.file_path)
+        with self.db.batch():
+            for i in range(10):
+                self.db.set(["Flight", f"F{i}"], {"Flight ID": f"F{i}", "Status": "Confirmed"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_unchanged_file_is_not_parsed(self):
+        """Test that a start that parses the file writes the cache and the next start loads it."""
+        self.assertFalse(os.path.exists(self.db.warm_cache_path))
+        JsonFileDB(self.file_path)
+        with mock.patch.object(json_db, "read_file", side_effect=AssertionError("parsed")):
+            reader = JsonFileDB(self.file_path)
+        self.assertEqual(reader.data, self.db.data)
+        self.assertEqual(reader.sequence, 10)
+
+    def test_save_deletes_cache(self):
+        """Test that a save only deletes the cache and write_warm_cache writes it again."""
+        JsonFileDB(self.file_path)
+        with mock.patch.object(json_db.warm_cache, "write") as write:
+            self.db.set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Delayed"})
+        write.assert_not_called()
+        self.assertFalse(os.path.exists(self.db.warm_cache_path))
+
+        self.db.write_warm_cache()
+        with mock.patch.object(json_db, "read_file", side_effect=AssertionError("parsed")):
+            reader = JsonFileDB(self.file_path)
+        self.assertEqual(reader.get(["Flight", "F1"])["Status"], "Delayed")
+        self.assertEqual(reader.sequence, 11)
+
+    def test_replicas_do_not_write_cache(self):
+        """Test that replicas load the cache but neither a cold load nor write_warm_cache writes it."""
+        replica = ReplicaDB(self.file_path)
+        replica.write_warm_cache()
+        self.assertFalse(os.path.exists(self.db.warm_cache_path))
+
+        self.db.write_warm_cache()
+        with mock.patch.object(json_db, "read_file", side_effect=AssertionError("parsed")):
+            self.assertEqual(ReplicaDB(self.file_path).data, self.db.data)
+
+    def test_changed_file_invalidates_cache(self):
+        """Test that writes without the cache, even keeping size and mtime, make the file be parsed."""
+        JsonFileDB(self.file_path, warm_cache=False).set(["Flight", "F1"], {"Flight ID": "F1", "Status": "Delayed"})
+        self.assertEqual(JsonFileDB(self.file_path).get(["Flight", "F1"])["Status"], "Delayed")
+
+        stat = os.stat(self.file_path)
+        with open(self.file_path, 'r+b') as file:
+            text = file.read()
+            file.seek(0)
+            file.write(text.replace(b"Delayed", b"Arrived"))
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(JsonFileDB(self.file_path).get(["Flight", "F1"])["Status"], "Arrived")
+
+    def test_segment_files_have_no_cache(self):
+        """Test that memory-mapped segment files are not copied into a cache."""
+        JsonFileDB(self.file_path, codec="segment").set(["Flight", "F1"], {"Flight ID": "F1"})
+        JsonFileDB(self.file_path).write_warm_cache()
+        self.assertFalse(os.path.exists(self.db.warm_cache_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
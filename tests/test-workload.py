@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.app import open_controllers
+from src.workload import percentile, read_trace, record_workload, replay, trace_stats
+
+FLIGHT = {"Flight ID": "F1", "Client ID": "1", "Airline ID": "2", "Date": "2025-01-02",
+          "Departure": "London", "Arrival": "Paris", "Status": "Confirmed"}
+
+
+class TestWorkload(unittest.TestCase):
+    """Test case for workload recording and replay."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "records.json")
+        self.trace_path = os.path.join(self.temp_dir.name, "trace.ndjson")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_calls(self):
+        with open(self.trace_path) as file:
+            return list(read_trace(file))
+
+    def test_record_and_replay(self):
+        """Test that recorded calls replay against a copy of the data with the same outcomes."""
+        controllers = open_controllers(self.file_path, indexes=False)
+        controllers.json_db.save()
+        copy_path = os.path.join(self.temp_dir.name, "copy.json")
+        shutil.copy(self.file_path, copy_path)
+
+        recorder = record_workload(controllers, self.trace_path)
+        flights = controllers.flight_controller
+        self.assertTrue(flights.create_flight(FLIGHT))
+        self.assertFalse(flights.create_flight({"Flight ID": ""}))
+        self.assertEqual(len(flights.search_flights("pari")), 1)
+        self.assertTrue(flights.update_flight("F1", {**FLIGHT, "Status": "Delayed"}, expected_version=1))
+        recorder.close()
+
+        calls = self.read_calls()
+        self.assertEqual([(call[2], call[5]) for call in calls],
+                         [("create", True), ("create", False), ("search", 1), ("update", True)])
+        self.assertEqual(calls[3][6], {"expected_version": 1})
+
+        summary = replay(iter(calls), open_controllers(copy_path, indexes=False), speed=0)
+        self.assertEqual(summary["flights.create"]["count"], 2)
+        self.assertEqual(sum(row["mismatches"] for row in summary.values()), 0)
+        self.assertEqual(trace_stats(iter(calls))["flights.create"]["share"], 0.5)
+
+    def test_replay_keeps_spacing(self):
+        """Test that replay waits for the recorded gaps divided by the speed."""
+        calls = [[100.0, "clients", "get_all", [], 1.0, 0], [104.0, "clients", "get_all", [], 1.0, 0]]
+        waits = []
+        replay(iter(calls), open_controllers(self.file_path, indexes=False), speed=2, sleep=waits.append)
+        self.assertEqual(len(waits), 1)
+        self.assertAlmostEqual(waits[0], 2.0, delta=0.1)
+
+    def test_streamed_listings_recorded_as_queries(self):
+        """Test that consumed iter_* listings are recorded as the query they stand for and replay."""
+        controllers = open_controllers(self.file_path, indexes=False)
+        controllers.flight_controller.create_flight(FLIGHT)
+        recorder = record_workload(controllers, self.trace_path)
+        flights = controllers.flight_controller
+        self.assertEqual(len(list(flights.iter_flights(search_term="pari"))), 1)
+        self.assertEqual(len(list(flights.iter_flights(field="Status", value="Delayed"))), 0)
+        listing = flights.iter_flights()
+        next(listing)
+        listing.close()
+        recorder.close()
+
+        calls = self.read_calls()
+        self.assertEqual([call[2:4] + call[5:] for call in calls],
+                         [["search", ["pari"], 1], ["find", ["Status", "Delayed"], 0], ["get_all", [], 1]])
+        summary = replay(iter(calls), controllers, speed=0)
+        self.assertEqual(sum(row["mismatches"] for row in summary.values()), 0)
+
+    def test_headers_skipped_and_percentiles(self):
+        """Test that the header of each recording is skipped and percentiles use nearest rank."""
+        for _ in range(2):
+            recorder = record_workload(open_controllers(self.file_path, indexes=False), self.trace_path)
+            recorder.close()
+        with open(self.trace_path) as file:
+            self.assertEqual(len([json.loads(line) for line in file]), 2)
+        self.assertEqual(self.read_calls(), [])
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()